@@ -0,0 +1,205 @@
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from functools import partial
+
+from metrics import METRICS
+
+
+AUDIT_DIR = os.environ.get("TBS_AUDIT_DIR", "audit")
+AUDIT_SEGMENT_BYTES = 4 * 1024 * 1024
+AUDIT_SEGMENT_SECONDS = 3600
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_SECONDS = 0.2
+AUDIT_CLOSE_TIMEOUT_SECONDS = 5
+SYSTEM_REASSIGNER = "system:reassigner"
+
+AUDIT_RECORDS = METRICS.counter("tbs_audit_records_total", "Audit records written to segment files.")
+AUDIT_QUEUE = METRICS.gauge("tbs_audit_queue_depth", "Audit records waiting for the background writer.")
+
+
+def get_user_actor(aUserId):
+    return f"user:{aUserId}"
+
+
+def get_segment_sort_key(aPath):
+    return os.path.basename(aPath).split(".", 1)[0]
+
+
+def compress_segment(aPath):
+    aTempPath = f"{aPath}.gz.{os.getpid()}.tmp"
+    try:
+        with open(aPath, "rb") as aSource, gzip.open(aTempPath, "wb") as aTarget:
+            shutil.copyfileobj(aSource, aTarget)
+        os.replace(aTempPath, f"{aPath}.gz")
+        os.remove(aPath)
+    except FileNotFoundError:
+        # Another instance sharing the directory compacted it first.
+        if os.path.exists(aTempPath):
+            os.remove(aTempPath)
+
+
+class AuditLog(threading.Thread):
+    def __init__(
+        self, aDirectory=AUDIT_DIR, aSegmentBytes=AUDIT_SEGMENT_BYTES, aSegmentSeconds=AUDIT_SEGMENT_SECONDS, aFlushSeconds=AUDIT_FLUSH_SECONDS
+    ):
+        super().__init__(daemon=True)
+        self.directory = aDirectory
+        self.flush_seconds = aFlushSeconds
+        self.segment_bytes = aSegmentBytes
+        self.segment_seconds = aSegmentSeconds
+        self.queue = queue.SimpleQueue()
+        self.running = False
+        self.segment_path = None
+        self.segment_started = 0.0
+        self.segment_size = 0
+        self.segment_count = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.compact_segments(time.time() - self.segment_seconds)
+        self.running = True
+        super().start()
+        atexit.register(self.close)
+
+    def append(self, aRecord):
+        self.queue.put(aRecord)
+
+    def close(self):
+        if self.running:
+            self.running = False
+            self.queue.put(None)
+            self.join(AUDIT_CLOSE_TIMEOUT_SECONDS)
+
+    def run(self):
+        aStopping = False
+        while not aStopping:
+            aBatch = [self.queue.get()]
+            # One write and fsync per flush window, so the audit disk traffic never queues behind every commit.
+            aDeadline = time.monotonic() + self.flush_seconds
+            while aBatch[-1] is not None and len(aBatch) < AUDIT_BATCH_SIZE:
+                aRemaining = aDeadline - time.monotonic()
+                if aRemaining <= 0:
+                    break
+                try:
+                    aBatch.append(self.queue.get(timeout=aRemaining))
+                except queue.Empty:
+                    break
+            if aBatch[-1] is None:
+                aStopping = True
+                aBatch.pop()
+            try:
+                self.write_batch(aBatch)
+            except OSError as anError:
+                print(f"Audit log write failed: {anError}")
+        if self.segment_path:
+            self.rotate()
+
+    def write_batch(self, aBatch):
+        if not aBatch:
+            return
+        if self.segment_path and time.time() - self.segment_started >= self.segment_seconds:
+            self.rotate()
+        if self.segment_path is None:
+            self.segment_count += 1
+            self.segment_started = time.time()
+            self.segment_size = 0
+            self.segment_path = os.path.join(
+                self.directory,
+                f"audit-{time.strftime('%Y%m%d-%H%M%S', time.gmtime(self.segment_started))}-{os.getpid()}-{self.segment_count:04d}.jsonl",
+            )
+
+        aData = "".join(json.dumps(aRecord, separators=(",", ":")) + "\n" for aRecord in aBatch).encode("utf-8")
+        # Reopened per batch so an idle segment is never held open while another instance compacts it.
+        with open(self.segment_path, "ab") as aFile:
+            aFile.write(aData)
+            aFile.flush()
+            os.fsync(aFile.fileno())
+        AUDIT_RECORDS.inc(len(aBatch))
+        self.segment_size += len(aData)
+        if self.segment_size >= self.segment_bytes:
+            self.rotate()
+
+    def rotate(self):
+        aPath, self.segment_path = self.segment_path, None
+        compress_segment(aPath)
+
+    def compact_segments(self, anOlderThan):
+        # Segments left uncompressed by an instance that exited early; live ones are younger than a rotation.
+        for aPath in glob.glob(os.path.join(self.directory, "audit-*.jsonl")):
+            try:
+                if os.path.getmtime(aPath) < anOlderThan:
+                    compress_segment(aPath)
+            except OSError as anError:
+                print(f"Audit compaction skipped {aPath}: {anError}")
+
+
+AUDIT_LOG = AuditLog()
+AUDIT_QUEUE.set_function(AUDIT_LOG.queue.qsize)
+
+
+def is_auditing():
+    # Only the app starts the writer; the simulator and benchmarks skip auditing entirely.
+    return AUDIT_LOG.running
+
+
+def audit_change(aCur, anActor, anAction, anEntity, anEntityId, anOldValues=None, aNewValues=None):
+    if not AUDIT_LOG.running:
+        return
+    aRecord = {
+        "ts": round(time.time(), 3),
+        "actor": anActor or "unknown",
+        "action": anAction,
+        "entity": anEntity,
+        "id": anEntityId,
+        "old": anOldValues,
+        "new": aNewValues,
+    }
+    # Queued only if the transaction commits, so a rolled-back change never shows up in the trail.
+    aCur.connection.after_commit(partial(AUDIT_LOG.append, aRecord))
+
+
+def iter_audit_records(aDirectory=AUDIT_DIR, anEntity=None, anEntityId=None, anActor=None):
+    aPaths = glob.glob(os.path.join(aDirectory, "audit-*.jsonl")) + glob.glob(os.path.join(aDirectory, "audit-*.jsonl.gz"))
+    for aPath in sorted(aPaths, key=get_segment_sort_key):
+        anOpen = gzip.open if aPath.endswith(".gz") else open
+        try:
+            with anOpen(aPath, "rt", encoding="utf-8") as aFile:
+                for aLine in aFile:
+                    try:
+                        aRecord = json.loads(aLine)
+                    except ValueError:
+                        # A torn last line from a crash mid-write.
+                        continue
+                    if anEntity and aRecord["entity"] != anEntity:
+                        continue
+                    if anEntityId is not None and aRecord["id"] != anEntityId:
+                        continue
+                    if anActor and aRecord["actor"] != anActor:
+                        continue
+                    yield aRecord
+        except FileNotFoundError:
+            continue
+
+
+def format_record(aRecord):
+    aWhen = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(aRecord["ts"]))
+    return f"{aWhen} {aRecord['actor']:>18} {aRecord['action']:<20} {aRecord['entity']} {aRecord['id']}: {aRecord['old']} -> {aRecord['new']}"
+
+
+if __name__ == "__main__":
+    aParser = argparse.ArgumentParser(description="Print the audit trail, oldest first.")
+    aParser.add_argument("--dir", default=AUDIT_DIR)
+    aParser.add_argument("--entity", help="booking, user, pooled_trip or recurring")
+    aParser.add_argument("--id", type=int)
+    aParser.add_argument("--actor", help='e.g. "user:12" or "system:reassigner"')
+    anArgs = aParser.parse_args()
+    for aRecord in iter_audit_records(anArgs.dir, anArgs.entity, anArgs.id, anArgs.actor):
+        print(format_record(aRecord))
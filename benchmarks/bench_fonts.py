@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import tracemalloc
+import tkinter.font
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import customtkinter as CTk
+from styles import get_font, CARD_STYLE
+
+
+ROW_COUNTS = (100, 500, 1000)
+
+
+def fresh_font(aSize, aWeight="normal"):
+    return CTk.CTkFont(family="Segoe UI", size=aSize, weight=aWeight)
+
+
+def render_rows(aParent, aRowCount, aFontFactory):
+    for anIndex in range(aRowCount):
+        aCard = CTk.CTkFrame(aParent, **CARD_STYLE)
+        aCard.pack(fill="x", pady=2)
+        CTk.CTkLabel(aCard, text=f"Booking #{anIndex}", font=aFontFactory(11, "bold")).pack(anchor="w")
+        CTk.CTkLabel(aCard, text="Customer: Jane Doe", font=aFontFactory(11)).pack(anchor="w")
+        CTk.CTkLabel(aCard, text="Bedford -> Luton", font=aFontFactory(10)).pack(anchor="w")
+        CTk.CTkLabel(aCard, text="2025-01-01 at 09:00", font=aFontFactory(10)).pack(anchor="w")
+        CTk.CTkButton(aCard, text="Delete", font=aFontFactory(9, "bold"), width=80, height=28).pack(anchor="e")
+
+
+def measure(aRoot, aRowCount, aFontFactory):
+    aFrame = CTk.CTkFrame(aRoot)
+    aFrame.pack(fill="both", expand=True)
+    aRoot.update()
+
+    aNamedFontsBefore = len(tkinter.font.names(aRoot))
+    tracemalloc.start()
+    aStart = time.perf_counter()
+    render_rows(aFrame, aRowCount, aFontFactory)
+    aRoot.update_idletasks()
+    anElapsed = time.perf_counter() - aStart
+    aPeakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    aNamedFonts = len(tkinter.font.names(aRoot)) - aNamedFontsBefore
+
+    aFrame.destroy()
+    aRoot.update()
+    return anElapsed, aPeakBytes, aNamedFonts
+
+
+def main():
+    try:
+        aRoot = CTk.CTk()
+    except tkinter.TclError as anError:
+        # Tk needs an X display even for an off-screen run; on a headless box use xvfb-run.
+        sys.exit(f"bench_fonts needs a display ({anError}); try: xvfb-run -a python benchmarks/bench_fonts.py")
+    aRoot.geometry("1000x800")
+
+    print(f"{'rows':>6} {'fonts':>10} {'render s':>9} {'peak KiB':>9} {'Tk fonts':>9}")
+    for aRowCount in ROW_COUNTS:
+        for aLabel, aFactory in (("per-widget", fresh_font), ("registry", get_font)):
+            anElapsed, aPeakBytes, aNamedFonts = measure(aRoot, aRowCount, aFactory)
+            print(f"{aRowCount:>6} {aLabel:>10} {anElapsed:>9.3f} {aPeakBytes / 1024:>9.0f} {aNamedFonts:>9}")
+
+    aRoot.destroy()
+
+
+if __name__ == "__main__":
+    main()
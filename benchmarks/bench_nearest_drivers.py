@@ -0,0 +1,76 @@
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_telemetry import KM_PER_DEGREE_LATITUDE, DriverPositionIndex
+from spatial_grid import GRID_BOUNDS
+
+
+DRIVER_COUNTS = (100, 1000, 10000)
+UPDATE_COUNT = 100000
+QUERY_COUNT = 10000
+
+
+def random_point(aRandom):
+    aSouth, aWest, aNorth, anEast = GRID_BOUNDS
+    return aRandom.uniform(aSouth, aNorth), aRandom.uniform(aWest, anEast)
+
+
+def brute_force_nearest(anIndex, aLatitude, aLongitude, aCount, anIsAvailable=None):
+    # Same projection as the index, so near-ties sort the same way.
+    aKmPerDegreeLongitude = KM_PER_DEGREE_LATITUDE * math.cos(math.radians(aLatitude))
+    aDistances = sorted(
+        (math.hypot((aDriverLat - aLatitude) * KM_PER_DEGREE_LATITUDE, (aDriverLon - aLongitude) * aKmPerDegreeLongitude), aDriverId)
+        for aDriverId, (aDriverLat, aDriverLon, _, _) in anIndex.positions_by_driver.items()
+        if anIsAvailable is None or anIsAvailable(aDriverId)
+    )
+    return [aDriverId for _, aDriverId in aDistances[:aCount]]
+
+
+def is_available(aDriverId):
+    # Stands in for the dashboards' overlap check: roughly one driver in three is already booked.
+    return aDriverId % 3 != 0
+
+
+def main():
+    aRandom = random.Random(7)
+    print(f"{'drivers':>8} {'update us':>10} {'knn us':>8} {'avail us':>8} {'scan us':>8}")
+    for aDriverCount in DRIVER_COUNTS:
+        anIndex = DriverPositionIndex()
+        anUpdates = [(aRandom.randrange(aDriverCount), *random_point(aRandom)) for _ in range(UPDATE_COUNT)]
+        aStart = time.perf_counter()
+        for aDriverId, aLatitude, aLongitude in anUpdates:
+            anIndex.update(aDriverId, aLatitude, aLongitude)
+        anUpdateUs = (time.perf_counter() - aStart) / UPDATE_COUNT * 1e6
+
+        aQueries = [random_point(aRandom) for _ in range(QUERY_COUNT)]
+        aStart = time.perf_counter()
+        for aLatitude, aLongitude in aQueries:
+            anIndex.nearest(aLatitude, aLongitude, 5)
+        aNearestUs = (time.perf_counter() - aStart) / QUERY_COUNT * 1e6
+
+        aStart = time.perf_counter()
+        for aLatitude, aLongitude in aQueries:
+            anIndex.nearest(aLatitude, aLongitude, 5, is_available)
+        anAvailableUs = (time.perf_counter() - aStart) / QUERY_COUNT * 1e6
+
+        aScanQueries = aQueries[:200]
+        aStart = time.perf_counter()
+        for aLatitude, aLongitude in aScanQueries:
+            brute_force_nearest(anIndex, aLatitude, aLongitude, 5)
+        aScanUs = (time.perf_counter() - aStart) / len(aScanQueries) * 1e6
+
+        for aLatitude, aLongitude in aScanQueries:
+            for anIsAvailable in (None, is_available):
+                aFound = [aDriverId for aDriverId, _ in anIndex.nearest(aLatitude, aLongitude, 5, anIsAvailable)]
+                assert aFound == brute_force_nearest(anIndex, aLatitude, aLongitude, 5, anIsAvailable)
+
+        print(f"{aDriverCount:>8} {anUpdateUs:>10.2f} {aNearestUs:>8.1f} {anAvailableUs:>8.1f} {aScanUs:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
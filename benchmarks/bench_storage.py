@@ -0,0 +1,73 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import STORAGE_BACKENDS, open_storage
+
+
+DRIVER_COUNT = 50
+CUSTOMER_COUNT = 200
+BOOKING_COUNT = 1000
+START_TS = 1_900_000_000
+SPREAD_SECONDS = 7 * 86400
+
+
+def run_workload(aStore, aRandom):
+    aTimings = {}
+
+    aStart = time.perf_counter()
+    aDriverIds = [aStore.add_user(f"driver{anIndex}@example.com", "secret", "driver", f"Driver {anIndex}", "Bedford", "07000000000") for anIndex in range(DRIVER_COUNT)]
+    aCustomerIds = [aStore.add_user(f"customer{anIndex}@example.com", "secret", "customer", f"Customer {anIndex}", "Luton", "07000000000") for anIndex in range(CUSTOMER_COUNT)]
+    aTimings["register"] = (time.perf_counter() - aStart, DRIVER_COUNT + CUSTOMER_COUNT)
+
+    aStart = time.perf_counter()
+    aBookingIds = [
+        aStore.add_booking(aRandom.choice(aCustomerIds), "Bedford", "Luton", START_TS + aRandom.randrange(SPREAD_SECONDS) // 60 * 60)
+        for _ in range(BOOKING_COUNT)
+    ]
+    aTimings["book"] = (time.perf_counter() - aStart, BOOKING_COUNT)
+
+    aStart = time.perf_counter()
+    anAttempts = 0
+    anAssigned = []
+    for aBookingId in aBookingIds:
+        aBooking = aStore.get_booking(aBookingId)
+        for aDriverId in aRandom.sample(aDriverIds, 5):
+            anAttempts += 1
+            if aStore.transition(aBookingId, aBooking.version, "assign", aDriverId):
+                anAssigned.append((aBookingId, aBooking.version + 1, aDriverId))
+                break
+    aTimings["assign"] = (time.perf_counter() - aStart, anAttempts)
+
+    aStart = time.perf_counter()
+    for aBookingId, aVersion, aDriverId in anAssigned:
+        aStore.transition(aBookingId, aVersion, "complete", aDriverId)
+    aTimings["complete"] = (time.perf_counter() - aStart, len(anAssigned))
+
+    aStart = time.perf_counter()
+    for aDriverId in aDriverIds:
+        aStore.get_driver_bookings(aDriverId, START_TS)
+    for aCustomerId in aCustomerIds:
+        aStore.get_user_bookings(aCustomerId)
+    aTimings["list"] = (time.perf_counter() - aStart, DRIVER_COUNT + CUSTOMER_COUNT)
+    return aTimings, len(anAssigned)
+
+
+def main():
+    print(f"{'backend':>8} {'operation':>10} {'ops':>7} {'ops/s':>10}")
+    for aKind in STORAGE_BACKENDS:
+        with tempfile.TemporaryDirectory() as aTempDir:
+            aStore = open_storage(aKind, os.path.join(aTempDir, "taxi.db"))
+            aTimings, anAssignedCount = run_workload(aStore, random.Random(7))
+            aStore.close()
+        for anOperation, (aSeconds, aCount) in aTimings.items():
+            print(f"{aKind:>8} {anOperation:>10} {aCount:>7} {aCount / aSeconds:>10.0f}")
+        print(f"{aKind:>8} {'assigned':>10} {anAssignedCount:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_setup import get_connection, init_db
+from booking_state import create_booking, transition_booking
+from sql_monitor import MONITOR
+
+
+SEED_DRIVERS = 20
+SEED_CUSTOMERS = 100
+START_TS = 1_900_000_000
+SPREAD_SECONDS = 30 * 86400
+PLACES = ("Bedford", "Luton", "Kempston", "Dunstable", "Biggleswade", "Ampthill", "Sandy", "Leighton Buzzard")
+# Roughly what the dashboards generate: mostly bookings, then dispatch and completion, the odd sign-up.
+OPERATION_WEIGHTS = (("register", 5), ("submit_booking", 45), ("assign", 30), ("complete_ride", 20))
+
+
+def percentile(aValues, aFraction):
+    if not aValues:
+        return 0.0
+    aSorted = sorted(aValues)
+    return aSorted[min(len(aSorted) - 1, int(aFraction * len(aSorted)))]
+
+
+def prepare_database(aPath, aJournalMode):
+    init_db(aPath)
+    aConn = get_connection(aPath=aPath)
+    try:
+        aConn.execute(f"PRAGMA journal_mode = {aJournalMode}")
+        aCur = aConn.cursor()
+        for aRole, aCount in (("driver", SEED_DRIVERS), ("customer", SEED_CUSTOMERS)):
+            aCur.executemany(
+                "INSERT INTO users (email, password, role, name, address, phone) VALUES (?, ?, ?, ?, ?, ?)",
+                [(f"seed-{aRole}-{anIndex}@example.com", "secret", aRole, f"Seed {aRole} {anIndex}", "Bedford", "07000000000") for anIndex in range(aCount)],
+            )
+        aConn.commit()
+    finally:
+        aConn.close()
+
+
+def register(aCur, aRandom, aWorkerId):
+    aCur.execute(
+        "INSERT INTO users (email, password, role, name, address, phone) VALUES (?, ?, ?, ?, ?, ?)",
+        (f"stress-{aWorkerId}-{aRandom.getrandbits(48)}@example.com", "secret", "customer", "Stress Customer", "Luton", "07000000000"),
+    )
+
+
+def submit_booking(aCur, aRandom, aWorkerId):
+    aPickup, aDropoff = aRandom.sample(PLACES, 2)
+    aCur.execute("SELECT id FROM users WHERE role = 'customer' AND id >= ? LIMIT 1", (aRandom.randint(1, SEED_DRIVERS + SEED_CUSTOMERS),))
+    aRow = aCur.fetchone()
+    if aRow:
+        create_booking(aCur, aRow[0], aPickup, aDropoff, START_TS + aRandom.randrange(SPREAD_SECONDS) // 300 * 300)
+
+
+def pick_booking(aCur, aRandom, aStatus):
+    aCur.execute("SELECT MAX(id) FROM bookings")
+    aMaxId = aCur.fetchone()[0] or 0
+    aCur.execute(
+        "SELECT id, version, driver_id FROM bookings WHERE id >= ? AND status = ? LIMIT 1",
+        (aRandom.randint(1, aMaxId + 1), aStatus),
+    )
+    return aCur.fetchone()
+
+
+def assign(aCur, aRandom, aWorkerId):
+    aBooking = pick_booking(aCur, aRandom, "pending")
+    if aBooking:
+        transition_booking(aCur, aBooking[0], aBooking[1], "assign", aRandom.randint(1, SEED_DRIVERS))
+
+
+def complete_ride(aCur, aRandom, aWorkerId):
+    aBooking = pick_booking(aCur, aRandom, "assigned")
+    if aBooking:
+        transition_booking(aCur, aBooking[0], aBooking[1], "complete", aBooking[2])
+
+
+OPERATIONS = {"register": register, "submit_booking": submit_booking, "assign": assign, "complete_ride": complete_ride}
+
+
+def run_worker(aPath, aWorkerId, aDeadline, aBusyTimeoutMs, aBatchSize, aBeginMode, aResults):
+    # Lock waits would all count as slow queries, and explaining each one would skew the timings.
+    MONITOR.slow_threshold_ms = float("inf")
+    aRandom = random.Random(aWorkerId)
+    aNames = [aName for aName, _ in OPERATION_WEIGHTS]
+    aWeights = [aWeight for _, aWeight in OPERATION_WEIGHTS]
+    aLatencies = []
+    aLockWaits = []
+    anOperationCount = 0
+    aBusyErrors = 0
+
+    aConn = get_connection(aBusyTimeoutMs / 1000, aPath)
+    # Transactions are opened explicitly so the write lock wait can be timed on its own.
+    aConn.isolation_level = None
+    aCur = aConn.cursor()
+    while time.perf_counter() < aDeadline:
+        aBatch = aRandom.choices(aNames, aWeights, k=aBatchSize)
+        aStart = time.perf_counter()
+        aChangesBefore = aConn.total_changes
+        aLockWait = None
+        try:
+            aCur.execute(f"BEGIN {aBeginMode}")
+            for aName in aBatch:
+                OPERATIONS[aName](aCur, aRandom, aWorkerId)
+                # A deferred transaction only takes the write lock at its first write, so the wait is timed
+                # up to that write for both modes rather than up to BEGIN.
+                if aLockWait is None and aConn.total_changes != aChangesBefore:
+                    aLockWait = time.perf_counter() - aStart
+            aCur.execute("COMMIT")
+            if aLockWait is not None:
+                aLockWaits.append(aLockWait)
+            anOperationCount += len(aBatch)
+            aLatencies.append(time.perf_counter() - aStart)
+        except sqlite3.OperationalError as anError:
+            if "locked" not in str(anError) and "busy" not in str(anError):
+                raise
+            aBusyErrors += 1
+            if aConn.in_transaction:
+                aCur.execute("ROLLBACK")
+    aConn.close()
+    aResults.put((anOperationCount, aBusyErrors, aLatencies, aLockWaits))
+
+
+def run_scenario(aProcessCount, aJournalMode, aBusyTimeoutMs, aBatchSize, aBeginMode, aSeconds):
+    with tempfile.TemporaryDirectory(prefix="tbs-stress-") as aTempDir:
+        aPath = os.path.join(aTempDir, "taxi.db")
+        prepare_database(aPath, aJournalMode)
+
+        aResults = multiprocessing.Queue()
+        aDeadline = time.perf_counter() + aSeconds
+        aWorkers = [
+            multiprocessing.Process(
+                target=run_worker, args=(aPath, aWorkerId, aDeadline, aBusyTimeoutMs, aBatchSize, aBeginMode, aResults)
+            )
+            for aWorkerId in range(aProcessCount)
+        ]
+        aStart = time.perf_counter()
+        for aWorker in aWorkers:
+            aWorker.start()
+        aWorkerResults = [aResults.get() for _ in aWorkers]
+        for aWorker in aWorkers:
+            aWorker.join()
+        anElapsed = time.perf_counter() - aStart
+
+    aLatencies = [aValue for aResult in aWorkerResults for aValue in aResult[2]]
+    aLockWaits = [aValue for aResult in aWorkerResults for aValue in aResult[3]]
+    anOperationCount = sum(aResult[0] for aResult in aWorkerResults)
+    aBusyErrors = sum(aResult[1] for aResult in aWorkerResults)
+    return {
+        "journal": aJournalMode,
+        "busy_ms": aBusyTimeoutMs,
+        "batch": aBatchSize,
+        "begin": aBeginMode.lower(),
+        "ops_per_s": anOperationCount / anElapsed,
+        "busy_errors": aBusyErrors,
+        "busy_pct": 100 * aBusyErrors / max(1, aBusyErrors + len(aLatencies)),
+        "txn_p50_ms": 1000 * percentile(aLatencies, 0.5),
+        "txn_p99_ms": 1000 * percentile(aLatencies, 0.99),
+        "wait_p99_ms": 1000 * percentile(aLockWaits, 0.99),
+        "wait_max_ms": 1000 * max(aLockWaits, default=0.0),
+        "wait_total_s": sum(aLockWaits),
+    }
+
+
+def main():
+    aParser = argparse.ArgumentParser(description="Hammer a scratch taxi.db from several processes and compare locking settings.")
+    aParser.add_argument("--processes", type=int, default=8)
+    aParser.add_argument("--seconds", type=float, default=5)
+    aParser.add_argument("--journal-modes", default="delete,wal")
+    aParser.add_argument("--busy-timeouts-ms", default="100,1000,5000")
+    aParser.add_argument("--batch-sizes", default="1,10")
+    aParser.add_argument("--begin-modes", default="deferred,immediate")
+    anArgs = aParser.parse_args()
+
+    print(
+        f"{'journal':>8} {'busy ms':>7} {'batch':>5} {'begin':>9} {'ops/s':>8} {'busy err':>8} {'busy %':>6} "
+        f"{'txn p50':>8} {'txn p99':>8} {'wait p99':>8} {'wait max':>8} {'wait s':>7}"
+    )
+    for aJournalMode, aBusyTimeoutMs, aBatchSize, aBeginMode in itertools.product(
+        anArgs.journal_modes.split(","),
+        [int(aValue) for aValue in anArgs.busy_timeouts_ms.split(",")],
+        [int(aValue) for aValue in anArgs.batch_sizes.split(",")],
+        [aValue.upper() for aValue in anArgs.begin_modes.split(",")],
+    ):
+        aRow = run_scenario(anArgs.processes, aJournalMode, aBusyTimeoutMs, aBatchSize, aBeginMode, anArgs.seconds)
+        print(
+            f"{aRow['journal']:>8} {aRow['busy_ms']:>7} {aRow['batch']:>5} {aRow['begin']:>9} {aRow['ops_per_s']:>8.0f} "
+            f"{aRow['busy_errors']:>8} {aRow['busy_pct']:>6.1f} {aRow['txn_p50_ms']:>8.2f} {aRow['txn_p99_ms']:>8.2f} "
+            f"{aRow['wait_p99_ms']:>8.2f} {aRow['wait_max_ms']:>8.0f} {aRow['wait_total_s']:>7.2f}",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+from db_setup import init_db, get_write_connection
+from booking_time import datetime_to_epoch
+
+
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_CHUNK_SIZE = 500
+CHANGE_LOG_RETENTION_DAYS = 1
+NOTIFICATION_RETENTION_DAYS = 7
+
+
+def get_archive_columns(aCur):
+    aCur.execute("PRAGMA table_info(bookings_archive)")
+    return [aRow[1] for aRow in aCur.fetchall() if aRow[1] != "archived_at"]
+
+
+def archive_finalized_bookings(aMaxAgeDays=ARCHIVE_AFTER_DAYS, aChunkSize=ARCHIVE_CHUNK_SIZE):
+    aCutoffTs = datetime_to_epoch(datetime.now() - timedelta(days=aMaxAgeDays))
+    anArchivedCount = 0
+
+    aConn = get_write_connection()
+    try:
+        aCur = aConn.cursor()
+        aColumns = ", ".join(get_archive_columns(aCur))
+
+        while True:
+            aCur.execute(
+                "SELECT id FROM bookings WHERE status IN ('completed', 'cancelled') AND start_ts < ? LIMIT ?",
+                (aCutoffTs, aChunkSize),
+            )
+            aBookingIds = [aRow[0] for aRow in aCur.fetchall()]
+            if not aBookingIds:
+                break
+
+            aPlaceholders = ", ".join("?" for _ in aBookingIds)
+            aCur.execute(
+                f"INSERT INTO bookings_archive ({aColumns}) SELECT {aColumns} FROM bookings WHERE id IN ({aPlaceholders})",
+                aBookingIds,
+            )
+            aCur.execute(f"DELETE FROM bookings WHERE id IN ({aPlaceholders})", aBookingIds)
+            aConn.commit()
+            anArchivedCount += len(aBookingIds)
+
+        aCur.execute(
+            "DELETE FROM change_log WHERE changed_at < datetime('now', ?)", (f"-{CHANGE_LOG_RETENTION_DAYS} days",)
+        )
+        aCur.execute(
+            "DELETE FROM notification_outbox WHERE status != 'pending' AND created_at_ts < ?",
+            (datetime_to_epoch(datetime.now() - timedelta(days=NOTIFICATION_RETENTION_DAYS)),),
+        )
+        aConn.commit()
+    except sqlite3.Error as anError:
+        aConn.rollback()
+        print(f"Booking archival stopped: {anError}")
+    finally:
+        aConn.close()
+
+    return anArchivedCount
+
+
+if __name__ == "__main__":
+    aParser = argparse.ArgumentParser(description="Move finalized bookings into the archive table.")
+    aParser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    aParser.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK_SIZE)
+    anArgs = aParser.parse_args()
+    init_db()
+    print(f"Archived {archive_finalized_bookings(anArgs.days, anArgs.chunk_size)} bookings.")
@@ -0,0 +1,163 @@
+import threading
+from array import array
+from collections import Counter
+
+from db_setup import get_connection
+
+
+SNAPSHOT_TABLES = ("bookings", "bookings_archive")
+SNAPSHOT_RELOAD_CHUNK = 500
+SNAPSHOT_COLUMNS = "id, user_id, driver_id, pickup_location_id, dropoff_location_id, start_ts, end_ts, status"
+STATUS_NAMES = ("pending", "assigned", "completed", "cancelled")
+
+
+class BookingSnapshot:
+    def __init__(self):
+        self.ids = array("q")
+        self.user_ids = array("q")
+        self.driver_ids = array("q")
+        self.pickup_ids = array("q")
+        self.dropoff_ids = array("q")
+        self.start_ts = array("q")
+        self.end_ts = array("q")
+        self.status_codes = array("B")
+        self.positions_by_id = {}
+        self.status_names = list(STATUS_NAMES)
+        self.codes_by_status = {aStatus: aCode for aCode, aStatus in enumerate(STATUS_NAMES)}
+        self.change_log_id = None
+        self.lock = threading.RLock()
+
+    def get_columns(self):
+        return (
+            self.ids,
+            self.user_ids,
+            self.driver_ids,
+            self.pickup_ids,
+            self.dropoff_ids,
+            self.start_ts,
+            self.end_ts,
+            self.status_codes,
+        )
+
+    def get_status_code(self, aStatus):
+        aCode = self.codes_by_status.get(aStatus)
+        if aCode is None:
+            aCode = len(self.status_names)
+            self.status_names.append(aStatus)
+            self.codes_by_status[aStatus] = aCode
+        return aCode
+
+    def encode_row(self, aRow):
+        anId, aUserId, aDriverId, aPickupId, aDropoffId, aStartTs, anEndTs, aStatus = aRow
+        return (
+            anId,
+            aUserId or 0,
+            aDriverId or 0,
+            aPickupId or 0,
+            aDropoffId or 0,
+            aStartTs or 0,
+            anEndTs or 0,
+            self.get_status_code(aStatus),
+        )
+
+    def upsert(self, aRow):
+        aValues = self.encode_row(aRow)
+        aPosition = self.positions_by_id.get(aValues[0])
+        if aPosition is None:
+            self.positions_by_id[aValues[0]] = len(self.ids)
+            for aColumn, aValue in zip(self.get_columns(), aValues):
+                aColumn.append(aValue)
+        else:
+            for aColumn, aValue in zip(self.get_columns(), aValues):
+                aColumn[aPosition] = aValue
+
+    def remove(self, aBookingId):
+        aPosition = self.positions_by_id.pop(aBookingId, None)
+        if aPosition is None:
+            return
+        aLastPosition = len(self.ids) - 1
+        if aPosition != aLastPosition:
+            # Swap the last row into the gap so the columns stay dense.
+            for aColumn in self.get_columns():
+                aColumn[aPosition] = aColumn[aLastPosition]
+            self.positions_by_id[self.ids[aPosition]] = aPosition
+        for aColumn in self.get_columns():
+            aColumn.pop()
+
+    def load(self):
+        aConn = get_connection()
+        try:
+            aCur = aConn.cursor()
+            with self.lock:
+                aCur.execute("SELECT COALESCE(MAX(id), 0) FROM change_log")
+                aChangeLogId = aCur.fetchone()[0]
+                aCur.execute(f"SELECT {SNAPSHOT_COLUMNS} FROM all_bookings")
+                for aColumn in self.get_columns():
+                    del aColumn[:]
+                self.positions_by_id.clear()
+                for aRow in aCur:
+                    self.upsert(aRow)
+                self.change_log_id = aChangeLogId
+        finally:
+            aConn.close()
+        return self
+
+    def sync(self):
+        if self.change_log_id is None:
+            return self.load()
+
+        aConn = get_connection()
+        aNeedsReload = False
+        try:
+            aCur = aConn.cursor()
+            with self.lock:
+                aCur.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM change_log")
+                aMinId, aMaxId = aCur.fetchone()
+                if aMinId > self.change_log_id + 1:
+                    aNeedsReload = True
+                    return self
+                if aMaxId <= self.change_log_id:
+                    return self
+
+                aTablePlaceholders = ", ".join("?" for _ in SNAPSHOT_TABLES)
+                aCur.execute(
+                    f"SELECT DISTINCT row_id FROM change_log WHERE id > ? AND id <= ? AND table_name IN ({aTablePlaceholders})",
+                    (self.change_log_id, aMaxId, *SNAPSHOT_TABLES),
+                )
+                aChangedIds = [aRow[0] for aRow in aCur.fetchall()]
+
+                for aStart in range(0, len(aChangedIds), SNAPSHOT_RELOAD_CHUNK):
+                    aChunk = aChangedIds[aStart:aStart + SNAPSHOT_RELOAD_CHUNK]
+                    aPlaceholders = ", ".join("?" for _ in aChunk)
+                    aCur.execute(f"SELECT {SNAPSHOT_COLUMNS} FROM all_bookings WHERE id IN ({aPlaceholders})", aChunk)
+                    aFoundIds = set()
+                    for aRow in aCur.fetchall():
+                        self.upsert(aRow)
+                        aFoundIds.add(aRow[0])
+                    for aBookingId in aChunk:
+                        if aBookingId not in aFoundIds:
+                            self.remove(aBookingId)
+
+                self.change_log_id = aMaxId
+        finally:
+            aConn.close()
+            if aNeedsReload:
+                self.load()
+        return self
+
+    def count_by_status(self):
+        with self.lock:
+            aCodes = self.status_codes.tobytes()
+            return {aStatus: aCodes.count(aCode) for aCode, aStatus in enumerate(self.status_names)}
+
+    def top_pickups(self, aLimit=5):
+        with self.lock:
+            aCounts = Counter(self.pickup_ids)
+        aCounts.pop(0, None)
+        return aCounts.most_common(aLimit)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+BOOKING_SNAPSHOT = BookingSnapshot()
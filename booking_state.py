@@ -0,0 +1,163 @@
+from booking_time import RIDE_DURATION_SECONDS, from_epoch
+from locations import LOCATION_CACHE
+from metrics import METRICS
+from audit import audit_change, is_auditing
+
+
+# action: (statuses the booking may be in, status it moves to)
+BOOKING_TRANSITIONS = {
+    "assign": (("pending",), "assigned"),
+    "decline": (("assigned",), "pending"),
+    "complete": (("assigned",), "completed"),
+    "cancel": (("pending", "assigned"), "cancelled"),
+}
+
+BOOKINGS_CREATED = METRICS.counter("tbs_bookings_created_total", "Bookings inserted.")
+TRANSITION_ATTEMPTS = METRICS.counter(
+    "tbs_booking_transitions_total", "Booking state changes attempted, by action and outcome.", ("action", "result")
+)
+AUDIT_BOOKING_COLUMNS = ("user_id", "driver_id", "status", "pickup_location_id", "dropoff_location_id", "start_ts", "pooled_trip_id", "version")
+
+
+def get_driver_free_condition(
+    aDriverExpression, aStartTs=None, aBookingExpression="bookings.id", aPooledTripExpression="bookings.pooled_trip_id"
+):
+    # Correlated against the row being updated by default, so the overlap test and the write are one atomic statement;
+    # a standalone check passes its own booking and trip expressions instead.
+    aStart = "bookings.start_ts" if aStartTs is None else str(int(aStartTs))
+    return f"""NOT EXISTS (
+        SELECT 1 FROM bookings AS other
+        WHERE other.driver_id = {aDriverExpression}
+            AND other.start_ts > {aStart} - {RIDE_DURATION_SECONDS}
+            AND other.start_ts < {aStart} + {RIDE_DURATION_SECONDS}
+            AND other.end_ts > {aStart}
+            AND other.status IN ('pending', 'assigned')
+            AND other.id != {aBookingExpression}
+            AND other.pooled_trip_id IS NOT COALESCE({aPooledTripExpression}, -1)
+    )"""
+
+
+def get_audit_values(aCur, aBookingId, aVersion, aColumns=AUDIT_BOOKING_COLUMNS):
+    # Read inside the same transaction as the versioned write, so it is exactly the row that write replaces.
+    aCur.execute(f"SELECT {', '.join(aColumns)} FROM bookings WHERE id = ? AND version = ?", (aBookingId, aVersion))
+    aRow = aCur.fetchone()
+    return dict(zip(aColumns, aRow)) if aRow else None
+
+
+def create_booking(aCur, aUserId, aPickup, aDropoff, aStartTs, aLocations=LOCATION_CACHE, anActor=None):
+    aDate, aTime = from_epoch(aStartTs)
+    aPickupId = aLocations.intern(aCur, aPickup)
+    aDropoffId = aLocations.intern(aCur, aDropoff)
+    # The text columns are still written for older clients sharing the database; this version reads the ids.
+    aCur.execute(
+        "INSERT INTO bookings (user_id, pickup_location, dropoff_location, pickup_location_id, dropoff_location_id, booking_date, booking_time, start_ts, end_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            aUserId,
+            aPickup,
+            aDropoff,
+            aPickupId,
+            aDropoffId,
+            aDate,
+            aTime,
+            aStartTs,
+            aStartTs + RIDE_DURATION_SECONDS,
+        ),
+    )
+    BOOKINGS_CREATED.inc()
+    audit_change(
+        aCur,
+        anActor,
+        "booking.create",
+        "booking",
+        aCur.lastrowid,
+        None,
+        {"user_id": aUserId, "pickup_location_id": aPickupId, "dropoff_location_id": aDropoffId, "start_ts": aStartTs},
+    )
+    return aCur.lastrowid
+
+
+def transition_booking(aCur, aBookingId, aVersion, anAction, aDriverId=None, aUserId=None, anActor=None):
+    aFromStatuses, aToStatus = BOOKING_TRANSITIONS[anAction]
+    anOldValues = get_audit_values(aCur, aBookingId, aVersion, ("status", "driver_id")) if is_auditing() else None
+    aSets = ["status = ?", "version = version + 1"]
+    aSetParams = [aToStatus]
+    aConditions = ["id = ?", "version = ?", f"status IN ({', '.join('?' for _ in aFromStatuses)})"]
+    aConditionParams = [aBookingId, aVersion, *aFromStatuses]
+
+    if anAction == "assign":
+        aSets.append("driver_id = ?")
+        aSetParams.append(aDriverId)
+        aConditions.append(get_driver_free_condition("?"))
+        aConditionParams.append(aDriverId)
+    elif anAction == "decline":
+        aSets.append("driver_id = NULL")
+        aConditions.append("driver_id = ?")
+        aConditionParams.append(aDriverId)
+    elif anAction == "complete":
+        aConditions.append("driver_id = ?")
+        aConditionParams.append(aDriverId)
+
+    if aUserId is not None:
+        aConditions.append("user_id = ?")
+        aConditionParams.append(aUserId)
+
+    aCur.execute(
+        f"UPDATE bookings SET {', '.join(aSets)} WHERE {' AND '.join(aConditions)}",
+        aSetParams + aConditionParams,
+    )
+    aChanged = aCur.rowcount == 1
+    TRANSITION_ATTEMPTS.inc(aLabels=(anAction, "ok" if aChanged else "conflict"))
+    if aChanged and anOldValues:
+        aNewDriverId = {"assign": aDriverId, "decline": None}.get(anAction, anOldValues["driver_id"])
+        audit_change(
+            aCur, anActor, f"booking.{anAction}", "booking", aBookingId, anOldValues, {"status": aToStatus, "driver_id": aNewDriverId}
+        )
+    return aChanged
+
+
+def assign_pooled_trip(aCur, aPooledTripId, aBookingId, aVersion, aDriverId, anActor=None):
+    # The first statement takes SQLite's write lock, so the rest of the trip cannot change before commit.
+    if not transition_booking(aCur, aBookingId, aVersion, "assign", aDriverId, anActor=anActor):
+        return False
+    aCur.execute("SELECT COUNT(*) FROM bookings WHERE pooled_trip_id = ? AND status = 'pending'", (aPooledTripId,))
+    aPendingRiders = aCur.fetchone()[0]
+    aCur.execute(
+        f"UPDATE bookings SET driver_id = ?, status = 'assigned', version = version + 1 WHERE pooled_trip_id = ? AND status = 'pending' AND {get_driver_free_condition('?')} RETURNING id",
+        (aDriverId, aPooledTripId, aDriverId),
+    )
+    anAssignedIds = [aRow[0] for aRow in aCur.fetchall()]
+    if len(anAssignedIds) != aPendingRiders:
+        # A rider the driver cannot take; the caller rolls back so the trip is never split across drivers.
+        return False
+    for anAssignedId in anAssignedIds:
+        audit_change(
+            aCur, anActor, "booking.assign", "booking", anAssignedId, {"status": "pending", "driver_id": None}, {"status": "assigned", "driver_id": aDriverId}
+        )
+    audit_change(
+        aCur, anActor, "pooled_trip.assign", "pooled_trip", aPooledTripId, None, {"driver_id": aDriverId, "riders_assigned": len(anAssignedIds) + 1}
+    )
+    return True
+
+
+def decline_booking(aCur, aBookingId, aVersion, aDriverId, anActor=None):
+    if not transition_booking(aCur, aBookingId, aVersion, "decline", aDriverId, anActor=anActor):
+        return False
+    # A pooled trip is one vehicle, so the driver hands back every rider and the trip is reassigned as a whole.
+    aCur.execute(
+        "UPDATE bookings SET driver_id = NULL, status = 'pending', version = version + 1 WHERE pooled_trip_id = (SELECT pooled_trip_id FROM bookings WHERE id = ?) AND driver_id = ? AND status = 'assigned' RETURNING id",
+        (aBookingId, aDriverId),
+    )
+    for (aReleasedId,) in aCur.fetchall():
+        audit_change(
+            aCur, anActor, "booking.decline", "booking", aReleasedId, {"status": "assigned", "driver_id": aDriverId}, {"status": "pending", "driver_id": None}
+        )
+    return True
+
+
+def delete_booking_version(aCur, aBookingId, aVersion, anActor=None):
+    anOldValues = get_audit_values(aCur, aBookingId, aVersion) if is_auditing() else None
+    aCur.execute("DELETE FROM bookings WHERE id = ? AND version = ?", (aBookingId, aVersion))
+    aDeleted = aCur.rowcount == 1
+    if aDeleted and anOldValues:
+        audit_change(aCur, anActor, "booking.delete", "booking", aBookingId, anOldValues, None)
+    return aDeleted
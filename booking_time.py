@@ -0,0 +1,30 @@
+import calendar
+from datetime import datetime, timedelta
+
+
+BOOKING_DATE_FORMAT = "%Y-%m-%d"
+BOOKING_TIME_FORMAT = "%H:%M"
+RIDE_DURATION_SECONDS = 3600
+
+
+# Booking timestamps are wall-clock times encoded as if they were UTC, so they
+# match SQLite's strftime('%s', booking_date || ' ' || booking_time).
+def to_epoch(aDate, aTime):
+    return datetime_to_epoch(datetime.strptime(f"{aDate} {aTime}", f"{BOOKING_DATE_FORMAT} {BOOKING_TIME_FORMAT}"))
+
+
+def datetime_to_epoch(aDatetime):
+    return calendar.timegm(aDatetime.timetuple())
+
+
+def from_epoch(aTimestamp):
+    aDatetime = datetime(1970, 1, 1) + timedelta(seconds=aTimestamp)
+    return aDatetime.strftime(BOOKING_DATE_FORMAT), aDatetime.strftime(BOOKING_TIME_FORMAT)
+
+
+def now_epoch():
+    return datetime_to_epoch(datetime.now())
+
+
+def today_start_epoch():
+    return datetime_to_epoch(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
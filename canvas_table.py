@@ -0,0 +1,163 @@
+import tkinter as tk
+from collections import namedtuple
+import customtkinter as CTk
+
+from styles import get_font, CARD_STYLE
+
+
+TABLE_ROW_HEIGHT = 40
+TABLE_HEIGHT = 520
+TABLE_PADDING = 10
+ACTION_BUTTON_WIDTH = 64
+ACTION_BUTTON_GAP = 6
+ROW_COLORS = ("#1A1F2E", "#161B28")
+
+TableAction = namedtuple("TableAction", ["label", "color", "callback", "is_visible"])
+
+
+class CanvasTable(CTk.CTkFrame):
+    def __init__(self, aParent, aColumns, aRowFormatter, anActions=(), aHeight=TABLE_HEIGHT, aRowHeight=TABLE_ROW_HEIGHT):
+        super().__init__(aParent, **CARD_STYLE)
+        self.columns = aColumns
+        self.row_formatter = aRowFormatter
+        self.actions = anActions
+        self.row_height = aRowHeight
+        self.records = []
+        self.actions_x = TABLE_PADDING + sum(aWidth for _, aWidth in aColumns)
+        self.table_width = self.actions_x + len(anActions) * (ACTION_BUTTON_WIDTH + ACTION_BUTTON_GAP) + TABLE_PADDING
+        self.cell_font = get_font(10)
+        self.header_font = get_font(10, "bold")
+        self.action_font = get_font(9, "bold")
+
+        self.header = tk.Canvas(
+            self, height=aRowHeight, width=self.table_width, bg=ROW_COLORS[0], highlightthickness=0
+        )
+        self.header.grid(row=0, column=0, sticky="ew", padx=(2, 0), pady=(2, 0))
+        self.canvas = tk.Canvas(
+            self,
+            height=aHeight,
+            width=self.table_width,
+            bg=ROW_COLORS[0],
+            highlightthickness=0,
+            yscrollincrement=aRowHeight,
+        )
+        self.canvas.grid(row=1, column=0, sticky="nsew", padx=(2, 0), pady=(0, 2))
+        self.scrollbar = CTk.CTkScrollbar(self, command=self.canvas.yview)
+        self.scrollbar.grid(row=1, column=1, sticky="ns", pady=(0, 2))
+        self.grid_columnconfigure(0, weight=1)
+
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.canvas.bind("<Configure>", lambda anEvent: self.redraw())
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Motion>", self.on_motion)
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+        self.canvas.bind("<Button-4>", self.on_mousewheel)
+        self.canvas.bind("<Button-5>", self.on_mousewheel)
+
+        self.draw_header()
+
+    def set_records(self, aRecords):
+        self.records = list(aRecords)
+        self.canvas.configure(scrollregion=(0, 0, self.table_width, len(self.records) * self.row_height))
+        self.canvas.yview_moveto(0)
+        self.redraw()
+
+    def draw_header(self):
+        aX = TABLE_PADDING
+        for aTitle, aWidth in self.columns:
+            self.header.create_text(
+                aX, self.row_height / 2, anchor="w", text=aTitle, fill="#FFD700", font=self.header_font
+            )
+            aX += aWidth
+        self.header.create_line(0, self.row_height - 1, self.table_width, self.row_height - 1, fill="#2D3748")
+
+    def on_scroll(self, aFirst, aLast):
+        self.scrollbar.set(aFirst, aLast)
+        self.redraw()
+
+    def redraw(self):
+        self.canvas.delete("row")
+        aTop = self.canvas.canvasy(0)
+        aFirst = max(0, int(aTop // self.row_height))
+        aLast = min(len(self.records), int((aTop + self.canvas.winfo_height()) // self.row_height) + 1)
+        for anIndex in range(aFirst, aLast):
+            self.draw_row(anIndex)
+
+    def draw_row(self, anIndex):
+        aRecord = self.records[anIndex]
+        aTop = anIndex * self.row_height
+        aMiddle = aTop + self.row_height / 2
+        self.canvas.create_rectangle(
+            0, aTop, self.table_width, aTop + self.row_height, fill=ROW_COLORS[anIndex % 2], outline="", tags="row"
+        )
+
+        aTexts, aColors = self.row_formatter(aRecord)
+        aX = TABLE_PADDING
+        for (_, aWidth), aText, aColor in zip(self.columns, aTexts, aColors):
+            self.canvas.create_text(
+                aX,
+                aMiddle,
+                anchor="w",
+                text=self.fit_text(str(aText), aWidth - 8),
+                fill=aColor,
+                font=self.cell_font,
+                tags="row",
+            )
+            aX += aWidth
+
+        for aLeft, aButtonTop, aRight, aButtonBottom, anAction in self.get_action_boxes(aRecord, aTop):
+            self.canvas.create_rectangle(
+                aLeft, aButtonTop, aRight, aButtonBottom, fill=anAction.color, outline="", tags="row"
+            )
+            self.canvas.create_text(
+                (aLeft + aRight) / 2,
+                aMiddle,
+                text=anAction.label,
+                fill="#FFFFFF",
+                font=self.action_font,
+                tags="row",
+            )
+
+    def fit_text(self, aText, aWidth):
+        if self.cell_font.measure(aText) <= aWidth:
+            return aText
+        while aText and self.cell_font.measure(aText + "...") > aWidth:
+            aText = aText[:-1]
+        return aText + "..."
+
+    def get_action_boxes(self, aRecord, aTop):
+        aBoxes = []
+        aX = self.actions_x
+        for anAction in self.actions:
+            if anAction.is_visible(aRecord):
+                aBoxes.append((aX, aTop + 7, aX + ACTION_BUTTON_WIDTH, aTop + self.row_height - 7, anAction))
+            aX += ACTION_BUTTON_WIDTH + ACTION_BUTTON_GAP
+        return aBoxes
+
+    def hit_test(self, anEvent):
+        aY = self.canvas.canvasy(anEvent.y)
+        aX = self.canvas.canvasx(anEvent.x)
+        anIndex = int(aY // self.row_height)
+        if not 0 <= anIndex < len(self.records):
+            return None, None
+        aRecord = self.records[anIndex]
+        for aLeft, aTop, aRight, aBottom, anAction in self.get_action_boxes(aRecord, anIndex * self.row_height):
+            if aLeft <= aX <= aRight and aTop <= aY <= aBottom:
+                return aRecord, anAction
+        return aRecord, None
+
+    def on_click(self, anEvent):
+        aRecord, anAction = self.hit_test(anEvent)
+        if anAction:
+            anAction.callback(aRecord)
+
+    def on_motion(self, anEvent):
+        _, anAction = self.hit_test(anEvent)
+        self.canvas.configure(cursor="hand2" if anAction else "")
+
+    def on_mousewheel(self, anEvent):
+        if anEvent.num == 4 or getattr(anEvent, "delta", 0) > 0:
+            self.canvas.yview_scroll(-3, "units")
+        else:
+            self.canvas.yview_scroll(3, "units")
+        return "break"
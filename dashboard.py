@@ -1,11 +1,16 @@
 import customtkinter as CTk
 from tkinter import messagebox
 import sqlite3
+import queue
 from datetime import datetime, timedelta
 
 from dashboard_customer import CustomerDashboardMixin
 from dashboard_driver import DriverDashboardMixin
 from dashboard_admin import AdminDashboardMixin
+from styles import get_font
+from notifications import NotificationClient
+
+NOTIFICATION_POLL_MS = 200
 
 CTk.set_appearance_mode("dark")
 CTk.set_default_color_theme("blue")
@@ -51,14 +56,14 @@ class DashboardPage(
         CTk.CTkLabel(
             aTitleFrame,
             text=aDashboardTitle,
-            font=CTk.CTkFont(family="Segoe UI", size=28, weight="bold"),
+            font=get_font(28, "bold"),
             text_color="#FFD700",
         ).pack(side="left")
 
         CTk.CTkButton(
             aTitleFrame,
             text="Logout",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             fg_color="#FF6B6B",
             hover_color="#FF5252",
             text_color="#FFFFFF",
@@ -70,7 +75,7 @@ class DashboardPage(
         CTk.CTkLabel(
             aHeaderContent,
             text=f"Welcome back, {self.user_name.capitalize()}!",
-            font=CTk.CTkFont(family="Segoe UI", size=16),
+            font=get_font(16),
             text_color="#B0B8C1",
         ).pack(anchor="w")
 
@@ -86,5 +91,41 @@ class DashboardPage(
             self.show_driver_dashboard(aContentFrame)
         elif self.user_role.lower() == "admin":
             self.show_admin_dashboard(aContentFrame)
+
+        self.notification_client = None
+        if self.user_role.lower() in ("customer", "driver") and self.user_id is not None:
+            self.notification_queue = queue.Queue()
+            self.notification_client = NotificationClient(self.user_id, self.notification_queue)
+            self.notification_client.start()
+            self.poll_notifications()
+
+    def poll_notifications(self):
+        if not self.winfo_exists():
+            self.notification_client.stop()
+            return
+
+        aEvents = []
+        try:
+            while True:
+                aEvents.append(self.notification_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        # A burst of events (a pooled trip, a cancelled series) is handled as one redraw.
+        if aEvents:
+            if self.user_role.lower() == "customer":
+                self.on_booking_notifications(aEvents)
+            else:
+                self.on_ride_notifications(aEvents)
+
+        self.after(NOTIFICATION_POLL_MS, self.poll_notifications)
+
+    def destroy(self):
+        if self.notification_client:
+            self.notification_client.stop()
+        super().destroy()
+
     def logout(self):
+        if self.notification_client:
+            self.notification_client.stop()
         self.controller.show_login()
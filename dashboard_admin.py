@@ -1,10 +1,31 @@
 import customtkinter as CTk
 from tkinter import messagebox
 import sqlite3
-from datetime import datetime, timedelta
 import os
+import queue
 from PIL import ImageTk
 
+from db_setup import get_connection, get_write_connection
+from styles import get_font, get_theme_font, CARD_STYLE, STATUS_COLORS, ROLE_COLORS
+from user_deletion import UserDeletionJob
+from canvas_table import CanvasTable, TableAction, TABLE_ROW_HEIGHT
+from user_directory import USER_DIRECTORY
+from booking_time import RIDE_DURATION_SECONDS, today_start_epoch, from_epoch
+from locations import LOCATION_CACHE, resolve_location_names
+from booking_snapshot import BOOKING_SNAPSHOT
+from demand_forecast import build_demand_forecast, HOUR_SECONDS
+from spatial_grid import load_cell_counts, render_heatmap
+from ride_pooling import suggest_pools, create_pooled_trip
+from driver_telemetry import DRIVER_POSITIONS
+from booking_state import transition_booking, assign_pooled_trip, delete_booking_version
+from audit import get_user_actor
+
+
+CARD_VIEW_LIMIT = 50
+NEAREST_DRIVER_COUNT = 5
+BOOKING_CHANGED_TITLE = "Booking Changed"
+BOOKING_CHANGED_MESSAGE = "This booking was changed by someone else. The list has been refreshed."
+
 
 class AdminDashboardMixin:
     def show_admin_dashboard(self, aParent):
@@ -14,7 +35,7 @@ class AdminDashboardMixin:
         self.users_tab = CTk.CTkButton(
             aTabFrame,
             text="Users",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             fg_color="#FFD700",
             text_color="#000000",
             hover_color="#FFC700",
@@ -27,7 +48,7 @@ class AdminDashboardMixin:
         self.bookings_admin_tab = CTk.CTkButton(
             aTabFrame,
             text="Bookings",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             fg_color="#2D3748",
             text_color="#E2E8F0",
             hover_color="#374151",
@@ -40,7 +61,7 @@ class AdminDashboardMixin:
         self.reports_tab = CTk.CTkButton(
             aTabFrame,
             text="Reports",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             fg_color="#2D3748",
             text_color="#E2E8F0",
             hover_color="#374151",
@@ -67,12 +88,31 @@ class AdminDashboardMixin:
         CTk.CTkLabel(
             aContainer,
             text="User Management",
-            font=CTk.CTkFont(family="Segoe UI", size=24, weight="bold"),
+            font=get_font(24, "bold"),
             text_color="#E2E8F0",
         ).pack(anchor="w", pady=(0, 25))
 
+        self.user_deletion_label = None
+        aRunningJob = getattr(self, "user_deletion_job", None)
+        if aRunningJob and aRunningJob.is_alive():
+            aProgressCard = CTk.CTkFrame(
+                aContainer,
+                **CARD_STYLE,
+            )
+            aProgressCard.pack(fill="x", pady=(0, 15))
+            self.user_deletion_label = CTk.CTkLabel(
+                aProgressCard,
+                text=f"Deleting '{self.user_deletion_name}'...",
+                font=get_font(11, "bold"),
+                text_color="#FFD700",
+            )
+            self.user_deletion_label.pack(anchor="w", padx=20, pady=(15, 8))
+            self.user_deletion_progress = CTk.CTkProgressBar(aProgressCard, progress_color="#FFD700")
+            self.user_deletion_progress.set(0)
+            self.user_deletion_progress.pack(fill="x", padx=20, pady=(0, 15))
+
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_connection()
             aCur = aConn.cursor()
             aCur.execute("SELECT id, name, email, phone, role FROM users ORDER BY id DESC")
             aUsers = aCur.fetchall()
@@ -80,7 +120,7 @@ class AdminDashboardMixin:
 
             if not aUsers:
                 CTk.CTkLabel(
-                    aContainer, text="No users found.", font=CTk.CTkFont(size=14), text_color="#B0B8C1"
+                    aContainer, text="No users found.", font=get_theme_font(14), text_color="#B0B8C1"
                 ).pack(pady=20)
                 return
 
@@ -88,10 +128,7 @@ class AdminDashboardMixin:
                 aUserId, aName, anEmail, aPhone, aRole = aUser
                 aUserCard = CTk.CTkFrame(
                     aContainer,
-                    fg_color="#1A1F2E",
-                    corner_radius=10,
-                    border_width=1,
-                    border_color="#2D3748",
+                    **CARD_STYLE,
                 )
                 aUserCard.pack(fill="x", pady=8)
                 anInfoFrame = CTk.CTkFrame(aUserCard, fg_color="transparent")
@@ -105,36 +142,35 @@ class AdminDashboardMixin:
                 CTk.CTkLabel(
                     aLeftCol,
                     text=f"Name: {aName}",
-                    font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+                    font=get_font(12, "bold"),
                     text_color="#E2E8F0",
                 ).pack(anchor="w")
                 CTk.CTkLabel(
                     aLeftCol,
                     text=f"Email: {anEmail}",
-                    font=CTk.CTkFont(family="Segoe UI", size=10),
+                    font=get_font(10),
                     text_color="#B0B8C1",
                 ).pack(anchor="w", pady=(3, 0))
 
                 aRightCol = CTk.CTkFrame(anInfoGrid, fg_color="transparent")
                 aRightCol.pack(side="left", fill="both", expand=True)
-                aRoleColors = {"customer": "#4FC3F7", "driver": "#FFD700", "admin": "#FF6B6B"}
                 CTk.CTkLabel(
                     aRightCol,
                     text=f"Role: {aRole.capitalize()}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11, weight="bold"),
-                    text_color=aRoleColors.get(aRole.lower(), "#B0B8C1"),
+                    font=get_font(11, "bold"),
+                    text_color=ROLE_COLORS.get(aRole.lower(), "#B0B8C1"),
                 ).pack(anchor="w")
                 CTk.CTkLabel(
                     aRightCol,
                     text=f"Phone: {aPhone}",
-                    font=CTk.CTkFont(family="Segoe UI", size=10),
+                    font=get_font(10),
                     text_color="#B0B8C1",
                 ).pack(anchor="w", pady=(3, 0))
 
                 CTk.CTkButton(
                     anInfoFrame,
                     text="Delete User",
-                    font=CTk.CTkFont(family="Segoe UI", size=9, weight="bold"),
+                    font=get_font(9, "bold"),
                     fg_color="#FF6B6B",
                     hover_color="#FF5252",
                     text_color="#FFFFFF",
@@ -148,20 +184,53 @@ class AdminDashboardMixin:
             messagebox.showerror("Database Error", f"Failed to fetch users: {str(anError)}")
 
     def delete_user(self, aUserId, aUserName):
+        aRunningJob = getattr(self, "user_deletion_job", None)
+        if aRunningJob and aRunningJob.is_alive():
+            messagebox.showwarning(
+                "Deletion In Progress", "Another user is still being deleted. Please wait for it to finish."
+            )
+            return
+
         if messagebox.askyesno(
             "Confirm Delete", f"Are you sure you want to delete user '{aUserName}'?\nThis action cannot be undone."
         ):
-            try:
-                aConn = sqlite3.connect("taxi.db")
-                aCur = aConn.cursor()
-                aCur.execute("DELETE FROM bookings WHERE user_id = ?", (aUserId,))
-                aCur.execute("DELETE FROM users WHERE id = ?", (aUserId,))
-                aConn.commit()
-                aConn.close()
-                messagebox.showinfo("Success", f"User '{aUserName}' deleted successfully.")
-                self.show_users_management()
-            except sqlite3.Error as anError:
-                messagebox.showerror("Database Error", f"Failed to delete user: {str(anError)}")
+            self.user_deletion_name = aUserName
+            self.user_deletion_queue = queue.Queue()
+            self.user_deletion_job = UserDeletionJob(aUserId, self.user_deletion_queue, get_user_actor(self.user_id))
+            self.user_deletion_job.start()
+            self.show_users_management()
+            self.poll_user_deletion()
+
+    def poll_user_deletion(self):
+        if not self.winfo_exists():
+            return
+
+        try:
+            while True:
+                aKind, aProcessed, aTotal, anErrorText = self.user_deletion_queue.get_nowait()
+                aShowingUsers = self.user_deletion_label is not None and self.user_deletion_label.winfo_exists()
+
+                if aKind == "progress":
+                    if aShowingUsers:
+                        self.user_deletion_label.configure(
+                            text=f"Deleting '{self.user_deletion_name}': {aProcessed} of {aTotal} records processed"
+                        )
+                        self.user_deletion_progress.set(aProcessed / aTotal if aTotal else 0)
+                elif aKind == "done":
+                    USER_DIRECTORY.invalidate(self.user_deletion_job.user_id)
+                    messagebox.showinfo("Success", f"User '{self.user_deletion_name}' deleted successfully.")
+                    if aShowingUsers:
+                        self.show_users_management()
+                    return
+                elif aKind == "error":
+                    messagebox.showerror("Database Error", f"Failed to delete user: {anErrorText}")
+                    if aShowingUsers:
+                        self.show_users_management()
+                    return
+        except queue.Empty:
+            pass
+
+        self.after(100, self.poll_user_deletion)
 
     def show_bookings_management(self):
         for aWidget in self.admin_content_area.winfo_children():
@@ -173,36 +242,56 @@ class AdminDashboardMixin:
 
         aContainer = CTk.CTkFrame(self.admin_content_area, fg_color="transparent")
         aContainer.pack(fill="both", expand=True)
+        aTitleRow = CTk.CTkFrame(aContainer, fg_color="transparent")
+        aTitleRow.pack(fill="x", pady=(0, 25))
         CTk.CTkLabel(
-            aContainer,
+            aTitleRow,
             text="All Bookings",
-            font=CTk.CTkFont(family="Segoe UI", size=24, weight="bold"),
+            font=get_font(24, "bold"),
             text_color="#E2E8F0",
-        ).pack(anchor="w", pady=(0, 25))
+        ).pack(side="left")
+        CTk.CTkButton(
+            aTitleRow,
+            text="Suggest Shared Rides",
+            font=get_font(11, "bold"),
+            fg_color="#4FC3F7",
+            hover_color="#29B6F6",
+            text_color="#0A192F",
+            height=32,
+            corner_radius=6,
+            command=self.show_pool_suggestions,
+        ).pack(side="right")
 
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_connection()
             aCur = aConn.cursor()
             aCur.execute(
-                "SELECT b.id, u1.name, b.pickup_location, b.dropoff_location, b.booking_date, b.booking_time, b.status, u2.name FROM bookings b JOIN users u1 ON b.user_id = u1.id LEFT JOIN users u2 ON b.driver_id = u2.id ORDER BY b.created_at DESC"
+                "SELECT id, user_id, pickup_location_id, dropoff_location_id, booking_date, booking_time, status, driver_id, start_ts, pooled_trip_id, version FROM bookings ORDER BY created_at DESC"
             )
-            aBookings = aCur.fetchall()
+            aRows = resolve_location_names(aCur.fetchall(), 2)
             aConn.close()
 
+            USER_DIRECTORY.sync().preload([anId for aRow in aRows for anId in (aRow[1], aRow[7])])
+            aBookings = [
+                (aBookingId, USER_DIRECTORY.get_name(aUserId, "Unknown"), aPickup, aDropoff, aDate, aTime, aStatus, USER_DIRECTORY.get_name(aDriverId), aStartTs, aPooledTripId, aVersion)
+                for aBookingId, aUserId, aPickup, aDropoff, aDate, aTime, aStatus, aDriverId, aStartTs, aPooledTripId, aVersion in aRows
+            ]
+
             if not aBookings:
                 CTk.CTkLabel(
-                    aContainer, text="No bookings found.", font=CTk.CTkFont(size=14), text_color="#B0B8C1"
+                    aContainer, text="No bookings found.", font=get_theme_font(14), text_color="#B0B8C1"
                 ).pack(pady=20)
                 return
 
+            if len(aBookings) > CARD_VIEW_LIMIT:
+                self.show_bookings_table(aContainer, aBookings)
+                return
+
             for aBooking in aBookings:
-                aBookingId, aCustomer, aPickup, aDropoff, aDate, aTime, aStatus, aDriver = aBooking
+                aBookingId, aCustomer, aPickup, aDropoff, aDate, aTime, aStatus, aDriver, aStartTs, aPooledTripId, aVersion = aBooking
                 aBookingCard = CTk.CTkFrame(
                     aContainer,
-                    fg_color="#1A1F2E",
-                    corner_radius=10,
-                    border_width=1,
-                    border_color="#2D3748",
+                    **CARD_STYLE,
                 )
                 aBookingCard.pack(fill="x", pady=8)
                 anInfoFrame = CTk.CTkFrame(aBookingCard, fg_color="transparent")
@@ -213,53 +302,54 @@ class AdminDashboardMixin:
                 CTk.CTkLabel(
                     aHeader,
                     text=f"Booking #{aBookingId}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11, weight="bold"),
+                    font=get_font(11, "bold"),
                     text_color="#FFD700",
                 ).pack(side="left")
-                aStatusColors = {
-                    "pending": "#FFD700",
-                    "assigned": "#81C784",
-                    "completed": "#4CAF50",
-                    "cancelled": "#E57373",
-                }
+                if aPooledTripId:
+                    CTk.CTkLabel(
+                        aHeader,
+                        text=f"Shared trip #{aPooledTripId}",
+                        font=get_font(10, "bold"),
+                        text_color="#4FC3F7",
+                    ).pack(side="left", padx=(10, 0))
                 CTk.CTkLabel(
                     aHeader,
                     text=aStatus.capitalize(),
-                    font=CTk.CTkFont(family="Segoe UI", size=10, weight="bold"),
-                    text_color=aStatusColors.get(aStatus, "#B0B8C1"),
+                    font=get_font(10, "bold"),
+                    text_color=STATUS_COLORS.get(aStatus, "#B0B8C1"),
                 ).pack(side="right")
 
                 CTk.CTkLabel(
                     anInfoFrame,
                     text=f"Customer: {aCustomer}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11),
+                    font=get_font(11),
                     text_color="#E2E8F0",
                 ).pack(anchor="w")
                 if aDriver:
                     CTk.CTkLabel(
                         anInfoFrame,
                         text=f"Driver: {aDriver}",
-                        font=CTk.CTkFont(family="Segoe UI", size=11),
+                        font=get_font(11),
                         text_color="#4FC3F7",
                     ).pack(anchor="w", pady=(3, 10))
                 else:
                     CTk.CTkLabel(
                         anInfoFrame,
                         text="Driver: Not assigned",
-                        font=CTk.CTkFont(family="Segoe UI", size=11),
+                        font=get_font(11),
                         text_color="#B0B8C1",
                     ).pack(anchor="w", pady=(3, 10))
 
                 CTk.CTkLabel(
                     anInfoFrame,
                     text=f"{aPickup} -> {aDropoff}",
-                    font=CTk.CTkFont(family="Segoe UI", size=10),
+                    font=get_font(10),
                     text_color="#B0B8C1",
                 ).pack(anchor="w")
                 CTk.CTkLabel(
                     anInfoFrame,
                     text=f"{aDate} at {aTime}",
-                    font=CTk.CTkFont(family="Segoe UI", size=10),
+                    font=get_font(10),
                     text_color="#B0B8C1",
                 ).pack(anchor="w", pady=(3, 10))
 
@@ -270,93 +360,126 @@ class AdminDashboardMixin:
                     CTk.CTkButton(
                         aButtonFrame,
                         text="Assign Driver",
-                        font=CTk.CTkFont(family="Segoe UI", size=9, weight="bold"),
+                        font=get_font(9, "bold"),
                         fg_color="#10B981",
                         hover_color="#059669",
                         text_color="#FFFFFF",
                         height=28,
                         width=100,
                         corner_radius=6,
-                        command=lambda aBid=aBookingId, aBdate=aDate, aBtime=aTime: self.assign_driver_to_booking(aBid, aBdate, aBtime),
+                        command=lambda aBid=aBookingId, aStart=aStartTs, aTrip=aPooledTripId, aVer=aVersion: self.assign_driver_to_booking(aBid, aStart, aTrip, aVer),
                     ).pack(side="left", padx=(0, 8))
 
                 CTk.CTkButton(
                     aButtonFrame,
                     text="Delete",
-                    font=CTk.CTkFont(family="Segoe UI", size=9, weight="bold"),
+                    font=get_font(9, "bold"),
                     fg_color="#FF6B6B",
                     hover_color="#FF5252",
                     text_color="#FFFFFF",
                     height=28,
                     width=80,
                     corner_radius=6,
-                    command=lambda aBid=aBookingId: self.delete_booking(aBid),
+                    command=lambda aBid=aBookingId, aVer=aVersion: self.delete_booking(aBid, aVer),
                 ).pack(side="right")
 
         except sqlite3.Error as anError:
             messagebox.showerror("Database Error", f"Failed to fetch bookings: {str(anError)}")
 
-    def check_booking_overlap(self, aDriverId, aBookingDate, aBookingTime, anExcludeBookingId=None):
+    def show_bookings_table(self, aContainer, aBookings):
+        def format_booking_row(aBooking):
+            aBookingId, aCustomer, aPickup, aDropoff, aDate, aTime, aStatus, aDriver, aStartTs, aPooledTripId, aVersion = aBooking
+            return (
+                [f"#{aBookingId} (S{aPooledTripId})" if aPooledTripId else f"#{aBookingId}", aCustomer, aDriver or "Not assigned", f"{aPickup} -> {aDropoff}", f"{aDate} {aTime}", aStatus.capitalize()],
+                ["#FFD700", "#E2E8F0", "#4FC3F7" if aDriver else "#B0B8C1", "#B0B8C1", "#B0B8C1", STATUS_COLORS.get(aStatus, "#B0B8C1")],
+            )
+
+        aTable = CanvasTable(
+            aContainer,
+            [("Booking", 90), ("Customer", 110), ("Driver", 110), ("Route", 190), ("When", 115), ("Status", 80)],
+            format_booking_row,
+            [
+                TableAction(
+                    "Assign",
+                    "#10B981",
+                    lambda aBooking: self.assign_driver_to_booking(aBooking[0], aBooking[8], aBooking[9], aBooking[10]),
+                    lambda aBooking: aBooking[6] == "pending" and not aBooking[7],
+                ),
+                TableAction(
+                    "Delete", "#FF6B6B", lambda aBooking: self.delete_booking(aBooking[0], aBooking[10]), lambda aBooking: True
+                ),
+            ],
+        )
+        aTable.pack(fill="x")
+        aTable.set_records(aBookings)
+
+    def check_booking_overlap(self, aDriverId, aStartTs, anExcludeBookingId=None, anExcludePooledTripId=None):
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_connection()
             aCur = aConn.cursor()
 
             aQuery = """
-                SELECT id, booking_date, booking_time, status 
-                FROM bookings 
-                WHERE driver_id = ? AND booking_date = ? AND status IN ('pending', 'assigned')
+                SELECT 1
+                FROM bookings
+                WHERE driver_id = ? AND start_ts > ? AND start_ts < ? AND end_ts > ? AND status IN ('pending', 'assigned')
             """
-            aParams = [aDriverId, aBookingDate]
+            aParams = [aDriverId, aStartTs - RIDE_DURATION_SECONDS, aStartTs + RIDE_DURATION_SECONDS, aStartTs]
 
             if anExcludeBookingId:
                 aQuery += " AND id != ?"
                 aParams.append(anExcludeBookingId)
+            if anExcludePooledTripId:
+                aQuery += " AND (pooled_trip_id IS NULL OR pooled_trip_id != ?)"
+                aParams.append(anExcludePooledTripId)
 
-            aCur.execute(aQuery, aParams)
-            anExistingBookings = aCur.fetchall()
+            aCur.execute(aQuery + " LIMIT 1", aParams)
+            anOverlap = aCur.fetchone() is not None
             aConn.close()
-
-            if not anExistingBookings:
-                return False
-
-            try:
-                aBookingDatetime = datetime.strptime(f"{aBookingDate} {aBookingTime}", "%Y-%m-%d %H:%M")
-            except ValueError:
-                return False
-
-            aRideDuration = timedelta(hours=1)
-            aBookingEnd = aBookingDatetime + aRideDuration
-
-            for anExistingId, anExistingDate, anExistingTime, anExistingStatus in anExistingBookings:
-                try:
-                    anExistingDatetime = datetime.strptime(f"{anExistingDate} {anExistingTime}", "%Y-%m-%d %H:%M")
-                    anExistingEnd = anExistingDatetime + aRideDuration
-
-                    if (aBookingDatetime < anExistingEnd and anExistingDatetime < aBookingEnd):
-                        return True
-                except ValueError:
-                    continue
-
-            return False
+            return anOverlap
         except sqlite3.Error:
             return False
 
-    def assign_driver_to_booking(self, aBookingId, aBookingDate, aBookingTime):
+    def get_driver_choices(self, aDrivers, aBookingId, aStartTs, aPooledTripId):
+        aNamesById = dict(aDrivers)
+        aConn = get_connection()
         try:
-            aConn = sqlite3.connect("taxi.db")
             aCur = aConn.cursor()
-
-            aCur.execute("SELECT id, name FROM users WHERE LOWER(role) = 'driver' ORDER BY name")
-            aDrivers = aCur.fetchall()
+            aCur.execute(
+                "SELECT p.latitude, p.longitude FROM bookings b JOIN locations p ON p.id = b.pickup_location_id WHERE b.id = ?",
+                (aBookingId,),
+            )
+            aPickup = aCur.fetchone()
+        finally:
             aConn.close()
 
+        aNearest = []
+        if aPickup and aPickup[0] is not None:
+            aNearest = DRIVER_POSITIONS.nearest(
+                aPickup[0],
+                aPickup[1],
+                NEAREST_DRIVER_COUNT,
+                lambda aDriverId: aDriverId in aNamesById
+                and not self.check_booking_overlap(aDriverId, aStartTs, aBookingId, aPooledTripId),
+            )
+
+        aChoices = [f"{aNamesById[aDid]} (ID: {aDid}) - {aDistance:.1f} km away" for aDid, aDistance in aNearest]
+        aNearestIds = {aDid for aDid, _ in aNearest}
+        aChoices += [f"{aName} (ID: {aDid})" for aDid, aName in aDrivers if aDid not in aNearestIds]
+        return aChoices
+
+    def assign_driver_to_booking(self, aBookingId, aStartTs, aPooledTripId, aVersion):
+        try:
+            aDrivers = [(aUser[0], aUser[1]) for aUser in USER_DIRECTORY.sync().get_users_by_role("driver")]
+
             if not aDrivers:
                 messagebox.showwarning("No Drivers", "No drivers available. Please register drivers first.")
                 return
 
+            aDriverNames = self.get_driver_choices(aDrivers, aBookingId, aStartTs, aPooledTripId)
+
             aDialog = CTk.CTkToplevel(self)
             aDialog.title("Assign Driver")
-            aDialog.geometry("400x200")
+            aDialog.geometry("460x200")
             aDialog.transient(self)
             aDialog.grab_set()
             
@@ -372,17 +495,16 @@ class AdminDashboardMixin:
             CTk.CTkLabel(
                 aDialog,
                 text="Select Driver",
-                font=CTk.CTkFont(family="Segoe UI", size=16, weight="bold"),
+                font=get_font(16, "bold"),
                 text_color="#E2E8F0",
             ).pack(pady=(20, 10))
 
-            aDriverNames = [f"{aName} (ID: {aDid})" for aDid, aName in aDrivers]
             aDriverVar = CTk.StringVar(value=aDriverNames[0])
             aDriverMenu = CTk.CTkOptionMenu(
                 aDialog,
                 values=aDriverNames,
                 variable=aDriverVar,
-                width=300,
+                width=400,
                 height=35,
             )
             aDriverMenu.pack(pady=10)
@@ -391,26 +513,34 @@ class AdminDashboardMixin:
                 aSelected = aDriverVar.get()
                 aDriverId = int(aSelected.split("(ID: ")[1].split(")")[0])
 
-                if self.check_booking_overlap(aDriverId, aBookingDate, aBookingTime, aBookingId):
-                    messagebox.showerror(
-                        "Overlap Detected",
-                        "This driver already has a booking at this time. Please select a different driver or time.",
-                    )
-                    return
-
                 try:
-                    aConn = sqlite3.connect("taxi.db")
+                    aConn = get_write_connection()
                     aCur = aConn.cursor()
-                    aCur.execute(
-                        "UPDATE bookings SET driver_id = ?, status = 'assigned' WHERE id = ?",
-                        (aDriverId, aBookingId),
-                    )
-                    aConn.commit()
-
-                    aCur.execute("SELECT name FROM users WHERE id = ?", (aDriverId,))
-                    aDriverName = aCur.fetchone()[0]
+                    anActor = get_user_actor(self.user_id)
+                    if aPooledTripId:
+                        anAssigned = assign_pooled_trip(aCur, aPooledTripId, aBookingId, aVersion, aDriverId, anActor)
+                    else:
+                        anAssigned = transition_booking(aCur, aBookingId, aVersion, "assign", aDriverId, anActor=anActor)
+                    if anAssigned:
+                        aConn.commit()
+                    else:
+                        aConn.rollback()
                     aConn.close()
 
+                    if not anAssigned:
+                        if self.check_booking_overlap(aDriverId, aStartTs, aBookingId, aPooledTripId):
+                            messagebox.showerror(
+                                "Overlap Detected",
+                                "This driver already has a booking at this time. Please select a different driver or time.",
+                            )
+                        else:
+                            messagebox.showerror(BOOKING_CHANGED_TITLE, BOOKING_CHANGED_MESSAGE)
+                            aDialog.destroy()
+                            self.show_bookings_management()
+                        return
+
+                    aDriverName = USER_DIRECTORY.get_name(aDriverId)
+
                     messagebox.showinfo("Success", f"Driver {aDriverName} assigned successfully!")
                     aDialog.destroy()
                     self.show_bookings_management()
@@ -430,15 +560,96 @@ class AdminDashboardMixin:
         except sqlite3.Error as anError:
             messagebox.showerror("Database Error", f"Failed to load drivers: {str(anError)}")
 
-    def delete_booking(self, aBookingId):
+    def show_pool_suggestions(self):
+        try:
+            aConn = get_connection()
+            aSuggestions = suggest_pools(aConn.cursor())
+            aConn.close()
+        except sqlite3.Error as anError:
+            messagebox.showerror("Database Error", f"Failed to find shared rides: {str(anError)}")
+            return
+
+        if not aSuggestions:
+            messagebox.showinfo(
+                "Shared Rides", "No pending bookings in the next 24 hours can be shared within the allowed detour."
+            )
+            return
+
+        aDialog = CTk.CTkToplevel(self)
+        aDialog.title("Suggested Shared Rides")
+        aDialog.geometry("560x480")
+        aDialog.transient(self)
+        aDialog.grab_set()
+
+        CTk.CTkLabel(
+            aDialog,
+            text="Suggested Shared Rides",
+            font=get_font(16, "bold"),
+            text_color="#E2E8F0",
+        ).pack(pady=(20, 10))
+
+        aList = CTk.CTkScrollableFrame(aDialog, fg_color="transparent")
+        aList.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+
+        def confirm_pool(aSuggestion, aButton):
+            try:
+                aConn = get_write_connection()
+                aCur = aConn.cursor()
+                aTripId = create_pooled_trip(aCur, aSuggestion, get_user_actor(self.user_id))
+                if aTripId is None:
+                    aConn.rollback()
+                    aConn.close()
+                    messagebox.showerror("Shared Rides", "One of these bookings has changed. Please refresh the suggestions.")
+                    return
+                aConn.commit()
+                aConn.close()
+                aButton.configure(text=f"Trip #{aTripId}", state="disabled")
+                self.show_bookings_management()
+            except sqlite3.Error as anError:
+                messagebox.showerror("Database Error", f"Failed to create shared ride: {str(anError)}")
+
+        for aSuggestion in aSuggestions:
+            aDate, aTime = from_epoch(aSuggestion.start_ts)
+            aRow = CTk.CTkFrame(aList, **CARD_STYLE)
+            aRow.pack(fill="x", pady=5)
+            CTk.CTkLabel(
+                aRow,
+                text=" + ".join(f"#{aBookingId}" for aBookingId in aSuggestion.booking_ids),
+                font=get_font(11, "bold"),
+                text_color="#FFD700",
+            ).pack(side="left", padx=(15, 10), pady=12)
+            CTk.CTkLabel(
+                aRow,
+                text=f"{aDate} {aTime} · saves {aSuggestion.separate_km - aSuggestion.pooled_km:.1f} km",
+                font=get_font(10),
+                text_color="#B0B8C1",
+            ).pack(side="left")
+            aButton = CTk.CTkButton(
+                aRow,
+                text="Share",
+                font=get_font(9, "bold"),
+                fg_color="#10B981",
+                hover_color="#059669",
+                text_color="#FFFFFF",
+                height=28,
+                width=80,
+                corner_radius=6,
+            )
+            aButton.configure(command=lambda aPool=aSuggestion, aPoolButton=aButton: confirm_pool(aPool, aPoolButton))
+            aButton.pack(side="right", padx=15)
+
+    def delete_booking(self, aBookingId, aVersion):
         if messagebox.askyesno("Confirm", "Delete this booking?"):
             try:
-                aConn = sqlite3.connect("taxi.db")
+                aConn = get_write_connection()
                 aCur = aConn.cursor()
-                aCur.execute("DELETE FROM bookings WHERE id = ?", (aBookingId,))
+                aDeleted = delete_booking_version(aCur, aBookingId, aVersion, get_user_actor(self.user_id))
                 aConn.commit()
                 aConn.close()
-                messagebox.showinfo("Success", "Booking deleted successfully.")
+                if aDeleted:
+                    messagebox.showinfo("Success", "Booking deleted successfully.")
+                else:
+                    messagebox.showerror(BOOKING_CHANGED_TITLE, BOOKING_CHANGED_MESSAGE)
                 self.show_bookings_management()
             except sqlite3.Error as anError:
                 messagebox.showerror("Database Error", f"Failed to delete booking: {str(anError)}")
@@ -456,29 +667,31 @@ class AdminDashboardMixin:
         CTk.CTkLabel(
             aContainer,
             text="Reports & Statistics",
-            font=CTk.CTkFont(family="Segoe UI", size=24, weight="bold"),
+            font=get_font(24, "bold"),
             text_color="#E2E8F0",
         ).pack(anchor="w", pady=(0, 25))
 
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_connection()
             aCur = aConn.cursor()
-            aCur.execute("SELECT COUNT(*) FROM users WHERE LOWER(role) = 'customer'")
+            aCur.execute("SELECT COUNT(*) FROM users WHERE role = 'customer'")
             aTotalCustomers = aCur.fetchone()[0]
-            aCur.execute("SELECT COUNT(*) FROM users WHERE LOWER(role) = 'driver'")
+            aCur.execute("SELECT COUNT(*) FROM users WHERE role = 'driver'")
             aTotalDrivers = aCur.fetchone()[0]
-            aCur.execute("SELECT COUNT(*) FROM bookings")
-            aTotalBookings = aCur.fetchone()[0]
-            aCur.execute("SELECT COUNT(*) FROM bookings WHERE status = 'pending'")
-            aPendingBookings = aCur.fetchone()[0]
-            aCur.execute("SELECT COUNT(*) FROM bookings WHERE status = 'assigned'")
-            anAssignedBookings = aCur.fetchone()[0]
-            aCur.execute("SELECT COUNT(*) FROM bookings WHERE status = 'completed'")
-            aCompletedBookings = aCur.fetchone()[0]
-            aCur.execute("SELECT COUNT(*) FROM bookings WHERE status = 'cancelled'")
-            aCancelledBookings = aCur.fetchone()[0]
             aConn.close()
 
+            BOOKING_SNAPSHOT.sync()
+            aStatusCounts = BOOKING_SNAPSHOT.count_by_status()
+            aTopPickups = BOOKING_SNAPSHOT.top_pickups(5)
+            aDemand = build_demand_forecast()
+            aPickupCells = load_cell_counts("pickup")
+
+            aTotalBookings = sum(aStatusCounts.values())
+            aPendingBookings = aStatusCounts.get("pending", 0)
+            anAssignedBookings = aStatusCounts.get("assigned", 0)
+            aCompletedBookings = aStatusCounts.get("completed", 0)
+            aCancelledBookings = aStatusCounts.get("cancelled", 0)
+
             aStatsGrid = CTk.CTkFrame(aContainer, fg_color="transparent")
             aStatsGrid.pack(fill="x", pady=(0, 30))
 
@@ -509,18 +722,106 @@ class AdminDashboardMixin:
                 side="left", fill="both", expand=True
             )
 
+            if aTopPickups:
+                CTk.CTkLabel(
+                    aContainer,
+                    text="Top Pickup Locations",
+                    font=get_font(16, "bold"),
+                    text_color="#E2E8F0",
+                ).pack(anchor="w", pady=(0, 10))
+                aPickupsCard = CTk.CTkFrame(aContainer, **CARD_STYLE)
+                aPickupsCard.pack(fill="x")
+                for aLocationId, aCount in aTopPickups:
+                    aPickupRow = CTk.CTkFrame(aPickupsCard, fg_color="transparent")
+                    aPickupRow.pack(fill="x", padx=20, pady=4)
+                    CTk.CTkLabel(
+                        aPickupRow,
+                        text=LOCATION_CACHE.get_name(aLocationId, "Unknown"),
+                        font=get_font(12),
+                        text_color="#E2E8F0",
+                    ).pack(side="left")
+                    CTk.CTkLabel(
+                        aPickupRow, text=str(aCount), font=get_font(12, "bold"), text_color="#FFD700"
+                    ).pack(side="right")
+
+            self.show_demand_forecast(aContainer, aDemand, aTotalDrivers)
+            self.show_pickup_heatmap(aContainer, aPickupCells)
+
         except sqlite3.Error as anError:
             messagebox.showerror("Database Error", f"Failed to fetch reports: {str(anError)}")
 
+    def show_demand_forecast(self, aContainer, aDemand, aTotalDrivers):
+        aTodayOffset = (today_start_epoch() - aDemand.week_start_ts) // HOUR_SECONDS
+        aHours = range(aTodayOffset, aTodayOffset + 24)
+
+        CTk.CTkLabel(
+            aContainer,
+            text="Today's Demand Forecast",
+            font=get_font(16, "bold"),
+            text_color="#E2E8F0",
+        ).pack(anchor="w", pady=(25, 10))
+
+        def format_forecast_row(anHour):
+            aDrivers = aDemand.recommended_drivers[anHour]
+            return (
+                (
+                    f"{anHour % 24:02d}:00",
+                    f"{aDemand.forecast[anHour]:.1f}",
+                    str(aDemand.actual[anHour]),
+                    str(aDrivers),
+                ),
+                (
+                    "#E2E8F0",
+                    "#4FC3F7",
+                    "#10B981",
+                    "#E57373" if aDrivers > aTotalDrivers else "#FFD700",
+                ),
+            )
+
+        aTable = CanvasTable(
+            aContainer,
+            [("Hour", 120), ("Forecast Rides", 180), ("Booked Rides", 180), ("Recommended Drivers", 200)],
+            format_forecast_row,
+            aHeight=TABLE_ROW_HEIGHT * 8,
+        )
+        aTable.pack(fill="x")
+        aTable.set_records(aHours)
+
+    def show_pickup_heatmap(self, aContainer, aCellCounts):
+        CTk.CTkLabel(
+            aContainer,
+            text="Pickup Heatmap",
+            font=get_font(16, "bold"),
+            text_color="#E2E8F0",
+        ).pack(anchor="w", pady=(25, 10))
+
+        if not aCellCounts:
+            CTk.CTkLabel(
+                aContainer,
+                text="No geocoded pickups yet. Use a Bedfordshire town name or \"lat, lon\" as the pickup location.",
+                font=get_font(12),
+                text_color="#7A8195",
+            ).pack(anchor="w")
+            return
+
+        anImage = render_heatmap(aCellCounts)
+        aHeatmapCard = CTk.CTkFrame(aContainer, **CARD_STYLE)
+        aHeatmapCard.pack(anchor="w")
+        CTk.CTkLabel(
+            aHeatmapCard,
+            text="",
+            image=CTk.CTkImage(light_image=anImage, dark_image=anImage, size=anImage.size),
+        ).pack(padx=10, pady=10)
+
     def create_stat_card(self, aParent, aTitle, aValue, aColor):
         aCard = CTk.CTkFrame(
             aParent, fg_color="#1A1F2E", corner_radius=10, border_width=2, border_color="#2D3748"
         )
-        CTk.CTkLabel(aCard, text=aTitle, font=CTk.CTkFont(family="Segoe UI", size=11), text_color="#B0B8C1").pack(
+        CTk.CTkLabel(aCard, text=aTitle, font=get_font(11), text_color="#B0B8C1").pack(
             pady=(15, 5)
         )
         CTk.CTkLabel(
-            aCard, text=aValue, font=CTk.CTkFont(family="Segoe UI", size=32, weight="bold"), text_color=aColor
+            aCard, text=aValue, font=get_font(32, "bold"), text_color=aColor
         ).pack(pady=(0, 15))
         return aCard
 
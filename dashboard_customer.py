@@ -5,6 +5,24 @@ from datetime import datetime
 import os
 from PIL import ImageTk
 
+from db_setup import get_connection, get_write_connection
+from styles import get_font, get_theme_font, CARD_STYLE, STATUS_COLORS
+from canvas_table import CanvasTable, TableAction
+from booking_time import to_epoch, now_epoch, RIDE_DURATION_SECONDS
+from locations import LOCATION_CACHE, resolve_location_names
+from booking_state import create_booking, transition_booking, get_driver_free_condition
+from recurring_bookings import (
+    RECURRENCE_LABELS,
+    create_recurring_booking,
+    stop_recurring_booking,
+)
+from audit import audit_change, get_user_actor
+
+
+CARD_VIEW_LIMIT = 50
+NO_REPEAT_LABEL = "Does not repeat"
+BOOKING_CHANGED_MESSAGE = "This booking was changed elsewhere. Your bookings have been refreshed."
+
 
 class CustomerDashboardMixin:
     def show_customer_dashboard(self, aParent):
@@ -14,7 +32,7 @@ class CustomerDashboardMixin:
         self.booking_tab = CTk.CTkButton(
             aTabFrame,
             text="Book a Ride",
-            font=CTk.CTkFont(family="Segoe UI", size=14, weight="bold"),
+            font=get_font(14, "bold"),
             fg_color="#FFD700",
             text_color="#000000",
             hover_color="#FFC700",
@@ -27,7 +45,7 @@ class CustomerDashboardMixin:
         self.bookings_tab = CTk.CTkButton(
             aTabFrame,
             text="My Bookings",
-            font=CTk.CTkFont(family="Segoe UI", size=14, weight="bold"),
+            font=get_font(14, "bold"),
             fg_color="#2D3748",
             text_color="#E2E8F0",
             hover_color="#374151",
@@ -42,6 +60,7 @@ class CustomerDashboardMixin:
         self.show_booking_form(aParent)
 
     def show_booking_form(self, aParent):
+        self.showing_my_bookings = False
         for aWidget in self.content_area.winfo_children():
             aWidget.destroy()
 
@@ -63,14 +82,14 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aFormContent,
             text="Plan Your Journey",
-            font=CTk.CTkFont(family="Segoe UI", size=24, weight="bold"),
+            font=get_font(24, "bold"),
             text_color="#E2E8F0",
         ).pack(anchor="w", pady=(0, 25))
 
         CTk.CTkLabel(
             aFormContent,
             text="Pickup Location",
-            font=CTk.CTkFont(family="Segoe UI", size=13, weight="bold"),
+            font=get_font(13, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 8))
         self.pickup_entry = CTk.CTkEntry(
@@ -82,7 +101,7 @@ class CustomerDashboardMixin:
             fg_color="#0F1419",
             text_color="#E2E8F0",
             placeholder_text_color="#7A8195",
-            font=CTk.CTkFont(size=12),
+            font=get_theme_font(12),
             corner_radius=8,
         )
         self.pickup_entry.pack(fill="x", pady=(0, 20))
@@ -90,7 +109,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aFormContent,
             text="Drop-off Location",
-            font=CTk.CTkFont(family="Segoe UI", size=13, weight="bold"),
+            font=get_font(13, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 8))
         self.dropoff_entry = CTk.CTkEntry(
@@ -102,7 +121,7 @@ class CustomerDashboardMixin:
             fg_color="#0F1419",
             text_color="#E2E8F0",
             placeholder_text_color="#7A8195",
-            font=CTk.CTkFont(size=12),
+            font=get_theme_font(12),
             corner_radius=8,
         )
         self.dropoff_entry.pack(fill="x", pady=(0, 20))
@@ -115,7 +134,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aDateCol,
             text="Date",
-            font=CTk.CTkFont(family="Segoe UI", size=13, weight="bold"),
+            font=get_font(13, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 8))
         self.date_entry = CTk.CTkEntry(
@@ -127,7 +146,7 @@ class CustomerDashboardMixin:
             fg_color="#0F1419",
             text_color="#E2E8F0",
             placeholder_text_color="#7A8195",
-            font=CTk.CTkFont(size=12),
+            font=get_theme_font(12),
             corner_radius=8,
         )
         self.date_entry.pack(fill="both", expand=True)
@@ -137,7 +156,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aTimeCol,
             text="Time",
-            font=CTk.CTkFont(family="Segoe UI", size=13, weight="bold"),
+            font=get_font(13, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 8))
         self.time_entry = CTk.CTkEntry(
@@ -149,11 +168,58 @@ class CustomerDashboardMixin:
             fg_color="#0F1419",
             text_color="#E2E8F0",
             placeholder_text_color="#7A8195",
-            font=CTk.CTkFont(size=12),
+            font=get_theme_font(12),
             corner_radius=8,
         )
         self.time_entry.pack(fill="both", expand=True)
 
+        aRepeatFrame = CTk.CTkFrame(aFormContent, fg_color="transparent")
+        aRepeatFrame.pack(fill="x", pady=(0, 20))
+
+        aRepeatCol = CTk.CTkFrame(aRepeatFrame, fg_color="transparent")
+        aRepeatCol.pack(side="left", fill="both", expand=True, padx=(0, 10))
+        CTk.CTkLabel(
+            aRepeatCol,
+            text="Repeat",
+            font=get_font(13, "bold"),
+            text_color="#B0B8C1",
+        ).pack(anchor="w", pady=(0, 8))
+        self.repeat_menu = CTk.CTkOptionMenu(
+            aRepeatCol,
+            values=[NO_REPEAT_LABEL, *RECURRENCE_LABELS],
+            height=45,
+            fg_color="#0F1419",
+            button_color="#2D3748",
+            button_hover_color="#3D4758",
+            text_color="#E2E8F0",
+            font=get_theme_font(12),
+            corner_radius=8,
+        )
+        self.repeat_menu.set(NO_REPEAT_LABEL)
+        self.repeat_menu.pack(fill="both", expand=True)
+
+        aUntilCol = CTk.CTkFrame(aRepeatFrame, fg_color="transparent")
+        aUntilCol.pack(side="left", fill="both", expand=True)
+        CTk.CTkLabel(
+            aUntilCol,
+            text="Repeat Until (optional)",
+            font=get_font(13, "bold"),
+            text_color="#B0B8C1",
+        ).pack(anchor="w", pady=(0, 8))
+        self.repeat_until_entry = CTk.CTkEntry(
+            aUntilCol,
+            placeholder_text="YYYY-MM-DD",
+            height=45,
+            border_width=2,
+            border_color="#2D3748",
+            fg_color="#0F1419",
+            text_color="#E2E8F0",
+            placeholder_text_color="#7A8195",
+            font=get_theme_font(12),
+            corner_radius=8,
+        )
+        self.repeat_until_entry.pack(fill="both", expand=True)
+
         def set_now():
             aNow = datetime.now()
             self.date_entry.delete(0, "end")
@@ -164,7 +230,7 @@ class CustomerDashboardMixin:
         CTk.CTkButton(
             aFormContent,
             text="Use Current Date & Time",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             fg_color="#4FC3F7",
             text_color="#0A192F",
             hover_color="#29B6F6",
@@ -176,7 +242,7 @@ class CustomerDashboardMixin:
         CTk.CTkButton(
             aFormContent,
             text="Book Your Taxi",
-            font=CTk.CTkFont(family="Segoe UI", size=14, weight="bold"),
+            font=get_font(14, "bold"),
             fg_color="#FFD700",
             text_color="#000000",
             hover_color="#FFC700",
@@ -190,6 +256,8 @@ class CustomerDashboardMixin:
         aDropoff = self.dropoff_entry.get().strip()
         aDate = self.date_entry.get().strip()
         aTime = self.time_entry.get().strip()
+        aFrequency = RECURRENCE_LABELS.get(self.repeat_menu.get())
+        aRepeatUntil = self.repeat_until_entry.get().strip()
 
         if not all([aPickup, aDropoff, aDate, aTime]):
             messagebox.showerror("Error", "All fields are required.")
@@ -208,32 +276,59 @@ class CustomerDashboardMixin:
             return
 
         try:
-            aBookingDateTime = datetime.strptime(f"{aDate} {aTime}", "%Y-%m-%d %H:%M")
-            if not(aBookingDateTime >= datetime.now()):
+            aStartTs = to_epoch(aDate, aTime)
+            if not(aStartTs >= now_epoch()):
                 messagebox.showerror("Error", "Booking date and time must be in the future.")
                 return
         except ValueError:
             messagebox.showerror("Error", "Invalid date or time.")
             return
 
+        anUntilTs = None
+        if aFrequency and aRepeatUntil:
+            try:
+                anUntilTs = to_epoch(aRepeatUntil, "23:59")
+            except ValueError:
+                messagebox.showerror("Error", "Invalid repeat until date. Use YYYY-MM-DD")
+                return
+            if anUntilTs < aStartTs:
+                messagebox.showerror("Error", "Repeat until date must not be before the first ride.")
+                return
+
+        if aFrequency:
+            try:
+                aConn = get_write_connection()
+                aCur = aConn.cursor()
+                create_recurring_booking(aCur, self.user_id, aPickup, aDropoff, aStartTs, aFrequency, anUntilTs)
+                aConn.commit()
+                aConn.close()
+                messagebox.showinfo("Success", "Recurring booking confirmed! Upcoming rides have been added to your bookings.")
+                self.clear_booking_form()
+            except sqlite3.Error as anError:
+                messagebox.showerror("Database Error", f"Failed to book taxi: {str(anError)}")
+            return
+
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_write_connection()
             aCur = aConn.cursor()
-            aCur.execute(
-                "INSERT INTO bookings (user_id, pickup_location, dropoff_location, booking_date, booking_time) VALUES (?, ?, ?, ?, ?)",
-                (self.user_id, aPickup, aDropoff, aDate, aTime),
-            )
+            create_booking(aCur, self.user_id, aPickup, aDropoff, aStartTs, anActor=get_user_actor(self.user_id))
             aConn.commit()
             aConn.close()
             messagebox.showinfo("Success", "Booking confirmed! Your taxi will arrive shortly.")
-            self.pickup_entry.delete(0, "end")
-            self.dropoff_entry.delete(0, "end")
-            self.date_entry.delete(0, "end")
-            self.time_entry.delete(0, "end")
+            self.clear_booking_form()
         except sqlite3.Error as anError:
             messagebox.showerror("Database Error", f"Failed to book taxi: {str(anError)}")
 
+    def clear_booking_form(self):
+        self.pickup_entry.delete(0, "end")
+        self.dropoff_entry.delete(0, "end")
+        self.date_entry.delete(0, "end")
+        self.time_entry.delete(0, "end")
+        self.repeat_menu.set(NO_REPEAT_LABEL)
+        self.repeat_until_entry.delete(0, "end")
+
     def show_my_bookings(self, aParent):
+        self.showing_my_bookings = True
         for aWidget in self.content_area.winfo_children():
             aWidget.destroy()
 
@@ -245,18 +340,18 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aBookingsContainer,
             text="Your Bookings",
-            font=CTk.CTkFont(family="Segoe UI", size=24, weight="bold"),
+            font=get_font(24, "bold"),
             text_color="#E2E8F0",
         ).pack(anchor="w", pady=(0, 25))
 
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_connection()
             aCur = aConn.cursor()
             aCur.execute(
-                "SELECT id, pickup_location, dropoff_location, booking_date, booking_time, status, driver_id FROM bookings WHERE user_id = ? ORDER BY created_at DESC",
+                "SELECT id, pickup_location_id, dropoff_location_id, booking_date, booking_time, status, driver_id, version FROM all_bookings WHERE user_id = ? ORDER BY created_at DESC",
                 (self.user_id,),
             )
-            aBookings = aCur.fetchall()
+            aBookings = resolve_location_names(aCur.fetchall(), 1)
             aConn.close()
 
             if not aBookings:
@@ -271,19 +366,20 @@ class CustomerDashboardMixin:
                 CTk.CTkLabel(
                     anEmptyFrame,
                     text="No bookings yet\nBook your first ride!",
-                    font=CTk.CTkFont(family="Segoe UI", size=16),
+                    font=get_font(16),
                     text_color="#B0B8C1",
                 ).pack(expand=True)
                 return
 
+            if len(aBookings) > CARD_VIEW_LIMIT:
+                self.show_my_bookings_table(aBookingsContainer, aBookings)
+                return
+
             for aBooking in aBookings:
-                aBookingId, aPickup, aDropoff, aDate, aTime, aStatus, aDriverId = aBooking
+                aBookingId, aPickup, aDropoff, aDate, aTime, aStatus, aDriverId, aVersion = aBooking
                 aBookingCard = CTk.CTkFrame(
                     aBookingsContainer,
-                    fg_color="#1A1F2E",
-                    corner_radius=10,
-                    border_width=1,
-                    border_color="#2D3748",
+                    **CARD_STYLE,
                 )
                 aBookingCard.pack(fill="x", pady=12)
                 anInfoFrame = CTk.CTkFrame(aBookingCard, fg_color="transparent")
@@ -294,38 +390,31 @@ class CustomerDashboardMixin:
                 CTk.CTkLabel(
                     aRouteFrame,
                     text=f"From: {aPickup}",
-                    font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+                    font=get_font(12, "bold"),
                     text_color="#FFD700",
                 ).pack(anchor="w")
                 CTk.CTkLabel(
-                    aRouteFrame, text="     |", font=CTk.CTkFont(size=10), text_color="#7A8195"
+                    aRouteFrame, text="     |", font=get_theme_font(10), text_color="#7A8195"
                 ).pack(anchor="w", pady=(2, 2))
                 CTk.CTkLabel(
                     aRouteFrame,
                     text=f"To: {aDropoff}",
-                    font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+                    font=get_font(12, "bold"),
                     text_color="#4FC3F7",
                 ).pack(anchor="w")
 
                 CTk.CTkLabel(
                     anInfoFrame,
                     text=f"{aDate} at {aTime}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11),
+                    font=get_font(11),
                     text_color="#B0B8C1",
                 ).pack(anchor="w", pady=10)
-
-                aStatusColors = {
-                    "pending": "#FFD700",
-                    "assigned": "#81C784",
-                    "completed": "#4CAF50",
-                    "cancelled": "#E57373",
-                }
                 aStatusText = aStatus.capitalize()
-                aStatusColor = aStatusColors.get(aStatus, "#B0B8C1")
+                aStatusColor = STATUS_COLORS.get(aStatus, "#B0B8C1")
                 CTk.CTkLabel(
                     anInfoFrame,
                     text=f"Status: {aStatusText}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11, weight="bold"),
+                    font=get_font(11, "bold"),
                     text_color=aStatusColor,
                 ).pack(anchor="w", pady=(10, 0))
 
@@ -336,31 +425,63 @@ class CustomerDashboardMixin:
                     CTk.CTkButton(
                         aButtonRow,
                         text="Edit Booking",
-                        font=CTk.CTkFont(family="Segoe UI", size=10, weight="bold"),
+                        font=get_font(10, "bold"),
                         fg_color="#4FC3F7",
                         hover_color="#29B6F6",
                         text_color="#FFFFFF",
                         height=32,
                         corner_radius=6,
-                        command=lambda aBid=aBookingId, aP=aPickup, aD=aDropoff, aDt=aDate, aTm=aTime: self.edit_booking(aBid, aP, aD, aDt, aTm),
+                        command=lambda aBid=aBookingId, aP=aPickup, aD=aDropoff, aDt=aDate, aTm=aTime, aVer=aVersion: self.edit_booking(
+                            aBid, aP, aD, aDt, aTm, aVer
+                        ),
                     ).pack(side="left", fill="x", expand=True, padx=(0, 8))
 
                     CTk.CTkButton(
                         aButtonRow,
                         text="Cancel Booking",
-                        font=CTk.CTkFont(family="Segoe UI", size=10, weight="bold"),
+                        font=get_font(10, "bold"),
                         fg_color="#FF6B6B",
                         hover_color="#FF5252",
                         text_color="#FFFFFF",
                         height=32,
                         corner_radius=6,
-                        command=lambda aBid=aBookingId: self.cancel_booking(aBid),
+                        command=lambda aBid=aBookingId, aVer=aVersion: self.cancel_booking(aBid, aVer),
                     ).pack(side="left", fill="x", expand=True)
 
         except sqlite3.Error as anError:
             messagebox.showerror("Database Error", f"Failed to fetch bookings: {str(anError)}")
 
-    def edit_booking(self, aBookingId, aCurrentPickup, aCurrentDropoff, aCurrentDate, aCurrentTime):
+    def show_my_bookings_table(self, aContainer, aBookings):
+        def format_booking_row(aBooking):
+            aBookingId, aPickup, aDropoff, aDate, aTime, aStatus, aDriverId, aVersion = aBooking
+            return (
+                [f"{aPickup} -> {aDropoff}", f"{aDate} {aTime}", aStatus.capitalize()],
+                ["#E2E8F0", "#B0B8C1", STATUS_COLORS.get(aStatus, "#B0B8C1")],
+            )
+
+        aTable = CanvasTable(
+            aContainer,
+            [("Route", 400), ("When", 140), ("Status", 100)],
+            format_booking_row,
+            [
+                TableAction(
+                    "Edit",
+                    "#4FC3F7",
+                    lambda aBooking: self.edit_booking(*aBooking[:5], aBooking[7]),
+                    lambda aBooking: aBooking[5] == "pending",
+                ),
+                TableAction(
+                    "Cancel",
+                    "#FF6B6B",
+                    lambda aBooking: self.cancel_booking(aBooking[0], aBooking[7]),
+                    lambda aBooking: aBooking[5] == "pending",
+                ),
+            ],
+        )
+        aTable.pack(fill="x")
+        aTable.set_records(aBookings)
+
+    def edit_booking(self, aBookingId, aCurrentPickup, aCurrentDropoff, aCurrentDate, aCurrentTime, aVersion):
         aDialog = CTk.CTkToplevel(self)
         aDialog.title("Edit Booking")
         aDialog.geometry("500x400")
@@ -379,7 +500,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aDialog,
             text="Edit Booking Details",
-            font=CTk.CTkFont(family="Segoe UI", size=20, weight="bold"),
+            font=get_font(20, "bold"),
             text_color="#E2E8F0",
         ).pack(pady=(20, 20))
 
@@ -389,7 +510,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aFormFrame,
             text="Pickup Location",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 5))
         aPickupEntry = CTk.CTkEntry(
@@ -404,7 +525,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aFormFrame,
             text="Drop-off Location",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 5))
         aDropoffEntry = CTk.CTkEntry(
@@ -424,7 +545,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aDateCol,
             text="Date (YYYY-MM-DD)",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 5))
         aDateEntry = CTk.CTkEntry(
@@ -440,7 +561,7 @@ class CustomerDashboardMixin:
         CTk.CTkLabel(
             aTimeCol,
             text="Time (HH:MM)",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             text_color="#B0B8C1",
         ).pack(anchor="w", pady=(0, 5))
         aTimeEntry = CTk.CTkEntry(
@@ -474,15 +595,15 @@ class CustomerDashboardMixin:
                 return
 
             try:
-                aConn = sqlite3.connect("taxi.db")
+                aConn = get_write_connection()
                 aCur = aConn.cursor()
-                aCur.execute("SELECT driver_id FROM bookings WHERE id = ?", (aBookingId,))
+                aCur.execute("SELECT driver_id, pickup_location_id, dropoff_location_id, start_ts FROM bookings WHERE id = ?", (aBookingId,))
                 aResult = aCur.fetchone()
                 aDriverId = aResult[0] if aResult else None
 
                 try:
-                    aBookingDateTime = datetime.strptime(f"{aDate} {aTime}", "%Y-%m-%d %H:%M")
-                    if not(aBookingDateTime >= datetime.now()):
+                    aStartTs = to_epoch(aDate, aTime)
+                    if not(aStartTs >= now_epoch()):
                         messagebox.showerror("Error", "Booking date and time must be in the future.")
                         aConn.close()
                         return
@@ -491,21 +612,48 @@ class CustomerDashboardMixin:
                     aConn.close()
                     return
 
-                if aDriverId:
-                    if self.check_booking_overlap(aDriverId, aDate, aTime, aBookingId):
-                        aConn.close()
+                aPickupId = LOCATION_CACHE.intern(aCur, aPickup)
+                aDropoffId = LOCATION_CACHE.intern(aCur, aDropoff)
+                aCur.execute(
+                    f"UPDATE bookings SET pickup_location = ?, dropoff_location = ?, pickup_location_id = ?, dropoff_location_id = ?, booking_date = ?, booking_time = ?, start_ts = ?, end_ts = ?, pooled_trip_id = NULL, version = version + 1 WHERE id = ? AND version = ? AND status = 'pending' AND (driver_id IS NULL OR {get_driver_free_condition('bookings.driver_id', aStartTs)})",
+                    (
+                        aPickup,
+                        aDropoff,
+                        aPickupId,
+                        aDropoffId,
+                        aDate,
+                        aTime,
+                        aStartTs,
+                        aStartTs + RIDE_DURATION_SECONDS,
+                        aBookingId,
+                        aVersion,
+                    ),
+                )
+                anUpdated = aCur.rowcount == 1
+                if anUpdated and aResult:
+                    audit_change(
+                        aCur,
+                        get_user_actor(self.user_id),
+                        "booking.edit",
+                        "booking",
+                        aBookingId,
+                        {"pickup_location_id": aResult[1], "dropoff_location_id": aResult[2], "start_ts": aResult[3]},
+                        {"pickup_location_id": aPickupId, "dropoff_location_id": aDropoffId, "start_ts": aStartTs},
+                    )
+                aConn.commit()
+                aConn.close()
+
+                if not anUpdated:
+                    if aDriverId and self.check_booking_overlap(aDriverId, aStartTs, aBookingId):
                         messagebox.showerror(
                             "Overlap Detected",
                             "The assigned driver already has a booking at this time. Please select a different time.",
                         )
                         return
-
-                aCur.execute(
-                    "UPDATE bookings SET pickup_location = ?, dropoff_location = ?, booking_date = ?, booking_time = ? WHERE id = ?",
-                    (aPickup, aDropoff, aDate, aTime, aBookingId),
-                )
-                aConn.commit()
-                aConn.close()
+                    messagebox.showerror("Booking Changed", BOOKING_CHANGED_MESSAGE)
+                    aDialog.destroy()
+                    self.show_my_bookings(self.content_area.master)
+                    return
 
                 messagebox.showinfo("Success", "Booking updated successfully!")
                 aDialog.destroy()
@@ -524,17 +672,32 @@ class CustomerDashboardMixin:
             text_color="#000000",
         ).pack(pady=20)
 
-    def cancel_booking(self, aBookingId):
+    def cancel_booking(self, aBookingId, aVersion):
         if messagebox.askyesno("Confirm", "Are you sure you want to cancel this booking?"):
             try:
-                aConn = sqlite3.connect("taxi.db")
+                aConn = get_write_connection()
                 aCur = aConn.cursor()
-                aCur.execute("UPDATE bookings SET status = 'cancelled' WHERE id = ?", (aBookingId,))
+                aCur.execute("SELECT recurring_id, start_ts FROM bookings WHERE id = ?", (aBookingId,))
+                aRow = aCur.fetchone()
+                aStopSeries = bool(aRow and aRow[0]) and messagebox.askyesno(
+                    "Recurring Booking", "This ride is part of a recurring booking. Cancel all future rides as well?"
+                )
+                anActor = get_user_actor(self.user_id)
+                aCancelled = transition_booking(aCur, aBookingId, aVersion, "cancel", aUserId=self.user_id, anActor=anActor)
+                if aCancelled and aStopSeries:
+                    stop_recurring_booking(aCur, aRow[0], aRow[1], anActor)
                 aConn.commit()
                 aConn.close()
-                messagebox.showinfo("Success", "Booking cancelled successfully.")
+                if aCancelled:
+                    messagebox.showinfo("Success", "Booking cancelled successfully.")
+                else:
+                    messagebox.showerror("Booking Changed", BOOKING_CHANGED_MESSAGE)
                 aParent = self.content_area.master
                 self.show_my_bookings(aParent)
             except sqlite3.Error as anError:
                 messagebox.showerror("Database Error", f"Failed to cancel booking: {str(anError)}")
 
+    def on_booking_notifications(self, aEvents):
+        # The booking form keeps whatever the customer is typing; only the bookings list is redrawn.
+        if self.showing_my_bookings and any(anEvent == "booking_updated" for anEvent, _ in aEvents):
+            self.show_my_bookings(self.content_area.master)
@@ -4,6 +4,19 @@ import sqlite3
 import os
 from PIL import ImageTk
 
+from db_setup import get_connection, get_write_connection
+from styles import get_font, get_theme_font, CARD_STYLE, STATUS_COLORS
+from user_directory import USER_DIRECTORY
+from booking_time import today_start_epoch
+from locations import resolve_location_names
+from booking_state import decline_booking, transition_booking
+from reassignment import REASSIGNER, record_decline
+from audit import get_user_actor
+
+
+RIDE_HISTORY_PAGE_SIZE = 20
+RIDE_CHANGED_MESSAGE = "This ride was changed by someone else. Your rides have been refreshed."
+
 
 class DriverDashboardMixin:
     def show_driver_dashboard(self, aParent):
@@ -11,7 +24,7 @@ class DriverDashboardMixin:
         self.driver_content_area.pack(fill="both", expand=True)
         self.show_assigned_rides()
 
-    def decline_ride(self, aBookingId):
+    def decline_ride(self, aBookingId, aVersion):
         aDialog = CTk.CTkToplevel(self)
         aDialog.title("Decline Ride")
         aDialog.geometry("500x300")
@@ -30,14 +43,14 @@ class DriverDashboardMixin:
         CTk.CTkLabel(
             aDialog,
             text="Decline Ride",
-            font=CTk.CTkFont(family="Segoe UI", size=20, weight="bold"),
+            font=get_font(20, "bold"),
             text_color="#E2E8F0",
         ).pack(pady=(20, 10))
 
         CTk.CTkLabel(
             aDialog,
             text="Please provide a reason for declining this ride:",
-            font=CTk.CTkFont(family="Segoe UI", size=12),
+            font=get_font(12),
             text_color="#B0B8C1",
         ).pack(pady=(0, 10))
 
@@ -48,7 +61,7 @@ class DriverDashboardMixin:
             aReasonFrame,
             height=120,
             width=440,
-            font=CTk.CTkFont(family="Segoe UI", size=12),
+            font=get_font(12),
         )
         aReasonText.pack(fill="both", expand=True)
         aReasonText.insert("1.0", "")
@@ -61,16 +74,19 @@ class DriverDashboardMixin:
                 return
 
             try:
-                aConn = sqlite3.connect("taxi.db")
+                aConn = get_write_connection()
                 aCur = aConn.cursor()
-                aCur.execute(
-                    "UPDATE bookings SET driver_id = NULL, status = 'pending' WHERE id = ?",
-                    (aBookingId,),
-                )
+                aDeclined = decline_booking(aCur, aBookingId, aVersion, self.user_id, get_user_actor(self.user_id))
+                if aDeclined:
+                    record_decline(aCur, aBookingId, self.user_id, aReason)
                 aConn.commit()
                 aConn.close()
 
-                messagebox.showinfo("Success", f"Ride declined. Reason: {aReason}")
+                if aDeclined:
+                    REASSIGNER.wake()
+                    messagebox.showinfo("Success", f"Ride declined. Reason: {aReason}\nThe booking will be offered to another driver.")
+                else:
+                    messagebox.showerror("Ride Changed", RIDE_CHANGED_MESSAGE)
                 aDialog.destroy()
                 self.show_assigned_rides()
             except sqlite3.Error as anError:
@@ -96,139 +112,227 @@ class DriverDashboardMixin:
         CTk.CTkLabel(
             aContainer,
             text="My Assigned Rides",
-            font=CTk.CTkFont(family="Segoe UI", size=24, weight="bold"),
+            font=get_font(24, "bold"),
             text_color="#E2E8F0",
         ).pack(anchor="w", pady=(0, 25))
 
+        self.ride_history_today = today_start_epoch()
+        self.ride_history_cursor = None
+        USER_DIRECTORY.sync()
+
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_connection()
             aCur = aConn.cursor()
             aCur.execute(
-                "SELECT b.id, b.pickup_location, b.dropoff_location, b.booking_date, b.booking_time, b.status, u.name, u.phone FROM bookings b JOIN users u ON b.user_id = u.id WHERE b.driver_id = ? ORDER BY b.created_at DESC",
-                (self.user_id,),
+                "SELECT id, pickup_location_id, dropoff_location_id, booking_date, booking_time, status, user_id, start_ts, version FROM bookings WHERE driver_id = ? AND start_ts >= ? ORDER BY start_ts",
+                (self.user_id, self.ride_history_today),
             )
-            aRides = aCur.fetchall()
+            aRides = resolve_location_names(aCur.fetchall(), 1)
             aConn.close()
+        except sqlite3.Error as anError:
+            messagebox.showerror("Database Error", f"Failed to fetch assigned rides: {str(anError)}")
+            return
 
-            if not aRides:
-                anEmptyFrame = CTk.CTkFrame(
-                    aContainer,
-                    fg_color="#1A1F2E",
-                    corner_radius=12,
-                    border_width=1,
-                    border_color="#2D3748",
-                )
-                anEmptyFrame.pack(fill="both", expand=True, pady=30)
-                CTk.CTkLabel(
-                    anEmptyFrame,
-                    text="No assigned rides yet\nAccept rides from Available Rides!",
-                    font=CTk.CTkFont(family="Segoe UI", size=16),
-                    text_color="#B0B8C1",
-                ).pack(expand=True)
-                return
+        CTk.CTkLabel(
+            aContainer,
+            text="Today & Upcoming",
+            font=get_font(16, "bold"),
+            text_color="#FFD700",
+        ).pack(anchor="w", pady=(0, 5))
 
-            for aRide in aRides:
-                aBookingId, aPickup, aDropoff, aDate, aTime, aStatus, aCustomerName, aCustomerPhone = aRide
-                aRideCard = CTk.CTkFrame(
-                    aContainer,
-                    fg_color="#1A1F2E",
-                    corner_radius=10,
-                    border_width=1,
-                    border_color="#2D3748",
-                )
-                aRideCard.pack(fill="x", pady=12)
-                anInfoFrame = CTk.CTkFrame(aRideCard, fg_color="transparent")
-                anInfoFrame.pack(fill="x", padx=20, pady=15)
-
-                CTk.CTkLabel(
-                    anInfoFrame,
-                    text=f"Customer: {aCustomerName}",
-                    font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
-                    text_color="#E2E8F0",
-                ).pack(anchor="w")
-                CTk.CTkLabel(
-                    anInfoFrame,
-                    text=f"Phone: {aCustomerPhone}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11),
-                    text_color="#B0B8C1",
-                ).pack(anchor="w", pady=(3, 10))
-                CTk.CTkLabel(
-                    anInfoFrame,
-                    text=f"Pickup: {aPickup}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11),
-                    text_color="#FFD700",
-                ).pack(anchor="w")
-                CTk.CTkLabel(
-                    anInfoFrame, text="     |", font=CTk.CTkFont(size=10), text_color="#7A8195"
-                ).pack(anchor="w", pady=(2, 2))
-                CTk.CTkLabel(
-                    anInfoFrame,
-                    text=f"Dropoff: {aDropoff}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11),
-                    text_color="#4FC3F7",
-                ).pack(anchor="w", pady=(0, 10))
-                CTk.CTkLabel(
-                    anInfoFrame,
-                    text=f"{aDate} at {aTime}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11),
-                    text_color="#B0B8C1",
-                ).pack(anchor="w", pady=(0, 10))
-
-                aStatusColors = {
-                    "assigned": "#81C784",
-                    "completed": "#4CAF50",
-                    "cancelled": "#E57373",
-                }
-                aStatusText = aStatus.capitalize()
-                aStatusColor = aStatusColors.get(aStatus, "#B0B8C1")
-                CTk.CTkLabel(
-                    anInfoFrame,
-                    text=f"Status: {aStatusText}",
-                    font=CTk.CTkFont(family="Segoe UI", size=11, weight="bold"),
-                    text_color=aStatusColor,
-                ).pack(anchor="w", pady=(0, 15))
-
-                if aStatus == "assigned":
-                    aButtonRow = CTk.CTkFrame(anInfoFrame, fg_color="transparent")
-                    aButtonRow.pack(fill="x", pady=(10, 0))
-
-                    CTk.CTkButton(
-                        aButtonRow,
-                        text="Decline Ride",
-                        font=CTk.CTkFont(family="Segoe UI", size=11, weight="bold"),
-                        fg_color="#FF6B6B",
-                        hover_color="#FF5252",
-                        text_color="#FFFFFF",
-                        height=36,
-                        corner_radius=6,
-                        command=lambda aBid=aBookingId: self.decline_ride(aBid),
-                    ).pack(side="left", fill="x", expand=True, padx=(0, 8))
-
-                    CTk.CTkButton(
-                        aButtonRow,
-                        text="Mark as Completed",
-                        font=CTk.CTkFont(family="Segoe UI", size=11, weight="bold"),
-                        fg_color="#4CAF50",
-                        hover_color="#388E3C",
-                        text_color="#FFFFFF",
-                        height=36,
-                        corner_radius=6,
-                        command=lambda aBid=aBookingId: self.complete_ride(aBid),
-                    ).pack(side="left", fill="x", expand=True)
+        if not aRides:
+            anEmptyFrame = CTk.CTkFrame(
+                aContainer,
+                fg_color="#1A1F2E",
+                corner_radius=12,
+                border_width=1,
+                border_color="#2D3748",
+            )
+            anEmptyFrame.pack(fill="x", pady=(10, 30))
+            CTk.CTkLabel(
+                anEmptyFrame,
+                text="No upcoming rides\nNew assignments will appear here.",
+                font=get_font(16),
+                text_color="#B0B8C1",
+            ).pack(expand=True, pady=30)
 
+        USER_DIRECTORY.preload([aRide[6] for aRide in aRides])
+        for aRide in aRides:
+            self.create_ride_card(aContainer, aRide)
+
+        CTk.CTkLabel(
+            aContainer,
+            text="Ride History",
+            font=get_font(16, "bold"),
+            text_color="#FFD700",
+        ).pack(anchor="w", pady=(25, 5))
+
+        self.ride_history_frame = CTk.CTkFrame(aContainer, fg_color="transparent")
+        self.ride_history_frame.pack(fill="x")
+
+        self.ride_history_button = CTk.CTkButton(
+            aContainer,
+            text="Load More History",
+            font=get_font(12, "bold"),
+            fg_color="#2D3748",
+            text_color="#E2E8F0",
+            hover_color="#374151",
+            height=36,
+            corner_radius=8,
+            command=self.load_ride_history,
+        )
+        self.load_ride_history()
+
+    def load_ride_history(self):
+        aPageQueries = []
+        aParams = []
+        for aTable in ("bookings", "bookings_archive"):
+            aPageQuery = f"SELECT id, user_id, pickup_location_id, dropoff_location_id, booking_date, booking_time, status, start_ts, version FROM {aTable} WHERE driver_id = ? AND start_ts < ?"
+            aParams.extend([self.user_id, self.ride_history_today])
+            if self.ride_history_cursor:
+                aPageQuery += " AND (start_ts, id) < (?, ?)"
+                aParams.extend(self.ride_history_cursor)
+            aPageQuery += " ORDER BY start_ts DESC, id DESC LIMIT ?"
+            aParams.append(RIDE_HISTORY_PAGE_SIZE + 1)
+            aPageQueries.append(f"SELECT * FROM ({aPageQuery})")
+
+        aQuery = f"SELECT id, pickup_location_id, dropoff_location_id, booking_date, booking_time, status, user_id, start_ts, version FROM ({' UNION ALL '.join(aPageQueries)}) ORDER BY start_ts DESC, id DESC LIMIT ?"
+        aParams.append(RIDE_HISTORY_PAGE_SIZE + 1)
+
+        try:
+            aConn = get_connection()
+            aCur = aConn.cursor()
+            aCur.execute(aQuery, aParams)
+            aRides = resolve_location_names(aCur.fetchall(), 1)
+            aConn.close()
         except sqlite3.Error as anError:
-            messagebox.showerror("Database Error", f"Failed to fetch assigned rides: {str(anError)}")
+            messagebox.showerror("Database Error", f"Failed to fetch ride history: {str(anError)}")
+            return
+
+        aHasMore = len(aRides) > RIDE_HISTORY_PAGE_SIZE
+        aRides = aRides[:RIDE_HISTORY_PAGE_SIZE]
+
+        if not aRides and not self.ride_history_cursor:
+            CTk.CTkLabel(
+                self.ride_history_frame,
+                text="No past rides yet.",
+                font=get_font(12),
+                text_color="#B0B8C1",
+            ).pack(anchor="w", pady=10)
+
+        USER_DIRECTORY.preload([aRide[6] for aRide in aRides])
+        for aRide in aRides:
+            self.create_ride_card(self.ride_history_frame, aRide)
+
+        if aRides:
+            aLastRide = aRides[-1]
+            self.ride_history_cursor = (aLastRide[7], aLastRide[0])
 
-    def complete_ride(self, aBookingId):
+        if aHasMore:
+            self.ride_history_button.pack(fill="x", pady=(10, 0))
+        else:
+            self.ride_history_button.pack_forget()
+
+    def create_ride_card(self, aParent, aRide):
+        aBookingId, aPickup, aDropoff, aDate, aTime, aStatus, aCustomerId, _, aVersion = aRide
+        aCustomerName = USER_DIRECTORY.get_name(aCustomerId, "Unknown")
+        aCustomerPhone = USER_DIRECTORY.get_phone(aCustomerId, "-")
+        aRideCard = CTk.CTkFrame(
+            aParent,
+            **CARD_STYLE,
+        )
+        aRideCard.pack(fill="x", pady=12)
+        anInfoFrame = CTk.CTkFrame(aRideCard, fg_color="transparent")
+        anInfoFrame.pack(fill="x", padx=20, pady=15)
+
+        CTk.CTkLabel(
+            anInfoFrame,
+            text=f"Customer: {aCustomerName}",
+            font=get_font(12, "bold"),
+            text_color="#E2E8F0",
+        ).pack(anchor="w")
+        CTk.CTkLabel(
+            anInfoFrame,
+            text=f"Phone: {aCustomerPhone}",
+            font=get_font(11),
+            text_color="#B0B8C1",
+        ).pack(anchor="w", pady=(3, 10))
+        CTk.CTkLabel(
+            anInfoFrame,
+            text=f"Pickup: {aPickup}",
+            font=get_font(11),
+            text_color="#FFD700",
+        ).pack(anchor="w")
+        CTk.CTkLabel(
+            anInfoFrame, text="     |", font=get_theme_font(10), text_color="#7A8195"
+        ).pack(anchor="w", pady=(2, 2))
+        CTk.CTkLabel(
+            anInfoFrame,
+            text=f"Dropoff: {aDropoff}",
+            font=get_font(11),
+            text_color="#4FC3F7",
+        ).pack(anchor="w", pady=(0, 10))
+        CTk.CTkLabel(
+            anInfoFrame,
+            text=f"{aDate} at {aTime}",
+            font=get_font(11),
+            text_color="#B0B8C1",
+        ).pack(anchor="w", pady=(0, 10))
+        aStatusText = aStatus.capitalize()
+        aStatusColor = STATUS_COLORS.get(aStatus, "#B0B8C1")
+        CTk.CTkLabel(
+            anInfoFrame,
+            text=f"Status: {aStatusText}",
+            font=get_font(11, "bold"),
+            text_color=aStatusColor,
+        ).pack(anchor="w", pady=(0, 15))
+
+        if aStatus == "assigned":
+            aButtonRow = CTk.CTkFrame(anInfoFrame, fg_color="transparent")
+            aButtonRow.pack(fill="x", pady=(10, 0))
+
+            CTk.CTkButton(
+                aButtonRow,
+                text="Decline Ride",
+                font=get_font(11, "bold"),
+                fg_color="#FF6B6B",
+                hover_color="#FF5252",
+                text_color="#FFFFFF",
+                height=36,
+                corner_radius=6,
+                command=lambda aBid=aBookingId, aVer=aVersion: self.decline_ride(aBid, aVer),
+            ).pack(side="left", fill="x", expand=True, padx=(0, 8))
+
+            CTk.CTkButton(
+                aButtonRow,
+                text="Mark as Completed",
+                font=get_font(11, "bold"),
+                fg_color="#4CAF50",
+                hover_color="#388E3C",
+                text_color="#FFFFFF",
+                height=36,
+                corner_radius=6,
+                command=lambda aBid=aBookingId, aVer=aVersion: self.complete_ride(aBid, aVer),
+            ).pack(side="left", fill="x", expand=True)
+
+    def complete_ride(self, aBookingId, aVersion):
         if messagebox.askyesno("Confirm", "Mark this ride as completed?"):
             try:
-                aConn = sqlite3.connect("taxi.db")
+                aConn = get_write_connection()
                 aCur = aConn.cursor()
-                aCur.execute("UPDATE bookings SET status = 'completed' WHERE id = ?", (aBookingId,))
+                aCompleted = transition_booking(
+                    aCur, aBookingId, aVersion, "complete", self.user_id, anActor=get_user_actor(self.user_id)
+                )
                 aConn.commit()
                 aConn.close()
-                messagebox.showinfo("Success", "Ride marked as completed!")
+                if aCompleted:
+                    messagebox.showinfo("Success", "Ride marked as completed!")
+                else:
+                    messagebox.showerror("Ride Changed", RIDE_CHANGED_MESSAGE)
                 self.show_assigned_rides()
             except sqlite3.Error as anError:
                 messagebox.showerror("Database Error", f"Failed to complete ride: {str(anError)}")
 
+    def on_ride_notifications(self, aEvents):
+        if any(anEvent == "ride_updated" for anEvent, _ in aEvents):
+            self.show_assigned_rides()
@@ -1,8 +1,47 @@
+import os
 import sqlite3
 
-def init_db():
-    aConn = sqlite3.connect("taxi.db")
+from sql_monitor import InstrumentedConnection
+from booking_time import RIDE_DURATION_SECONDS
+
+DB_PATH = os.environ.get("TBS_DB_PATH", "taxi.db")
+# WAL lets dashboards keep reading while another client writes; see benchmarks/stress_db.py.
+JOURNAL_MODE = os.environ.get("TBS_JOURNAL_MODE", "wal")
+BUSY_TIMEOUT_SECONDS = float(os.environ.get("TBS_BUSY_TIMEOUT_MS", "5000")) / 1000
+# Bumped when a one-off data migration is added; stored in PRAGMA user_version.
+SCHEMA_VERSION = 2
+
+BOOKING_VIEW_COLUMNS = "id, user_id, driver_id, pickup_location, dropoff_location, booking_date, booking_time, status, created_at, start_ts, end_ts, pickup_location_id, dropoff_location_id, recurring_id, version"
+
+
+def get_connection(aTimeout=BUSY_TIMEOUT_SECONDS, aPath=None):
+    return sqlite3.connect(aPath or DB_PATH, timeout=aTimeout, factory=InstrumentedConnection)
+
+
+def get_write_connection(aTimeout=BUSY_TIMEOUT_SECONDS, aPath=None):
+    # BEGIN IMMEDIATE waits out the busy timeout for the write lock up front; a deferred transaction that has
+    # to upgrade a stale WAL snapshot fails at once instead (see benchmarks/stress_db.py).
+    return sqlite3.connect(aPath or DB_PATH, timeout=aTimeout, factory=InstrumentedConnection, isolation_level="IMMEDIATE")
+
+
+def add_column_if_missing(aCur, aTable, aColumn, aDefinition):
+    aCur.execute(f"PRAGMA table_info({aTable})")
+    if aColumn in [aRow[1] for aRow in aCur.fetchall()]:
+        return False
+    print(f"Migrating database: Adding {aColumn} column to {aTable} table...")
+    aCur.execute(f"ALTER TABLE {aTable} ADD COLUMN {aColumn} {aDefinition}")
+    return True
+
+
+def init_db(aPath=None):
+    from locations import LOCATION_CACHE, LocationCache, backfill_location_ids, geocode_locations
+
+    # Another database's location ids must not leak into the shared cache.
+    aLocations = LocationCache(aPath) if aPath else LOCATION_CACHE
+    aConn = get_connection(aPath=aPath)
     aCur = aConn.cursor()
+    # Persistent in the database file, so every client picks it up from the first one to start.
+    aCur.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
 
     aCur.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -27,6 +66,13 @@ def init_db():
             booking_time TEXT NOT NULL,
             status TEXT DEFAULT 'pending',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            start_ts INTEGER,
+            end_ts INTEGER,
+            pickup_location_id INTEGER,
+            dropoff_location_id INTEGER,
+            recurring_id INTEGER,
+            pooled_trip_id INTEGER,
+            version INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (user_id) REFERENCES users(id),
             FOREIGN KEY (driver_id) REFERENCES users(id)
         )
@@ -39,5 +85,240 @@ def init_db():
         aCur.execute("ALTER TABLE bookings ADD COLUMN driver_id INTEGER")
         print("Migration completed successfully!")
 
+    aCur.execute("UPDATE users SET role = LOWER(TRIM(role)) WHERE role != LOWER(TRIM(role))")
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS bookings_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            driver_id INTEGER,
+            pickup_location TEXT NOT NULL,
+            dropoff_location TEXT NOT NULL,
+            booking_date TEXT NOT NULL,
+            booking_time TEXT NOT NULL,
+            status TEXT,
+            created_at TIMESTAMP,
+            start_ts INTEGER,
+            end_ts INTEGER,
+            pickup_location_id INTEGER,
+            dropoff_location_id INTEGER,
+            recurring_id INTEGER,
+            pooled_trip_id INTEGER,
+            version INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS locations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            norm_key TEXT NOT NULL UNIQUE,
+            latitude REAL,
+            longitude REAL,
+            grid_cell INTEGER
+        )
+    """)
+    add_column_if_missing(aCur, "locations", "latitude", "REAL")
+    add_column_if_missing(aCur, "locations", "longitude", "REAL")
+    add_column_if_missing(aCur, "locations", "grid_cell", "INTEGER")
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS aggregation_state (
+            name TEXT PRIMARY KEY,
+            change_log_id INTEGER NOT NULL
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS demand_grid_bookings (
+            booking_id INTEGER PRIMARY KEY,
+            hour_of_week INTEGER NOT NULL,
+            pickup_cell INTEGER,
+            dropoff_cell INTEGER
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS demand_grid (
+            kind TEXT NOT NULL,
+            cell INTEGER NOT NULL,
+            hour_of_week INTEGER NOT NULL,
+            ride_count INTEGER NOT NULL,
+            PRIMARY KEY (kind, cell, hour_of_week)
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS recurring_bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            pickup_location TEXT NOT NULL,
+            dropoff_location TEXT NOT NULL,
+            pickup_location_id INTEGER,
+            dropoff_location_id INTEGER,
+            frequency TEXT NOT NULL,
+            first_start_ts INTEGER NOT NULL,
+            until_ts INTEGER,
+            materialized_until_ts INTEGER NOT NULL,
+            active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS pooled_trips (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_ts INTEGER NOT NULL,
+            pooled_km REAL NOT NULL,
+            separate_km REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS booking_declines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            booking_id INTEGER NOT NULL,
+            driver_id INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            declined_at_ts INTEGER NOT NULL,
+            reassigned_driver_id INTEGER,
+            resolved_at_ts INTEGER,
+            FOREIGN KEY (booking_id) REFERENCES bookings(id),
+            FOREIGN KEY (driver_id) REFERENCES users(id)
+        )
+    """)
+
+    aCur.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_ts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at_ts INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now', 'localtime') AS INTEGER)),
+            delivered_at_ts INTEGER
+        )
+    """)
+
+    aCur.execute("PRAGMA user_version")
+    aSchemaVersion = aCur.fetchone()[0]
+    for aTable in ("bookings", "bookings_archive"):
+        add_column_if_missing(aCur, aTable, "recurring_id", "INTEGER")
+        add_column_if_missing(aCur, aTable, "pooled_trip_id", "INTEGER")
+        add_column_if_missing(aCur, aTable, "version", "INTEGER NOT NULL DEFAULT 0")
+        aNewLocationIds = add_column_if_missing(aCur, aTable, "pickup_location_id", "INTEGER")
+        aNewLocationIds |= add_column_if_missing(aCur, aTable, "dropoff_location_id", "INTEGER")
+        aNewTimestamps = add_column_if_missing(aCur, aTable, "start_ts", "INTEGER")
+        aNewTimestamps |= add_column_if_missing(aCur, aTable, "end_ts", "INTEGER")
+        # Full-table backfills run once, not on every start.
+        if aNewLocationIds or aSchemaVersion < 1:
+            backfill_location_ids(aCur, aTable, aLocations)
+        if aNewTimestamps or aSchemaVersion < 1:
+            aCur.execute(f"""
+                UPDATE {aTable}
+                SET start_ts = CAST(strftime('%s', booking_date || ' ' || booking_time) AS INTEGER),
+                    end_ts = CAST(strftime('%s', booking_date || ' ' || booking_time) AS INTEGER) + {RIDE_DURATION_SECONDS}
+                WHERE start_ts IS NULL
+            """)
+    if aSchemaVersion < 1:
+        backfill_location_ids(aCur, "recurring_bookings", aLocations)
+    if aSchemaVersion < 2:
+        # Version 1 blanked the text once rows had ids, but older clients sharing the file still read it.
+        for aTable in ("bookings", "bookings_archive", "recurring_bookings"):
+            aCur.execute(f"""
+                UPDATE {aTable} SET
+                    pickup_location = COALESCE((SELECT name FROM locations WHERE id = {aTable}.pickup_location_id), pickup_location),
+                    dropoff_location = COALESCE((SELECT name FROM locations WHERE id = {aTable}.dropoff_location_id), dropoff_location)
+                WHERE pickup_location = '' OR dropoff_location = ''
+            """)
+
+    if geocode_locations(aCur):
+        # Newly placed locations change cells of bookings already counted, so rebuild the grid.
+        aCur.execute("DELETE FROM aggregation_state WHERE name = 'demand_grid'")
+
+    for aTable in ("users", "bookings", "bookings_archive"):
+        for anOperation, aRowRef in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            aCur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{aTable}_{anOperation.lower()}_log
+                AFTER {anOperation} ON {aTable}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, operation) VALUES ('{aTable}', {aRowRef}.id, '{anOperation}');
+                END
+            """)
+
+    # Written by the same statement that changes the booking, so a notification exists exactly when the change commits.
+    aNotificationPayload = """json_object(
+        'booking_id', NEW.id, 'status', NEW.status, 'driver_id', NEW.driver_id, 'start_ts', NEW.start_ts,
+        'pickup_location', (SELECT name FROM locations WHERE id = NEW.pickup_location_id),
+        'dropoff_location', (SELECT name FROM locations WHERE id = NEW.dropoff_location_id)
+    )"""
+    # Recreated rather than IF NOT EXISTS so databases created before a payload change pick up the new one.
+    aCur.execute("DROP TRIGGER IF EXISTS trg_bookings_notify")
+    aCur.execute(f"""
+        CREATE TRIGGER trg_bookings_notify
+        AFTER UPDATE OF status, driver_id ON bookings
+        WHEN OLD.status IS NOT NEW.status OR OLD.driver_id IS NOT NEW.driver_id
+        BEGIN
+            INSERT INTO notification_outbox (recipient_id, event, payload)
+            VALUES (NEW.user_id, 'booking_updated', {aNotificationPayload});
+            INSERT INTO notification_outbox (recipient_id, event, payload)
+            SELECT NEW.driver_id, 'ride_updated', {aNotificationPayload} WHERE NEW.driver_id IS NOT NULL;
+            INSERT INTO notification_outbox (recipient_id, event, payload)
+            SELECT OLD.driver_id, 'ride_updated', {aNotificationPayload}
+            WHERE OLD.driver_id IS NOT NULL AND OLD.driver_id IS NOT NEW.driver_id;
+        END
+    """)
+
+    aCur.execute("DROP INDEX IF EXISTS idx_bookings_driver_date")
+    aCur.execute("DROP INDEX IF EXISTS idx_bookings_status_date")
+    aCur.execute("DROP INDEX IF EXISTS idx_bookings_archive_driver_date")
+    aCur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_driver_start ON bookings (driver_id, start_ts)")
+    aCur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status_start ON bookings (status, start_ts)")
+    aCur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (user_id)")
+    aCur.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users (role)")
+    aCur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_recurring_start ON bookings (recurring_id, start_ts) WHERE recurring_id IS NOT NULL"
+    )
+    aCur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bookings_pooled_trip ON bookings (pooled_trip_id) WHERE pooled_trip_id IS NOT NULL"
+    )
+    aCur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recurring_bookings_due ON recurring_bookings (active, materialized_until_ts)"
+    )
+    aCur.execute("CREATE INDEX IF NOT EXISTS idx_booking_declines_booking ON booking_declines (booking_id)")
+    aCur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_booking_declines_unresolved ON booking_declines (id) WHERE resolved_at_ts IS NULL"
+    )
+    aCur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (next_attempt_ts) WHERE status = 'pending'"
+    )
+    aCur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_archive_driver_start ON bookings_archive (driver_id, start_ts)")
+    aCur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_archive_user ON bookings_archive (user_id)")
+
+    aCur.execute("DROP VIEW IF EXISTS all_bookings")
+    aCur.execute(f"""
+        CREATE VIEW all_bookings AS
+            SELECT {BOOKING_VIEW_COLUMNS} FROM bookings
+            UNION ALL
+            SELECT {BOOKING_VIEW_COLUMNS} FROM bookings_archive
+    """)
+
+    aCur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     aConn.commit()
     aConn.close()
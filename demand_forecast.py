@@ -0,0 +1,88 @@
+import argparse
+import math
+from array import array
+from collections import namedtuple
+
+from db_setup import init_db
+from booking_snapshot import BOOKING_SNAPSHOT
+from booking_time import RIDE_DURATION_SECONDS, from_epoch, now_epoch
+
+
+HOUR_SECONDS = 3600
+HOURS_PER_WEEK = 168
+WEEK_SECONDS = HOURS_PER_WEEK * HOUR_SECONDS
+# 1970-01-01 was a Thursday; shifting by three days makes weeks start on Monday.
+WEEK_ALIGN_SECONDS = 3 * 86400
+FORECAST_WEEKS = 8
+SMOOTHING_HOURS = 1
+DRIVER_UTILIZATION = 0.8
+
+DemandForecast = namedtuple("DemandForecast", ["week_start_ts", "forecast", "actual", "recommended_drivers"])
+
+
+def get_week_start(aTimestamp):
+    return aTimestamp - (aTimestamp + WEEK_ALIGN_SECONDS) % WEEK_SECONDS
+
+
+def count_weekly_demand(aStartTimestamps, aStatusCodes, anExcludedCodes, aFirstWeekTs, aWeekCount):
+    aCounts = array("l", bytes(aWeekCount * HOURS_PER_WEEK * array("l").itemsize))
+    anEndTs = aFirstWeekTs + aWeekCount * WEEK_SECONDS
+    for aStartTs, aStatusCode in zip(aStartTimestamps, aStatusCodes):
+        if aFirstWeekTs <= aStartTs < anEndTs and aStatusCode not in anExcludedCodes:
+            aCounts[(aStartTs - aFirstWeekTs) // HOUR_SECONDS] += 1
+    return aCounts
+
+
+def smooth_weekly_curve(aCurve, aRadius=SMOOTHING_HOURS):
+    # The window wraps around so Sunday night blends into Monday morning.
+    aWindow = 2 * aRadius + 1
+    return [
+        sum(aCurve[(anHour + anOffset) % HOURS_PER_WEEK] for anOffset in range(-aRadius, aRadius + 1)) / aWindow
+        for anHour in range(HOURS_PER_WEEK)
+    ]
+
+
+def recommend_drivers(aExpectedRides):
+    aRidesPerDriverHour = HOUR_SECONDS / RIDE_DURATION_SECONDS
+    return math.ceil(aExpectedRides / (aRidesPerDriverHour * DRIVER_UTILIZATION))
+
+
+def build_demand_forecast(aNowTs=None, aWeeks=FORECAST_WEEKS):
+    aWeekStartTs = get_week_start(aNowTs if aNowTs is not None else now_epoch())
+    aFirstWeekTs = aWeekStartTs - aWeeks * WEEK_SECONDS
+
+    with BOOKING_SNAPSHOT.sync().lock:
+        anExcludedCodes = {BOOKING_SNAPSHOT.codes_by_status["cancelled"]}
+        aCounts = count_weekly_demand(
+            BOOKING_SNAPSHOT.start_ts, BOOKING_SNAPSHOT.status_codes, anExcludedCodes, aFirstWeekTs, aWeeks + 1
+        )
+
+    # Seasonal average: more recent weeks weigh more, linearly.
+    aWeights = range(1, aWeeks + 1)
+    aWeightTotal = sum(aWeights)
+    aSeasonal = [
+        sum(aCounts[aWeek * HOURS_PER_WEEK + anHour] * aWeight for aWeek, aWeight in enumerate(aWeights)) / aWeightTotal
+        for anHour in range(HOURS_PER_WEEK)
+    ]
+    aForecast = smooth_weekly_curve(aSeasonal)
+    anActual = list(aCounts[aWeeks * HOURS_PER_WEEK:])
+    return DemandForecast(
+        aWeekStartTs,
+        aForecast,
+        anActual,
+        [recommend_drivers(aRides) for aRides in aForecast],
+    )
+
+
+if __name__ == "__main__":
+    aParser = argparse.ArgumentParser(description="Print the hour-of-week demand forecast for the current week.")
+    aParser.add_argument("--weeks", type=int, default=FORECAST_WEEKS)
+    anArgs = aParser.parse_args()
+    init_db()
+    aDemand = build_demand_forecast(aWeeks=anArgs.weeks)
+    print(f"{'hour':<17} {'forecast':>8} {'actual':>6} {'drivers':>7}")
+    for anHour in range(HOURS_PER_WEEK):
+        aDate, aTime = from_epoch(aDemand.week_start_ts + anHour * HOUR_SECONDS)
+        print(
+            f"{aDate} {aTime:<6} {aDemand.forecast[anHour]:>8.2f} {aDemand.actual[anHour]:>6} {aDemand.recommended_drivers[anHour]:>7}"
+        )
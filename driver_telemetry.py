@@ -0,0 +1,188 @@
+import heapq
+import math
+import os
+import socket
+import threading
+import time
+
+
+TELEMETRY_HOST = "127.0.0.1"
+TELEMETRY_CELL_DEGREES = 0.01
+TELEMETRY_MAX_AGE_SECONDS = 300
+TELEMETRY_MAX_SEARCH_RINGS = 1000
+TELEMETRY_TAIL_INTERVAL = 0.2
+KM_PER_DEGREE_LATITUDE = 111.2
+
+
+class DriverPositionIndex:
+    def __init__(self, aCellDegrees=TELEMETRY_CELL_DEGREES):
+        self.cell_degrees = aCellDegrees
+        self.positions_by_driver = {}
+        self.drivers_by_cell = {}
+        self.lock = threading.Lock()
+
+    def get_cell(self, aLatitude, aLongitude):
+        return (math.floor(aLatitude / self.cell_degrees), math.floor(aLongitude / self.cell_degrees))
+
+    def update(self, aDriverId, aLatitude, aLongitude, aTimestamp=None):
+        aCell = self.get_cell(aLatitude, aLongitude)
+        with self.lock:
+            aPrevious = self.positions_by_driver.get(aDriverId)
+            if aPrevious and aPrevious[3] != aCell:
+                aPreviousDrivers = self.drivers_by_cell[aPrevious[3]]
+                aPreviousDrivers.discard(aDriverId)
+                if not aPreviousDrivers:
+                    del self.drivers_by_cell[aPrevious[3]]
+            self.positions_by_driver[aDriverId] = (aLatitude, aLongitude, aTimestamp or time.time(), aCell)
+            self.drivers_by_cell.setdefault(aCell, set()).add(aDriverId)
+
+    def remove(self, aDriverId):
+        with self.lock:
+            aPrevious = self.positions_by_driver.pop(aDriverId, None)
+            if aPrevious:
+                aDrivers = self.drivers_by_cell[aPrevious[3]]
+                aDrivers.discard(aDriverId)
+                if not aDrivers:
+                    del self.drivers_by_cell[aPrevious[3]]
+
+    def clear(self):
+        with self.lock:
+            self.positions_by_driver.clear()
+            self.drivers_by_cell.clear()
+
+    def get_position(self, aDriverId):
+        aPosition = self.positions_by_driver.get(aDriverId)
+        return aPosition[:3] if aPosition else None
+
+    def ingest_line(self, aLine):
+        # Each fix is "driver_id,latitude,longitude[,unix_time]".
+        aParts = aLine.strip().split(",")
+        if len(aParts) not in (3, 4):
+            return False
+        try:
+            aDriverId, aLatitude, aLongitude = int(aParts[0]), float(aParts[1]), float(aParts[2])
+            aTimestamp = float(aParts[3]) if len(aParts) == 4 else None
+        except ValueError:
+            return False
+        if not (-90 <= aLatitude <= 90 and -180 <= aLongitude <= 180):
+            return False
+        self.update(aDriverId, aLatitude, aLongitude, aTimestamp)
+        return True
+
+    def nearest(self, aLatitude, aLongitude, aCount=5, anIsAvailable=None, aMaxAgeSeconds=TELEMETRY_MAX_AGE_SECONDS):
+        aRow, aCol = self.get_cell(aLatitude, aLongitude)
+        aKmPerDegreeLongitude = KM_PER_DEGREE_LATITUDE * math.cos(math.radians(aLatitude))
+        aRingKm = self.cell_degrees * min(KM_PER_DEGREE_LATITUDE, aKmPerDegreeLongitude)
+        anOldestTs = time.time() - aMaxAgeSeconds
+        aCandidates = []
+        aSeenIds = set()
+        aNearest = []
+
+        def visit(aDriverIds):
+            for aDriverId in aDriverIds:
+                aDriverLat, aDriverLon, aTimestamp, _ = self.positions_by_driver[aDriverId]
+                # A driver can move to an outer ring between two passes; the first sighting counts.
+                if aTimestamp < anOldestTs or aDriverId in aSeenIds:
+                    continue
+                aSeenIds.add(aDriverId)
+                # An equirectangular projection is accurate to metres across a county.
+                aDistance = math.hypot(
+                    (aDriverLat - aLatitude) * KM_PER_DEGREE_LATITUDE, (aDriverLon - aLongitude) * aKmPerDegreeLongitude
+                )
+                heapq.heappush(aCandidates, (aDistance, aDriverId))
+
+        for aRing in range(TELEMETRY_MAX_SEARCH_RINGS + 1):
+            # The lock covers reading one ring; availability checks may hit the database, so they run without it.
+            with self.lock:
+                anExhausted = (2 * aRing + 1) ** 2 > len(self.drivers_by_cell) or aRing == TELEMETRY_MAX_SEARCH_RINGS
+                if anExhausted:
+                    # Sparse index: walking rings would probe more empty cells than there are occupied ones.
+                    for (aCellRow, aCellCol), aDriverIds in self.drivers_by_cell.items():
+                        if max(abs(aCellRow - aRow), abs(aCellCol - aCol)) >= aRing:
+                            visit(aDriverIds)
+                else:
+                    for aCell in self.get_ring_cells(aRow, aCol, aRing):
+                        aDriverIds = self.drivers_by_cell.get(aCell)
+                        if aDriverIds:
+                            visit(aDriverIds)
+
+            # Nothing beyond this ring can be closer than aRing whole cells, so nearer candidates are final.
+            aSettledKm = math.inf if anExhausted else aRing * aRingKm
+            while aCandidates and aCandidates[0][0] <= aSettledKm:
+                aDistance, aDriverId = heapq.heappop(aCandidates)
+                if anIsAvailable is None or anIsAvailable(aDriverId):
+                    aNearest.append((aDriverId, aDistance))
+                    if len(aNearest) >= aCount:
+                        return aNearest
+            if anExhausted:
+                break
+        return aNearest
+
+    @staticmethod
+    def get_ring_cells(aRow, aCol, aRing):
+        if aRing == 0:
+            return [(aRow, aCol)]
+        aCells = [(aRow - aRing, aCol + anOffset) for anOffset in range(-aRing, aRing + 1)]
+        aCells += [(aRow + aRing, aCol + anOffset) for anOffset in range(-aRing, aRing + 1)]
+        aCells += [(aRow + anOffset, aCol - aRing) for anOffset in range(-aRing + 1, aRing)]
+        aCells += [(aRow + anOffset, aCol + aRing) for anOffset in range(-aRing + 1, aRing)]
+        return aCells
+
+
+class TelemetryListener(threading.Thread):
+    def __init__(self, anIndex, aPort, aHost=TELEMETRY_HOST):
+        super().__init__(daemon=True)
+        self.index = anIndex
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((aHost, aPort))
+        self.received = 0
+
+    def run(self):
+        while True:
+            aPayload, _ = self.socket.recvfrom(65535)
+            for aLine in aPayload.decode("utf-8", "replace").splitlines():
+                if self.index.ingest_line(aLine):
+                    self.received += 1
+
+
+class TelemetryFileTail(threading.Thread):
+    def __init__(self, anIndex, aPath, anInterval=TELEMETRY_TAIL_INTERVAL):
+        super().__init__(daemon=True)
+        self.index = anIndex
+        self.path = aPath
+        self.interval = anInterval
+        self.received = 0
+
+    def run(self):
+        while not os.path.exists(self.path):
+            time.sleep(self.interval)
+        with open(self.path, encoding="utf-8") as aFile:
+            aFile.seek(0, os.SEEK_END)
+            aPending = ""
+            while True:
+                aChunk = aFile.read()
+                if not aChunk:
+                    time.sleep(self.interval)
+                    continue
+                aPending += aChunk
+                *aLines, aPending = aPending.split("\n")
+                for aLine in aLines:
+                    if self.index.ingest_line(aLine):
+                        self.received += 1
+
+
+def start_telemetry_from_env(anIndex=None):
+    anIndex = anIndex or DRIVER_POSITIONS
+    aThreads = []
+    aPort = os.environ.get("TBS_TELEMETRY_PORT")
+    if aPort:
+        aThreads.append(TelemetryListener(anIndex, int(aPort)))
+    aPath = os.environ.get("TBS_TELEMETRY_FILE")
+    if aPath:
+        aThreads.append(TelemetryFileTail(anIndex, aPath))
+    for aThread in aThreads:
+        aThread.start()
+    return aThreads
+
+
+DRIVER_POSITIONS = DriverPositionIndex()
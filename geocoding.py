@@ -0,0 +1,72 @@
+import math
+import re
+
+
+COORDINATE_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+EARTH_RADIUS_KM = 6371.0
+
+BEDFORDSHIRE_GAZETTEER = {
+    "bedford": (52.1357, -0.4667),
+    "kempston": (52.1160, -0.5000),
+    "bromham": (52.1480, -0.5300),
+    "clapham": (52.1590, -0.4900),
+    "cardington": (52.1130, -0.4150),
+    "sharnbrook": (52.2240, -0.5440),
+    "wootton": (52.0960, -0.5340),
+    "cranfield": (52.0690, -0.6070),
+    "marston moretaine": (52.0650, -0.5510),
+    "ampthill": (52.0267, -0.4950),
+    "flitwick": (52.0039, -0.4966),
+    "harlington": (51.9620, -0.4950),
+    "toddington": (51.9490, -0.5330),
+    "barton-le-clay": (51.9660, -0.4290),
+    "shefford": (52.0390, -0.3340),
+    "stotfold": (52.0180, -0.2280),
+    "arlesey": (52.0070, -0.2650),
+    "biggleswade": (52.0866, -0.2640),
+    "sandy": (52.1310, -0.2970),
+    "potton": (52.1280, -0.2160),
+    "leighton buzzard": (51.9165, -0.6588),
+    "houghton regis": (51.9050, -0.5240),
+    "dunstable": (51.8860, -0.5210),
+    "kensworth": (51.8560, -0.5050),
+    "caddington": (51.8620, -0.4480),
+    "luton": (51.8787, -0.4200),
+    "luton airport": (51.8747, -0.3683),
+}
+
+
+def parse_coordinates(aText):
+    aMatch = COORDINATE_PATTERN.match(aText or "")
+    if not aMatch:
+        return None
+    aLatitude, aLongitude = float(aMatch.group(1)), float(aMatch.group(2))
+    if not (-90 <= aLatitude <= 90 and -180 <= aLongitude <= 180):
+        return None
+    return aLatitude, aLongitude
+
+
+def geocode_location(aName):
+    aCoordinates = parse_coordinates(aName)
+    if aCoordinates:
+        return aCoordinates
+
+    aKey = " ".join((aName or "").split()).casefold()
+    if aKey in BEDFORDSHIRE_GAZETTEER:
+        return BEDFORDSHIRE_GAZETTEER[aKey]
+
+    # Addresses such as "12 High Street, Bedford" resolve to the longest place name they mention.
+    aMatches = [aPlace for aPlace in BEDFORDSHIRE_GAZETTEER if re.search(rf"\b{re.escape(aPlace)}\b", aKey)]
+    if not aMatches:
+        return None
+    return BEDFORDSHIRE_GAZETTEER[max(aMatches, key=len)]
+
+
+def distance_km(aPoint, anOtherPoint):
+    aLat1, aLon1 = map(math.radians, aPoint)
+    aLat2, aLon2 = map(math.radians, anOtherPoint)
+    aHalfChord = (
+        math.sin((aLat2 - aLat1) / 2) ** 2
+        + math.cos(aLat1) * math.cos(aLat2) * math.sin((aLon2 - aLon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(aHalfChord))
@@ -0,0 +1,117 @@
+import threading
+
+from db_setup import get_connection
+from geocoding import geocode_location
+from spatial_grid import get_grid_cell
+
+
+def normalize_location(aName):
+    return " ".join((aName or "").split()).casefold()
+
+
+class LocationCache:
+    def __init__(self, aPath=None):
+        self.path = aPath
+        self.ids_by_key = {}
+        self.names_by_id = {}
+        self.loaded_max_id = 0
+        self.lock = threading.Lock()
+
+    def intern(self, aCur, aName):
+        aName = " ".join(aName.split())
+        aKey = normalize_location(aName)
+        aLocationId = self.ids_by_key.get(aKey)
+        if aLocationId is not None:
+            return aLocationId
+
+        aLatitude, aLongitude = geocode_location(aName) or (None, None)
+        aCur.execute(
+            "INSERT OR IGNORE INTO locations (name, norm_key, latitude, longitude, grid_cell) VALUES (?, ?, ?, ?, ?)",
+            (aName, aKey, aLatitude, aLongitude, get_grid_cell(aLatitude, aLongitude)),
+        )
+        anInserted = aCur.rowcount == 1
+        aCur.execute("SELECT id, name FROM locations WHERE norm_key = ?", (aKey,))
+        aLocationId, aStoredName = aCur.fetchone()
+        if anInserted:
+            # Not cached until a later lookup finds it committed; the caller may still roll back.
+            return aLocationId
+        with self.lock:
+            self.ids_by_key[aKey] = aLocationId
+            self.names_by_id[aLocationId] = aStoredName
+        return aLocationId
+
+    def clear(self):
+        with self.lock:
+            self.ids_by_key.clear()
+            self.names_by_id.clear()
+            self.loaded_max_id = 0
+
+    def load_new(self):
+        # Locations are never deleted, so one range query picks up everything added since the last load.
+        aConn = get_connection(aPath=self.path)
+        try:
+            aCur = aConn.cursor()
+            aCur.execute("SELECT id, name, norm_key FROM locations WHERE id > ? ORDER BY id", (self.loaded_max_id,))
+            aRows = aCur.fetchall()
+        finally:
+            aConn.close()
+        with self.lock:
+            for aLocationId, aName, aKey in aRows:
+                self.names_by_id[aLocationId] = aName
+                self.ids_by_key[aKey] = aLocationId
+            if aRows:
+                self.loaded_max_id = max(self.loaded_max_id, aRows[-1][0])
+
+    def get_name(self, aLocationId, aDefault=""):
+        if aLocationId is None:
+            return aDefault
+        aName = self.names_by_id.get(aLocationId)
+        if aName is None and aLocationId > self.loaded_max_id:
+            self.load_new()
+            aName = self.names_by_id.get(aLocationId)
+        return aDefault if aName is None else aName
+
+
+def resolve_location_names(aRows, aPickupIndex):
+    return [
+        aRow[:aPickupIndex]
+        + (LOCATION_CACHE.get_name(aRow[aPickupIndex]), LOCATION_CACHE.get_name(aRow[aPickupIndex + 1]))
+        + aRow[aPickupIndex + 2:]
+        for aRow in aRows
+    ]
+
+
+def geocode_locations(aCur):
+    aCur.execute("SELECT id, name FROM locations WHERE latitude IS NULL")
+    aRows = []
+    for aLocationId, aName in aCur.fetchall():
+        aCoordinates = geocode_location(aName)
+        if aCoordinates:
+            aRows.append((*aCoordinates, get_grid_cell(*aCoordinates), aLocationId))
+    aCur.executemany("UPDATE locations SET latitude = ?, longitude = ?, grid_cell = ? WHERE id = ?", aRows)
+    return len(aRows)
+
+
+def backfill_location_ids(aCur, aTable, aLocations=None):
+    # One-off migration for rows written before the id columns existed.
+    aLocations = aLocations or LOCATION_CACHE
+    aCur.execute(
+        f"SELECT pickup_location FROM {aTable} WHERE pickup_location_id IS NULL UNION SELECT dropoff_location FROM {aTable} WHERE dropoff_location_id IS NULL"
+    )
+    aNames = [aRow[0] for aRow in aCur.fetchall() if aRow[0]]
+    aCur.execute("CREATE TEMP TABLE IF NOT EXISTS location_backfill (name TEXT PRIMARY KEY, location_id INTEGER NOT NULL)")
+    aCur.execute("DELETE FROM temp.location_backfill")
+    aCur.executemany(
+        "INSERT INTO temp.location_backfill (name, location_id) VALUES (?, ?)",
+        [(aName, aLocations.intern(aCur, aName)) for aName in aNames],
+    )
+    aCur.execute(f"""
+        UPDATE {aTable} SET
+            pickup_location_id = COALESCE(pickup_location_id, (SELECT location_id FROM temp.location_backfill WHERE name = {aTable}.pickup_location)),
+            dropoff_location_id = COALESCE(dropoff_location_id, (SELECT location_id FROM temp.location_backfill WHERE name = {aTable}.dropoff_location))
+        WHERE pickup_location_id IS NULL OR dropoff_location_id IS NULL
+    """)
+    aCur.execute("DROP TABLE temp.location_backfill")
+
+
+LOCATION_CACHE = LocationCache()
@@ -3,6 +3,12 @@ from tkinter import messagebox
 from PIL import Image
 import sqlite3
 
+from db_setup import get_connection
+from styles import get_font, get_theme_font
+from metrics import METRICS
+
+LOGIN_ATTEMPTS = METRICS.counter("tbs_login_attempts_total", "Sign-in attempts, by outcome.", ("result",))
+
 class LoginPage(CTk.CTkFrame):
     def __init__(self, aParent, aController):
         super().__init__(aParent, fg_color="#ffffff")
@@ -21,7 +27,7 @@ class LoginPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aLeftInner,
             text="Welcome back to",
-            font=CTk.CTkFont(family="Segoe UI", size=42, weight="bold"),
+            font=get_font(42, "bold"),
             text_color="#000000"
         ).pack(anchor="center", pady=(0, 50))
         
@@ -36,7 +42,7 @@ class LoginPage(CTk.CTkFrame):
             CTk.CTkLabel(
                 aLeftInner,
                 text="Taxi Booking\nSystem",
-                font=CTk.CTkFont(family="Segoe UI", size=48, weight="bold"),
+                font=get_font(48, "bold"),
                 text_color="#000000"
             ).pack(pady=(5, 10))
         
@@ -49,14 +55,14 @@ class LoginPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Sign In",
-            font=CTk.CTkFont(family="Segoe UI", size=32, weight="bold"),
+            font=get_font(32, "bold"),
             text_color="#000000"
         ).pack(anchor="w", pady=(0, 30))
         
         CTk.CTkLabel(
             aFormContainer,
             text="Email address",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 8))
         
@@ -65,7 +71,7 @@ class LoginPage(CTk.CTkFrame):
             placeholder_text="name@mail.com",
             width=280,
             height=44,
-            font=CTk.CTkFont(family="Segoe UI", size=12),
+            font=get_font(12),
             border_width=2,
             border_color="#E8E8F0",
             fg_color="#F5F5FA",
@@ -76,7 +82,7 @@ class LoginPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Password",
-            font=CTk.CTkFont(family="Segoe UI", size=12, weight="bold"),
+            font=get_font(12, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 8))
         
@@ -86,7 +92,7 @@ class LoginPage(CTk.CTkFrame):
             show="*",
             width=280,
             height=44,
-            font=CTk.CTkFont(size=12),
+            font=get_theme_font(12),
             border_width=2,
             border_color="#E8E8F0",
             fg_color="#F5F5FA",
@@ -99,7 +105,7 @@ class LoginPage(CTk.CTkFrame):
             text="Login",
             width=280,
             height=44,
-            font=CTk.CTkFont(size=13, weight="bold"),
+            font=get_theme_font(13, "bold"),
             fg_color="#FFD700",
             text_color="#000000",
             hover_color="#FFC700",
@@ -113,7 +119,7 @@ class LoginPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aSignupFrame,
             text="Not a member yet?",
-            font=CTk.CTkFont(size=12),
+            font=get_theme_font(12),
             text_color="#666666"
         ).pack(side="left", padx=(0, 5))
 
@@ -121,7 +127,7 @@ class LoginPage(CTk.CTkFrame):
         aSwitch = CTk.CTkLabel(
             aSignupFrame,
             text="Sign up",
-            font=CTk.CTkFont(size=12, weight="bold"),
+            font=get_theme_font(12, "bold"),
             text_color="#F6BE00",
             cursor="hand2"
         )
@@ -153,18 +159,21 @@ class LoginPage(CTk.CTkFrame):
             return
 
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_connection()
             aCur = aConn.cursor()
             aCur.execute("SELECT role, id, name FROM users WHERE email=? AND password=?", (anEmail, aPassword))
             aRow = aCur.fetchone()
             aConn.close()
 
             if not aRow:
+                LOGIN_ATTEMPTS.inc(aLabels=("invalid",))
                 messagebox.showerror("Error", "Invalid email or password.")
                 self.password.delete(0, "end")
                 return
 
+            LOGIN_ATTEMPTS.inc(aLabels=("success",))
             self.controller.show_dashboard(aRow[0].lower(), aRow[2], aRow[1])
         except Exception as anError:
+            LOGIN_ATTEMPTS.inc(aLabels=("error",))
             messagebox.showerror("Error", f"Login failed: {str(anError)}")
             self.password.delete(0, "end")
@@ -3,6 +3,17 @@ from login import LoginPage
 from register import RegisterPage
 from dashboard import DashboardPage
 from db_setup import init_db
+from booking_archive import archive_finalized_bookings
+from recurring_bookings import run_recurring_expansion
+from spatial_grid import run_demand_grid_refresh
+from driver_telemetry import start_telemetry_from_env
+from reassignment import REASSIGNER
+from notifications import start_notification_service_from_env
+from metrics import start_metrics_server_from_env
+from audit import AUDIT_LOG
+from ui_profiler import UiProfiler, UI_TRACE_PATH
+import threading
+import os
 
 CTk.set_appearance_mode("dark")
 CTk.set_default_color_theme("dark-blue")
@@ -27,6 +38,14 @@ class MainApp(CTk.CTk):
             print(f"Icon loading failed: {anError}")
 
         init_db()
+        AUDIT_LOG.start()
+        threading.Thread(target=archive_finalized_bookings, daemon=True).start()
+        threading.Thread(target=run_recurring_expansion, daemon=True).start()
+        threading.Thread(target=run_demand_grid_refresh, daemon=True).start()
+        start_telemetry_from_env()
+        REASSIGNER.start()
+        start_notification_service_from_env()
+        start_metrics_server_from_env()
 
         self.container = CTk.CTkFrame(self, fg_color="transparent")
         self.container.pack(fill="both", expand=True)
@@ -64,5 +83,17 @@ class MainApp(CTk.CTk):
         aDashboard.tkraise()
 
 if __name__ == "__main__":
+    aProfiler = None
+    aTracePath = os.environ.get("TBS_PROFILE_UI")
+    if aTracePath:
+        aProfiler = UiProfiler(UI_TRACE_PATH if aTracePath == "1" else aTracePath)
+        aProfiler.install()
+        for aPageClass in (LoginPage, RegisterPage, DashboardPage):
+            aProfiler.profile_class(aPageClass)
+
     anApp = MainApp()
+    if aProfiler:
+        aProfiler.start_heartbeat(anApp)
     anApp.mainloop()
+    if aProfiler:
+        aProfiler.write_trace()
@@ -0,0 +1,272 @@
+import math
+import os
+import threading
+import weakref
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("TBS_METRICS_PORT", "9465"))
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def format_value(aValue):
+    if aValue == math.inf:
+        return "+Inf"
+    if isinstance(aValue, float) and aValue.is_integer():
+        return str(int(aValue))
+    return repr(aValue)
+
+
+def format_labels(aLabelNames, aLabelValues, anExtra=()):
+    aPairs = list(zip(aLabelNames, aLabelValues)) + list(anExtra)
+    if not aPairs:
+        return ""
+    anEscaped = (
+        (aName, str(aValue).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for aName, aValue in aPairs
+    )
+    return "{" + ",".join(f'{aName}="{aValue}"' for aName, aValue in anEscaped) + "}"
+
+
+def format_histogram(aName, aLabelNames, aLabelValues, aBuckets, aCounts, aSum):
+    aLines = []
+    aCumulative = 0
+    for anUpperBound, aCount in zip(list(aBuckets) + [math.inf], aCounts):
+        aCumulative += aCount
+        aLines.append(
+            f"{aName}_bucket{format_labels(aLabelNames, aLabelValues, [('le', format_value(anUpperBound))])} {aCumulative}"
+        )
+    aLines.append(f"{aName}_sum{format_labels(aLabelNames, aLabelValues)} {format_value(aSum)}")
+    aLines.append(f"{aName}_count{format_labels(aLabelNames, aLabelValues)} {aCumulative}")
+    return aLines
+
+
+class ShardOwner:
+    # Referenced only from a thread-local, so it is collected as soon as its thread exits.
+    __slots__ = ("__weakref__",)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, aName, aHelp, aLabelNames=()):
+        self.name = aName
+        self.help = aHelp
+        self.label_names = tuple(aLabelNames)
+        # Every thread writes only to its own shard, so the hot path never takes a lock;
+        # scrapes sum the shards.
+        self.local = threading.local()
+        self.shards = []
+        # Totals of shards whose threads have exited.
+        self.retired = {}
+        self.lock = threading.Lock()
+
+    def get_shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            aShard = {}
+            anOwner = ShardOwner()
+            with self.lock:
+                self.shards.append(aShard)
+            # Short-lived workers would otherwise leave one shard each behind for good.
+            weakref.finalize(anOwner, self.retire_shard, aShard)
+            self.local.shard = aShard
+            self.local.owner = anOwner
+            return aShard
+
+    def retire_shard(self, aShard):
+        with self.lock:
+            self.shards = [anOther for anOther in self.shards if anOther is not aShard]
+            for aLabels, aValue in aShard.items():
+                self.retired[aLabels] = self.merge_values(self.retired.get(aLabels), aValue)
+
+    def merge_values(self, aTotal, aValue):
+        return aValue if aTotal is None else aTotal + aValue
+
+    def snapshot_shards(self):
+        with self.lock:
+            aShards = [self.retired] + self.shards
+            # Copying a dict is a single step under the GIL, so a writer can never be caught half-way.
+            return [aShard.copy() for aShard in aShards]
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.render_samples()
+
+    def render_samples(self):
+        return []
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, anAmount=1, aLabels=()):
+        aShard = self.get_shard()
+        aShard[aLabels] = aShard.get(aLabels, 0) + anAmount
+
+    def get(self, aLabels=()):
+        return sum(aShard.get(aLabels, 0) for aShard in self.snapshot_shards())
+
+    def render_samples(self):
+        aTotals = {}
+        for aShard in self.snapshot_shards():
+            for aLabels, aValue in aShard.items():
+                aTotals[aLabels] = aTotals.get(aLabels, 0) + aValue
+        return [
+            f"{self.name}{format_labels(self.label_names, aLabels)} {format_value(aValue)}"
+            for aLabels, aValue in sorted(aTotals.items())
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, aName, aHelp, aLabelNames=()):
+        super().__init__(aName, aHelp, aLabelNames)
+        self.values = {}
+        self.functions = {}
+
+    def set(self, aValue, aLabels=()):
+        self.values[aLabels] = aValue
+
+    def set_function(self, aFunction, aLabels=()):
+        # Read at scrape time, for values that already live somewhere else (queue depths and the like).
+        self.functions[aLabels] = aFunction
+
+    def render_samples(self):
+        aValues = dict(self.values)
+        for aLabels, aFunction in list(self.functions.items()):
+            try:
+                aValues[aLabels] = aFunction()
+            except Exception:
+                continue
+        return [
+            f"{self.name}{format_labels(self.label_names, aLabels)} {format_value(aValue)}"
+            for aLabels, aValue in sorted(aValues.items())
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, aName, aHelp, aLabelNames=(), aBuckets=LATENCY_BUCKETS_SECONDS):
+        super().__init__(aName, aHelp, aLabelNames)
+        self.buckets = tuple(aBuckets)
+
+    def observe(self, aValue, aLabels=()):
+        aShard = self.get_shard()
+        aSeries = aShard.get(aLabels)
+        if aSeries is None:
+            # One count per bucket plus the overflow bucket, then the running sum.
+            aSeries = aShard[aLabels] = [0] * (len(self.buckets) + 1) + [0.0]
+        aSeries[bisect_left(self.buckets, aValue)] += 1
+        aSeries[-1] += aValue
+
+    def merge_values(self, aTotal, aSeries):
+        # A new list, so a scrape holding the previous total never sees it change.
+        return list(aSeries) if aTotal is None else [aLeft + aRight for aLeft, aRight in zip(aTotal, aSeries)]
+
+    def render_samples(self):
+        aTotals = {}
+        for aShard in self.snapshot_shards():
+            for aLabels, aSeries in aShard.items():
+                aTotal = aTotals.setdefault(aLabels, [0] * len(aSeries))
+                for anIndex, aValue in enumerate(list(aSeries)):
+                    aTotal[anIndex] += aValue
+        aLines = []
+        for aLabels, aTotal in sorted(aTotals.items()):
+            aLines.extend(format_histogram(self.name, self.label_names, aLabels, self.buckets, aTotal[:-1], aTotal[-1]))
+        return aLines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, aMetricClass, aName, aHelp, aLabelNames=(), **aKwargs):
+        with self.lock:
+            aMetric = self.metrics.get(aName)
+            if aMetric is None:
+                aMetric = self.metrics[aName] = aMetricClass(aName, aHelp, aLabelNames, **aKwargs)
+            elif not isinstance(aMetric, aMetricClass):
+                raise ValueError(f"Metric {aName} is already registered as a {aMetric.kind}")
+            return aMetric
+
+    def counter(self, aName, aHelp, aLabelNames=()):
+        return self.register(Counter, aName, aHelp, aLabelNames)
+
+    def gauge(self, aName, aHelp, aLabelNames=()):
+        return self.register(Gauge, aName, aHelp, aLabelNames)
+
+    def histogram(self, aName, aHelp, aLabelNames=(), aBuckets=LATENCY_BUCKETS_SECONDS):
+        return self.register(Histogram, aName, aHelp, aLabelNames, aBuckets=aBuckets)
+
+    def add_collector(self, aFunction):
+        # Collectors return ready-made exposition lines, for stats another module already keeps.
+        with self.lock:
+            self.collectors.append(aFunction)
+
+    def render(self):
+        with self.lock:
+            aMetrics = sorted(self.metrics.values(), key=lambda aMetric: aMetric.name)
+            aCollectors = list(self.collectors)
+        aLines = []
+        for aMetric in aMetrics:
+            aLines.extend(aMetric.render())
+        for aCollector in aCollectors:
+            aLines.extend(aCollector())
+        return "\n".join(aLines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        aBody = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(aBody)))
+        self.end_headers()
+        self.wfile.write(aBody)
+
+    def log_message(self, aFormat, *anArgs):
+        pass
+
+
+class MetricsServer(threading.Thread):
+    def __init__(self, aHost=METRICS_HOST, aPort=METRICS_PORT):
+        super().__init__(daemon=True)
+        self.host = aHost
+        self.port = aPort
+        self.server = None
+
+    def run(self):
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        except OSError as anError:
+            print(f"Metrics endpoint unavailable on port {self.port}: {anError}")
+            return
+        self.server.daemon_threads = True
+        self.server.serve_forever()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def start_metrics_server_from_env():
+    # TBS_METRICS_PORT=0 turns the endpoint off.
+    if not METRICS_PORT:
+        return None
+    aServer = MetricsServer()
+    aServer.start()
+    return aServer
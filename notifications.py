@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+from db_setup import get_connection, get_write_connection
+from booking_time import now_epoch
+from user_directory import USER_DIRECTORY
+from metrics import METRICS
+
+
+NOTIFY_HOST = "127.0.0.1"
+NOTIFY_DEFAULT_PORT = 8766
+NOTIFY_BATCH_SIZE = 100
+NOTIFY_POLL_SECONDS = 0.5
+NOTIFY_SEND_TIMEOUT_SECONDS = 5
+NOTIFY_MAX_ATTEMPTS = 8
+NOTIFY_BASE_BACKOFF_SECONDS = 2
+NOTIFY_MAX_BACKOFF_SECONDS = 300
+NOTIFY_RECONNECT_MAX_SECONDS = 30
+
+NOTIFICATIONS = METRICS.counter("tbs_notifications_total", "Outbox delivery attempts, by outcome.", ("result",))
+
+
+def get_notify_port():
+    return int(os.environ.get("TBS_NOTIFY_PORT", NOTIFY_DEFAULT_PORT))
+
+
+def format_notification(anEvent, aPayload):
+    aRoute = f"{aPayload['pickup_location']} to {aPayload['dropoff_location']}"
+    if anEvent == "ride_updated":
+        if aPayload["driver_id"] is None or aPayload["status"] == "cancelled":
+            return f"Ride #{aPayload['booking_id']} ({aRoute}) is no longer assigned to you."
+        return f"Ride #{aPayload['booking_id']} ({aRoute}) is {aPayload['status']}."
+    return f"Your booking #{aPayload['booking_id']} ({aRoute}) is now {aPayload['status']}."
+
+
+def get_backoff_seconds(anAttempts):
+    aDelay = min(NOTIFY_BASE_BACKOFF_SECONDS * 2 ** anAttempts, NOTIFY_MAX_BACKOFF_SECONDS)
+    return aDelay * (0.5 + random.random() / 2)
+
+
+def fetch_due_notifications(aLimit=NOTIFY_BATCH_SIZE):
+    aConn = get_connection()
+    try:
+        aCur = aConn.cursor()
+        aCur.execute(
+            "SELECT id, recipient_id, event, payload, attempts FROM notification_outbox WHERE status = 'pending' AND next_attempt_ts <= ? ORDER BY id LIMIT ?",
+            (now_epoch(), aLimit),
+        )
+        return [(aRow[0], aRow[1], aRow[2], json.loads(aRow[3]), aRow[4]) for aRow in aCur.fetchall()]
+    finally:
+        aConn.close()
+
+
+def record_delivery_results(aNotifications, aFailures):
+    aNowTs = now_epoch()
+    aDeliveredIds = [aNotification[0] for aNotification in aNotifications if aNotification[0] not in aFailures]
+    aConn = get_write_connection()
+    try:
+        aCur = aConn.cursor()
+        aCur.executemany(
+            "UPDATE notification_outbox SET status = 'delivered', delivered_at_ts = ?, attempts = attempts + 1 WHERE id = ?",
+            [(aNowTs, aNotificationId) for aNotificationId in aDeliveredIds],
+        )
+        aRetries = []
+        for aNotificationId, _, _, _, anAttempts in aNotifications:
+            if aNotificationId in aFailures:
+                aStatus = "failed" if anAttempts + 1 >= NOTIFY_MAX_ATTEMPTS else "pending"
+                aRetries.append(
+                    (aStatus, aNowTs + round(get_backoff_seconds(anAttempts)), aFailures[aNotificationId], aNotificationId)
+                )
+        aCur.executemany(
+            "UPDATE notification_outbox SET status = ?, attempts = attempts + 1, next_attempt_ts = ?, last_error = ? WHERE id = ?",
+            aRetries,
+        )
+        aConn.commit()
+    finally:
+        aConn.close()
+    NOTIFICATIONS.inc(len(aDeliveredIds), ("delivered",))
+    for aStatus, _, _, _ in aRetries:
+        NOTIFICATIONS.inc(aLabels=("retry" if aStatus == "pending" else "failed",))
+
+
+class NotificationChannel:
+    async def deliver(self, aNotifications):
+        # Returns {notification id: error text} for the notifications that should be retried.
+        raise NotImplementedError
+
+
+class SocketChannel(NotificationChannel):
+    def __init__(self):
+        self.writers_by_user = {}
+
+    async def handle_client(self, aReader, aWriter):
+        aUserId = None
+        try:
+            aLine = await aReader.readline()
+            aParts = aLine.decode("utf-8", "replace").split()
+            if len(aParts) != 2 or aParts[0] != "SUBSCRIBE" or not aParts[1].isdigit():
+                return
+            aUserId = int(aParts[1])
+            self.writers_by_user.setdefault(aUserId, set()).add(aWriter)
+            # Clients never send anything else; reading until EOF just notices the disconnect.
+            while await aReader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            aWriters = self.writers_by_user.get(aUserId)
+            if aWriters is not None:
+                aWriters.discard(aWriter)
+                if not aWriters:
+                    del self.writers_by_user[aUserId]
+            aWriter.close()
+
+    async def deliver(self, aNotifications):
+        aFailures = {}
+        aWrittenTo = set()
+        for aNotificationId, aRecipientId, anEvent, aPayload, _ in aNotifications:
+            # Recipients who are not signed in reload their lists on login, so there is nothing to push.
+            for aWriter in list(self.writers_by_user.get(aRecipientId, ())):
+                aMessage = {"id": aNotificationId, "event": anEvent, "payload": aPayload}
+                try:
+                    aWriter.write((json.dumps(aMessage) + "\n").encode("utf-8"))
+                    aWrittenTo.add(aWriter)
+                except (ConnectionError, RuntimeError) as anError:
+                    aFailures[aNotificationId] = str(anError)
+
+        for aWriter in aWrittenTo:
+            try:
+                await asyncio.wait_for(aWriter.drain(), NOTIFY_SEND_TIMEOUT_SECONDS)
+            except (ConnectionError, asyncio.TimeoutError):
+                # A stalled client is dropped; it reconnects and reloads instead of blocking everyone else.
+                aWriter.close()
+        return aFailures
+
+
+class SmsLogChannel(NotificationChannel):
+    # Stand-in for an SMS or email gateway: one line per message in a local file.
+    def __init__(self, aPath):
+        self.path = aPath
+
+    async def deliver(self, aNotifications):
+        await asyncio.to_thread(self.write_messages, aNotifications)
+        return {}
+
+    def write_messages(self, aNotifications):
+        USER_DIRECTORY.sync().preload([aNotification[1] for aNotification in aNotifications])
+        aLines = []
+        for _, aRecipientId, anEvent, aPayload, _ in aNotifications:
+            aPhone = USER_DIRECTORY.get_phone(aRecipientId)
+            if aPhone:
+                aLines.append(f"{now_epoch()}\t{aPhone}\t{format_notification(anEvent, aPayload)}\n")
+        with open(self.path, "a", encoding="utf-8") as aFile:
+            aFile.writelines(aLines)
+
+
+class NotificationService(threading.Thread):
+    def __init__(self, aChannels=None, aPort=None, aHost=NOTIFY_HOST):
+        super().__init__(daemon=True)
+        self.socket_channel = SocketChannel()
+        self.channels = [self.socket_channel] + list(aChannels or [])
+        self.port = aPort if aPort is not None else get_notify_port()
+        self.host = aHost
+        self.delivered = 0
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except OSError as anError:
+            # Another running instance already owns the port and delivers the outbox.
+            print(f"Notification service not started: {anError}")
+
+    async def serve(self):
+        aServer = await asyncio.start_server(self.socket_channel.handle_client, self.host, self.port)
+        async with aServer:
+            while True:
+                try:
+                    aDeliveredCount = await self.deliver_batch()
+                except sqlite3.Error as anError:
+                    print(f"Notification delivery failed: {anError}")
+                    aDeliveredCount = 0
+                if aDeliveredCount < NOTIFY_BATCH_SIZE:
+                    await asyncio.sleep(NOTIFY_POLL_SECONDS)
+
+    async def deliver_batch(self):
+        aNotifications = await asyncio.to_thread(fetch_due_notifications)
+        if not aNotifications:
+            return 0
+
+        # Delivery is at-least-once: a retry resends on every channel, and clients only refresh on receipt.
+        aResults = await asyncio.gather(
+            *(aChannel.deliver(aNotifications) for aChannel in self.channels), return_exceptions=True
+        )
+        aFailures = {}
+        for aResult in aResults:
+            if isinstance(aResult, Exception):
+                aFailures.update((aNotification[0], str(aResult)) for aNotification in aNotifications)
+            else:
+                aFailures.update(aResult)
+
+        await asyncio.to_thread(record_delivery_results, aNotifications, aFailures)
+        self.delivered += len(aNotifications) - len(aFailures)
+        return len(aNotifications)
+
+
+class NotificationClient(threading.Thread):
+    def __init__(self, aUserId, aQueue, aPort=None, aHost=NOTIFY_HOST):
+        super().__init__(daemon=True)
+        self.user_id = aUserId
+        self.queue = aQueue
+        self.port = aPort if aPort is not None else get_notify_port()
+        self.host = aHost
+        self.socket = None
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+        if self.socket is not None:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self):
+        aDelay = 1
+        while not self.stopped:
+            try:
+                with socket.create_connection((self.host, self.port)) as self.socket:
+                    self.socket.sendall(f"SUBSCRIBE {self.user_id}\n".encode("utf-8"))
+                    aDelay = 1
+                    with self.socket.makefile("r", encoding="utf-8") as aStream:
+                        for aLine in aStream:
+                            aMessage = json.loads(aLine)
+                            self.queue.put((aMessage["event"], aMessage["payload"]))
+            except (OSError, ValueError):
+                pass
+            if not self.stopped:
+                time.sleep(aDelay)
+                aDelay = min(aDelay * 2, NOTIFY_RECONNECT_MAX_SECONDS)
+
+
+def start_notification_service_from_env():
+    aChannels = []
+    aSmsLogPath = os.environ.get("TBS_NOTIFY_SMS_LOG")
+    if aSmsLogPath:
+        aChannels.append(SmsLogChannel(aSmsLogPath))
+    aService = NotificationService(aChannels)
+    aService.start()
+    return aService
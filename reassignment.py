@@ -0,0 +1,179 @@
+import heapq
+import sqlite3
+import threading
+import time
+
+from db_setup import get_write_connection
+from booking_state import assign_pooled_trip, transition_booking
+from booking_time import RIDE_DURATION_SECONDS, now_epoch, today_start_epoch
+from driver_telemetry import DRIVER_POSITIONS
+from user_directory import USER_DIRECTORY
+from metrics import METRICS
+from audit import SYSTEM_REASSIGNER
+
+
+REASSIGN_POLL_SECONDS = 5
+# "nearest" tries drivers with a live fix closest-first; "least_busy" ignores positions.
+DISPATCH_POLICIES = ("nearest", "least_busy")
+
+DECLINES = METRICS.counter("tbs_ride_declines_total", "Rides declined by their driver.")
+REASSIGNMENTS = METRICS.counter(
+    "tbs_reassignments_total", "Declined rides processed by the reassigner, by outcome.", ("result",)
+)
+REASSIGN_SECONDS = METRICS.histogram("tbs_reassign_duration_seconds", "Time to rank drivers and try to reassign one ride.")
+REASSIGN_QUEUE = METRICS.gauge("tbs_reassign_queue_depth", "Declined rides still waiting for a driver.")
+
+
+def record_decline(aCur, aBookingId, aDriverId, aReason):
+    aCur.execute(
+        "INSERT INTO booking_declines (booking_id, driver_id, reason, declined_at_ts) VALUES (?, ?, ?, ?)",
+        (aBookingId, aDriverId, aReason, now_epoch()),
+    )
+    DECLINES.inc()
+
+
+class ReassignmentWorker(threading.Thread):
+    def __init__(self, aPollSeconds=REASSIGN_POLL_SECONDS, aPolicy="nearest"):
+        super().__init__(daemon=True)
+        self.poll_seconds = aPollSeconds
+        self.policy = aPolicy
+        self.queue = []
+        self.queued_ids = set()
+        self.last_decline_id = 0
+        self.wake_event = threading.Event()
+        self.stopped = False
+
+    def wake(self):
+        self.wake_event.set()
+
+    def stop(self):
+        self.stopped = True
+        self.wake_event.set()
+
+    def run(self):
+        while not self.stopped:
+            try:
+                self.run_once()
+            except sqlite3.Error as anError:
+                print(f"Ride reassignment stopped: {anError}")
+            # Declines from this process wake the worker at once; other instances are picked up on the poll.
+            self.wake_event.wait(self.poll_seconds)
+            self.wake_event.clear()
+
+    def run_once(self):
+        aConn = get_write_connection()
+        try:
+            aCur = aConn.cursor()
+            self.load_declines(aCur)
+            aWaiting = []
+            while self.queue:
+                aStartTs, aBookingId = heapq.heappop(self.queue)
+                if not self.reassign(aConn, aCur, aBookingId):
+                    aWaiting.append((aStartTs, aBookingId))
+                else:
+                    self.queued_ids.discard(aBookingId)
+            # Bookings with no free driver yet are retried, earliest pickup first, on the next poll.
+            for anEntry in aWaiting:
+                heapq.heappush(self.queue, anEntry)
+        finally:
+            aConn.close()
+
+    def load_declines(self, aCur):
+        aCur.execute(
+            """
+            SELECT d.id, b.id, b.start_ts FROM booking_declines d
+            JOIN bookings b ON b.id = d.booking_id
+            WHERE d.id > ? AND d.resolved_at_ts IS NULL
+            ORDER BY d.id
+            """,
+            (self.last_decline_id,),
+        )
+        for aDeclineId, aBookingId, aStartTs in aCur.fetchall():
+            self.last_decline_id = max(self.last_decline_id, aDeclineId)
+            self.enqueue(aBookingId, aStartTs)
+
+    def enqueue(self, aBookingId, aStartTs):
+        if aBookingId not in self.queued_ids:
+            self.queued_ids.add(aBookingId)
+            heapq.heappush(self.queue, (aStartTs, aBookingId))
+
+    def reassign(self, aConn, aCur, aBookingId):
+        aStart = time.perf_counter()
+        aResult = self.try_reassign(aConn, aCur, aBookingId)
+        REASSIGN_SECONDS.observe(time.perf_counter() - aStart)
+        REASSIGNMENTS.inc(aLabels=(aResult,))
+        return aResult != "waiting"
+
+    def try_reassign(self, aConn, aCur, aBookingId):
+        aCur.execute(
+            """
+            SELECT b.status, b.driver_id, b.version, b.start_ts, p.latitude, p.longitude, b.pooled_trip_id
+            FROM bookings b LEFT JOIN locations p ON p.id = b.pickup_location_id
+            WHERE b.id = ?
+            """,
+            (aBookingId,),
+        )
+        aBooking = aCur.fetchone()
+        if aBooking is None or aBooking[0] != "pending" or aBooking[1] is not None or aBooking[3] < now_epoch():
+            # Cancelled, deleted, handled by an admin or already past: nothing left to do.
+            self.resolve(aConn, aCur, aBookingId, None)
+            return "dropped"
+
+        _, _, aVersion, aStartTs, aLatitude, aLongitude, aPooledTripId = aBooking
+        for aDriverId in self.rank_drivers(aCur, aBookingId, aStartTs, aLatitude, aLongitude):
+            if aPooledTripId:
+                # The whole trip moves together, or not at all.
+                anAssigned = assign_pooled_trip(aCur, aPooledTripId, aBookingId, aVersion, aDriverId, SYSTEM_REASSIGNER)
+            else:
+                anAssigned = transition_booking(aCur, aBookingId, aVersion, "assign", aDriverId, anActor=SYSTEM_REASSIGNER)
+            if anAssigned:
+                self.resolve(aConn, aCur, aBookingId, aDriverId)
+                return "assigned"
+            aConn.rollback()
+        return "waiting"
+
+    def rank_drivers(self, aCur, aBookingId, aStartTs, aLatitude, aLongitude):
+        aCur.execute("SELECT driver_id FROM booking_declines WHERE booking_id = ?", (aBookingId,))
+        anExcludedIds = {aRow[0] for aRow in aCur.fetchall()}
+        # Drivers already booked around this time would only fail the assignment's own overlap check.
+        aCur.execute(
+            "SELECT DISTINCT driver_id FROM bookings WHERE start_ts > ? AND start_ts < ? AND end_ts > ? AND status IN ('pending', 'assigned') AND driver_id IS NOT NULL",
+            (aStartTs - RIDE_DURATION_SECONDS, aStartTs + RIDE_DURATION_SECONDS, aStartTs),
+        )
+        anExcludedIds.update(aRow[0] for aRow in aCur.fetchall())
+        aDriverIds = [
+            aDriver[0] for aDriver in USER_DIRECTORY.sync().get_users_by_role("driver") if aDriver[0] not in anExcludedIds
+        ]
+
+        aNearestIds = []
+        if self.policy == "nearest" and aLatitude is not None and aDriverIds:
+            aCandidates = set(aDriverIds)
+            aNearestIds = [
+                aDriverId
+                for aDriverId, _ in DRIVER_POSITIONS.nearest(
+                    aLatitude, aLongitude, len(aCandidates), lambda aDriverId: aDriverId in aCandidates
+                )
+            ]
+
+        # Drivers without a live fix follow, least busy today first.
+        aCur.execute(
+            "SELECT driver_id, COUNT(*) FROM bookings WHERE status = 'assigned' AND start_ts >= ? GROUP BY driver_id",
+            (today_start_epoch(),),
+        )
+        aLoads = dict(aCur.fetchall())
+        aNearestSet = set(aNearestIds)
+        return aNearestIds + sorted(
+            (aDriverId for aDriverId in aDriverIds if aDriverId not in aNearestSet),
+            key=lambda aDriverId: aLoads.get(aDriverId, 0),
+        )
+
+    def resolve(self, aConn, aCur, aBookingId, aDriverId):
+        aCur.execute(
+            "UPDATE booking_declines SET reassigned_driver_id = ?, resolved_at_ts = ? WHERE booking_id = ? AND resolved_at_ts IS NULL",
+            (aDriverId, now_epoch(), aBookingId),
+        )
+        aConn.commit()
+
+
+REASSIGNER = ReassignmentWorker()
+REASSIGN_QUEUE.set_function(lambda: len(REASSIGNER.queued_ids))
@@ -0,0 +1,140 @@
+import sqlite3
+import time
+
+from db_setup import get_write_connection
+from booking_time import RIDE_DURATION_SECONDS, from_epoch, now_epoch
+from locations import LOCATION_CACHE
+from audit import audit_change
+
+
+RECURRENCE_HORIZON_DAYS = 14
+RECURRENCE_REFRESH_SECONDS = 3600
+DAY_SECONDS = 86400
+WEEK_SECONDS = 7 * DAY_SECONDS
+RECURRENCE_LABELS = {
+    "Every day": "daily",
+    "Weekdays": "weekdays",
+    "Weekly": "weekly",
+}
+RULE_COLUMNS = "id, user_id, pickup_location, dropoff_location, pickup_location_id, dropoff_location_id, frequency, first_start_ts, until_ts, materialized_until_ts"
+
+
+def get_weekday(aTimestamp):
+    # 1970-01-01 was a Thursday; Monday is 0 like datetime.weekday().
+    return (aTimestamp // DAY_SECONDS + 3) % 7
+
+
+def iter_occurrences(aFirstTs, aFrequency, anUntilTs=None, aFromTs=None):
+    aStep = WEEK_SECONDS if aFrequency == "weekly" else DAY_SECONDS
+    aStartTs = aFirstTs
+    if aFromTs is not None and aFromTs > aFirstTs:
+        aStartTs += -(-(aFromTs - aFirstTs) // aStep) * aStep
+
+    while anUntilTs is None or aStartTs <= anUntilTs:
+        if aFrequency != "weekdays" or get_weekday(aStartTs) < 5:
+            yield aStartTs
+        aStartTs += aStep
+
+
+def get_horizon_ts(aHorizonDays=RECURRENCE_HORIZON_DAYS):
+    # Whole days, so a rule expanded once is left alone until the next midnight moves the horizon.
+    return (now_epoch() // DAY_SECONDS + aHorizonDays + 1) * DAY_SECONDS
+
+
+def materialize_rule(aCur, aRule, aHorizonTs):
+    (
+        aRuleId,
+        aUserId,
+        aPickup,
+        aDropoff,
+        aPickupId,
+        aDropoffId,
+        aFrequency,
+        aFirstTs,
+        anUntilTs,
+        aMaterializedTs,
+    ) = aRule
+
+    aRows = []
+    for aStartTs in iter_occurrences(aFirstTs, aFrequency, anUntilTs, max(aMaterializedTs + 1, now_epoch())):
+        if aStartTs > aHorizonTs:
+            break
+        aDate, aTime = from_epoch(aStartTs)
+        aRows.append(
+            (aUserId, aPickup, aDropoff, aPickupId, aDropoffId, aDate, aTime, aStartTs, aStartTs + RIDE_DURATION_SECONDS, aRuleId)
+        )
+
+    aCur.executemany(
+        "INSERT OR IGNORE INTO bookings (user_id, pickup_location, dropoff_location, pickup_location_id, dropoff_location_id, booking_date, booking_time, start_ts, end_ts, recurring_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        aRows,
+    )
+    aCur.execute(
+        "UPDATE recurring_bookings SET materialized_until_ts = ?, active = ? WHERE id = ?",
+        (aHorizonTs, 0 if anUntilTs is not None and anUntilTs <= aHorizonTs else 1, aRuleId),
+    )
+    return len(aRows)
+
+
+def create_recurring_booking(aCur, aUserId, aPickup, aDropoff, aFirstTs, aFrequency, anUntilTs=None):
+    aPickupId = LOCATION_CACHE.intern(aCur, aPickup)
+    aDropoffId = LOCATION_CACHE.intern(aCur, aDropoff)
+    aCur.execute(
+        "INSERT INTO recurring_bookings (user_id, pickup_location, dropoff_location, pickup_location_id, dropoff_location_id, frequency, first_start_ts, until_ts, materialized_until_ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (aUserId, aPickup, aDropoff, aPickupId, aDropoffId, aFrequency, aFirstTs, anUntilTs, aFirstTs - 1),
+    )
+    aRule = (aCur.lastrowid, aUserId, aPickup, aDropoff, aPickupId, aDropoffId, aFrequency, aFirstTs, anUntilTs, aFirstTs - 1)
+    return materialize_rule(aCur, aRule, get_horizon_ts())
+
+
+def stop_recurring_booking(aCur, aRecurringId, anAfterTs, anActor=None):
+    aCur.execute("UPDATE recurring_bookings SET active = 0 WHERE id = ?", (aRecurringId,))
+    aCur.execute(
+        "UPDATE bookings SET status = 'cancelled', version = version + 1 WHERE recurring_id = ? AND start_ts > ? AND status IN ('pending', 'assigned') RETURNING id, driver_id",
+        (aRecurringId, anAfterTs),
+    )
+    aCancelledRows = aCur.fetchall()
+    for aBookingId, aDriverId in aCancelledRows:
+        # Only assigned rides carry a driver, so the driver tells which of the two states the ride left.
+        audit_change(
+            aCur,
+            anActor,
+            "booking.cancel",
+            "booking",
+            aBookingId,
+            {"status": "assigned" if aDriverId else "pending", "driver_id": aDriverId},
+            {"status": "cancelled", "driver_id": aDriverId},
+        )
+    aCancelledCount = len(aCancelledRows)
+    audit_change(
+        aCur, anActor, "recurring.stop", "recurring", aRecurringId, {"active": 1}, {"active": 0, "rides_cancelled": aCancelledCount}
+    )
+    return aCancelledCount
+
+
+def materialize_recurring_bookings(aHorizonDays=RECURRENCE_HORIZON_DAYS):
+    aHorizonTs = get_horizon_ts(aHorizonDays)
+    aCreatedCount = 0
+
+    aConn = get_write_connection()
+    try:
+        aCur = aConn.cursor()
+        aCur.execute(
+            f"SELECT {RULE_COLUMNS} FROM recurring_bookings WHERE active = 1 AND materialized_until_ts < ?",
+            (aHorizonTs,),
+        )
+        for aRule in aCur.fetchall():
+            aCreatedCount += materialize_rule(aCur, aRule, aHorizonTs)
+        aConn.commit()
+    except sqlite3.Error as anError:
+        aConn.rollback()
+        print(f"Recurring booking expansion stopped: {anError}")
+    finally:
+        aConn.close()
+
+    return aCreatedCount
+
+
+def run_recurring_expansion(aRefreshSeconds=RECURRENCE_REFRESH_SECONDS):
+    while True:
+        materialize_recurring_bookings()
+        time.sleep(aRefreshSeconds)
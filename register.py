@@ -3,6 +3,13 @@ from tkinter import messagebox
 from PIL import Image
 import sqlite3
 
+from db_setup import get_write_connection
+from styles import get_font, get_theme_font
+from user_directory import USER_DIRECTORY, normalize_role
+from metrics import METRICS
+
+REGISTRATIONS = METRICS.counter("tbs_registrations_total", "Sign-up attempts, by role and outcome.", ("role", "result"))
+
 class RegisterPage(CTk.CTkFrame):
     def __init__(self, aParent, aController):
         super().__init__(aParent, fg_color="#ffffff")
@@ -21,7 +28,7 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aLeftInner,
             text="Welcome to",
-            font=CTk.CTkFont(family="Segoe UI", size=42, weight="bold"),
+            font=get_font(42, "bold"),
             text_color="#000000"
         ).pack(anchor="center", pady=(0, 50))
         
@@ -36,7 +43,7 @@ class RegisterPage(CTk.CTkFrame):
             CTk.CTkLabel(
                 aLeftInner,
                 text="Taxi Booking\nSystem",
-                font=CTk.CTkFont(family="Segoe UI", size=48, weight="bold"),
+                font=get_font(48, "bold"),
                 text_color="#000000"
             ).pack(pady=(5, 10))
         
@@ -49,14 +56,14 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Create Account",
-            font=CTk.CTkFont(size=28, weight="bold"),
+            font=get_theme_font(28, "bold"),
             text_color="#000000"
         ).pack(anchor="w", pady=(0, 25))
         
         CTk.CTkLabel(
             aFormContainer,
             text="Full Name",
-            font=CTk.CTkFont(size=11, weight="bold"),
+            font=get_theme_font(11, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 6))
         
@@ -65,7 +72,7 @@ class RegisterPage(CTk.CTkFrame):
             placeholder_text="John Doe",
             width=280,
             height=40,
-            font=CTk.CTkFont(size=11),
+            font=get_theme_font(11),
             border_width=2,
             border_color="#E8E8F0",
             fg_color="#F5F5FA",
@@ -76,7 +83,7 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Address",
-            font=CTk.CTkFont(size=11, weight="bold"),
+            font=get_theme_font(11, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 6))
         
@@ -85,7 +92,7 @@ class RegisterPage(CTk.CTkFrame):
             placeholder_text="123 Main St",
             width=280,
             height=40,
-            font=CTk.CTkFont(size=11),
+            font=get_theme_font(11),
             border_width=2,
             border_color="#E8E8F0",
             fg_color="#F5F5FA",
@@ -96,7 +103,7 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Phone Number",
-            font=CTk.CTkFont(size=11, weight="bold"),
+            font=get_theme_font(11, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 6))
         
@@ -105,7 +112,7 @@ class RegisterPage(CTk.CTkFrame):
             placeholder_text="+1 (555) 123-4567",
             width=280,
             height=40,
-            font=CTk.CTkFont(size=11),
+            font=get_theme_font(11),
             border_width=2,
             border_color="#E8E8F0",
             fg_color="#F5F5FA",
@@ -116,7 +123,7 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Email address",
-            font=CTk.CTkFont(size=11, weight="bold"),
+            font=get_theme_font(11, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 6))
         
@@ -125,7 +132,7 @@ class RegisterPage(CTk.CTkFrame):
             placeholder_text="name@mail.com",
             width=280,
             height=40,
-            font=CTk.CTkFont(size=11),
+            font=get_theme_font(11),
             border_width=2,
             border_color="#E8E8F0",
             fg_color="#F5F5FA",
@@ -136,7 +143,7 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Password",
-            font=CTk.CTkFont(size=11, weight="bold"),
+            font=get_theme_font(11, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 6))
         
@@ -146,7 +153,7 @@ class RegisterPage(CTk.CTkFrame):
             show="*",
             width=280,
             height=40,
-            font=CTk.CTkFont(size=11),
+            font=get_theme_font(11),
             border_width=2,
             border_color="#E8E8F0",
             fg_color="#F5F5FA",
@@ -157,7 +164,7 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aFormContainer,
             text="Account Type",
-            font=CTk.CTkFont(size=11, weight="bold"),
+            font=get_theme_font(11, "bold"),
             text_color="#333333"
         ).pack(anchor="w", pady=(0, 6))
         
@@ -165,7 +172,7 @@ class RegisterPage(CTk.CTkFrame):
             aFormContainer,
             values=["Customer", "Driver", "Admin"],
             width=280,
-            font=CTk.CTkFont(size=11),
+            font=get_theme_font(11),
             fg_color="#F5F5FA",
             button_color="#FFD700",
             button_hover_color="#FFC700",
@@ -182,7 +189,7 @@ class RegisterPage(CTk.CTkFrame):
             text="Create Account",
             width=280,
             height=44,
-            font=CTk.CTkFont(size=13, weight="bold"),
+            font=get_theme_font(13, "bold"),
             fg_color="#FFD700",
             text_color="#000000",
             hover_color="#FFC700",
@@ -196,14 +203,14 @@ class RegisterPage(CTk.CTkFrame):
         CTk.CTkLabel(
             aLoginFrame,
             text="Already have an account?",
-            font=CTk.CTkFont(size=12),
+            font=get_theme_font(12),
             text_color="#666666"
         ).pack(side="left", padx=(0, 5))
         
         aLoginLabel = CTk.CTkLabel(
             aLoginFrame,
             text="Login",
-            font=CTk.CTkFont(size=12, weight="bold"),
+            font=get_theme_font(12, "bold"),
             text_color="#F6BE00",
             cursor="hand2"
         )
@@ -227,7 +234,7 @@ class RegisterPage(CTk.CTkFrame):
         aName = self.name.get().strip()
         anAddress = self.address.get().strip()
         aPhone = self.phone.get().strip()
-        aRole = self.role.get()
+        aRole = normalize_role(self.role.get())
 
         if not all([anEmail, aPassword, aName, anAddress, aPhone]):
             messagebox.showerror("Error", "All fields are required.")
@@ -246,7 +253,7 @@ class RegisterPage(CTk.CTkFrame):
             return
 
         try:
-            aConn = sqlite3.connect("taxi.db")
+            aConn = get_write_connection()
             aCur = aConn.cursor()
             aCur.execute("""
                 INSERT INTO users (email, password, role, name, address, phone)
@@ -254,6 +261,8 @@ class RegisterPage(CTk.CTkFrame):
             """, (anEmail, aPassword, aRole, aName, anAddress, aPhone))
             aConn.commit()
             aConn.close()
+            USER_DIRECTORY.invalidate(aCur.lastrowid)
+            REGISTRATIONS.inc(aLabels=(aRole, "created"))
             
             messagebox.showinfo("Success", "Account created successfully! Please log in.")
             self.email.delete(0, "end")
@@ -265,6 +274,8 @@ class RegisterPage(CTk.CTkFrame):
             
             self.controller.show_login()
         except sqlite3.IntegrityError:
+            REGISTRATIONS.inc(aLabels=(aRole, "duplicate"))
             messagebox.showerror("Error", "This email is already registered. Please use a different email or try logging in.")
         except Exception as anError:
+            REGISTRATIONS.inc(aLabels=(aRole, "error"))
             messagebox.showerror("Error", f"Registration failed: {str(anError)}")
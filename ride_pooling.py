@@ -0,0 +1,153 @@
+from collections import defaultdict, namedtuple
+from itertools import permutations
+
+from booking_time import now_epoch
+from geocoding import distance_km
+from spatial_grid import GRID_COLS, GRID_ROWS
+from audit import audit_change
+
+
+POOL_WINDOW_SECONDS = 15 * 60
+POOL_HORIZON_SECONDS = 24 * 3600
+POOL_MAX_SIZE = 3
+POOL_MAX_DETOUR_RATIO = 1.5
+POOL_MIN_SAVING_KM = 1.0
+
+PoolRider = namedtuple("PoolRider", ["booking_id", "start_ts", "pickup", "dropoff", "pickup_cell"])
+PoolSuggestion = namedtuple("PoolSuggestion", ["booking_ids", "start_ts", "pooled_km", "separate_km", "stops"])
+
+
+def get_neighbour_cells(aCell):
+    aRow, aCol = divmod(aCell, GRID_COLS)
+    return [
+        aNeighbourRow * GRID_COLS + aNeighbourCol
+        for aNeighbourRow in range(max(aRow - 1, 0), min(aRow + 2, GRID_ROWS))
+        for aNeighbourCol in range(max(aCol - 1, 0), min(aCol + 2, GRID_COLS))
+    ]
+
+
+def plan_pooled_route(aRiders):
+    # Pickups happen in booking order; every drop-off order is tried and the shortest acceptable one wins.
+    aRiders = sorted(aRiders, key=lambda aRider: aRider.start_ts)
+    aBest = None
+    for aDropoffOrder in permutations(aRiders):
+        aStops = [(aRider, "pickup") for aRider in aRiders] + [(aRider, "dropoff") for aRider in aDropoffOrder]
+        aTravelled = 0.0
+        aBoardedAt = {}
+        anAcceptable = True
+        aPrevious = None
+        for aRider, aKind in aStops:
+            aPoint = aRider.pickup if aKind == "pickup" else aRider.dropoff
+            if aPrevious is not None:
+                aTravelled += distance_km(aPrevious, aPoint)
+            aPrevious = aPoint
+            if aKind == "pickup":
+                aBoardedAt[aRider.booking_id] = aTravelled
+                continue
+            aDirect = distance_km(aRider.pickup, aRider.dropoff)
+            if aTravelled - aBoardedAt[aRider.booking_id] > max(aDirect * POOL_MAX_DETOUR_RATIO, aDirect + POOL_MIN_SAVING_KM):
+                anAcceptable = False
+                break
+        if anAcceptable and (aBest is None or aTravelled < aBest[0]):
+            aBest = (aTravelled, [(aRider.booking_id, aKind) for aRider, aKind in aStops])
+    return aBest
+
+
+def evaluate_pool(aRiders, aWindowSeconds=POOL_WINDOW_SECONDS):
+    # Each pair is within the window, but merging chained pairs could stretch a group well beyond it.
+    aStartTimes = [aRider.start_ts for aRider in aRiders]
+    if max(aStartTimes) - min(aStartTimes) > aWindowSeconds:
+        return None
+    aPlan = plan_pooled_route(aRiders)
+    if aPlan is None:
+        return None
+    aPooledKm, aStops = aPlan
+    aSeparateKm = sum(distance_km(aRider.pickup, aRider.dropoff) for aRider in aRiders)
+    if aSeparateKm - aPooledKm < POOL_MIN_SAVING_KM:
+        return None
+    return PoolSuggestion(
+        tuple(aRider.booking_id for aRider in aRiders),
+        min(aRider.start_ts for aRider in aRiders),
+        aPooledKm,
+        aSeparateKm,
+        aStops,
+    )
+
+
+def load_pool_riders(aCur, aFromTs, aHorizonSeconds=POOL_HORIZON_SECONDS):
+    aCur.execute(
+        """
+        SELECT b.id, b.start_ts, p.latitude, p.longitude, d.latitude, d.longitude, p.grid_cell
+        FROM bookings b
+        JOIN locations p ON p.id = b.pickup_location_id
+        JOIN locations d ON d.id = b.dropoff_location_id
+        WHERE b.status = 'pending' AND b.start_ts >= ? AND b.start_ts < ?
+            AND b.driver_id IS NULL AND b.pooled_trip_id IS NULL
+            AND p.grid_cell IS NOT NULL AND d.latitude IS NOT NULL
+        ORDER BY b.start_ts
+        """,
+        (aFromTs, aFromTs + aHorizonSeconds),
+    )
+    return [
+        PoolRider(anId, aStartTs, (aPickupLat, aPickupLon), (aDropoffLat, aDropoffLon), aCell)
+        for anId, aStartTs, aPickupLat, aPickupLon, aDropoffLat, aDropoffLon, aCell in aCur.fetchall()
+    ]
+
+
+def find_candidate_pairs(aRiders, aWindowSeconds=POOL_WINDOW_SECONDS):
+    # Riders arrive sorted by start time, so a sliding window bounds the time dimension
+    # and a per-cell bucket of the window bounds the spatial one.
+    aWindowByCell = defaultdict(list)
+    aWindowStart = 0
+    aPairs = []
+    for aRider in aRiders:
+        while aRiders[aWindowStart].start_ts < aRider.start_ts - aWindowSeconds:
+            anExpired = aRiders[aWindowStart]
+            aWindowByCell[anExpired.pickup_cell].remove(anExpired)
+            aWindowStart += 1
+
+        for aCell in get_neighbour_cells(aRider.pickup_cell):
+            for anEarlier in aWindowByCell.get(aCell, ()):
+                aSuggestion = evaluate_pool((anEarlier, aRider), aWindowSeconds)
+                if aSuggestion:
+                    aPairs.append(aSuggestion)
+        aWindowByCell[aRider.pickup_cell].append(aRider)
+    return aPairs
+
+
+def suggest_pools(aCur, aFromTs=None, aHorizonSeconds=POOL_HORIZON_SECONDS):
+    aRiders = load_pool_riders(aCur, aFromTs if aFromTs is not None else now_epoch(), aHorizonSeconds)
+    aRidersById = {aRider.booking_id: aRider for aRider in aRiders}
+    aGroups = {}
+
+    # Greedily merge the most valuable pairs, growing groups while every rider's detour stays acceptable.
+    for aPair in sorted(find_candidate_pairs(aRiders), key=lambda aPair: aPair.pooled_km - aPair.separate_km):
+        aMerged = set(aGroups.get(aPair.booking_ids[0], (aPair.booking_ids[0],)))
+        aMerged.update(aGroups.get(aPair.booking_ids[1], (aPair.booking_ids[1],)))
+        if len(aMerged) > POOL_MAX_SIZE or tuple(sorted(aMerged)) == aGroups.get(aPair.booking_ids[0]):
+            continue
+        if evaluate_pool([aRidersById[anId] for anId in aMerged]) is None:
+            continue
+        aGroup = tuple(sorted(aMerged))
+        for anId in aGroup:
+            aGroups[anId] = aGroup
+
+    aSuggestions = [evaluate_pool([aRidersById[anId] for anId in aGroup]) for aGroup in set(aGroups.values())]
+    return sorted(aSuggestions, key=lambda aSuggestion: aSuggestion.start_ts)
+
+
+def create_pooled_trip(aCur, aSuggestion, anActor=None):
+    aCur.execute(
+        "INSERT INTO pooled_trips (start_ts, pooled_km, separate_km) VALUES (?, ?, ?)",
+        (aSuggestion.start_ts, round(aSuggestion.pooled_km, 2), round(aSuggestion.separate_km, 2)),
+    )
+    aTripId = aCur.lastrowid
+    aPlaceholders = ", ".join("?" for _ in aSuggestion.booking_ids)
+    aCur.execute(
+        f"UPDATE bookings SET pooled_trip_id = ?, version = version + 1 WHERE id IN ({aPlaceholders}) AND status = 'pending' AND driver_id IS NULL AND pooled_trip_id IS NULL",
+        (aTripId, *aSuggestion.booking_ids),
+    )
+    if aCur.rowcount != len(aSuggestion.booking_ids):
+        return None
+    audit_change(aCur, anActor, "pooled_trip.create", "pooled_trip", aTripId, None, {"booking_ids": list(aSuggestion.booking_ids)})
+    return aTripId
@@ -0,0 +1,414 @@
+import argparse
+import heapq
+import math
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from collections import Counter, namedtuple
+
+import db_setup
+import booking_state
+import reassignment
+from db_setup import init_db, get_write_connection
+from booking_state import create_booking, transition_booking
+from booking_time import RIDE_DURATION_SECONDS, now_epoch
+from driver_telemetry import DRIVER_POSITIONS
+from geocoding import BEDFORDSHIRE_GAZETTEER, distance_km, geocode_location
+from locations import LOCATION_CACHE
+from reassignment import DISPATCH_POLICIES, ReassignmentWorker, record_decline
+from sql_monitor import MONITOR
+from user_directory import USER_DIRECTORY
+
+
+HOUR_SECONDS = 3600
+HOURS_PER_WEEK = 168
+SIM_SPEED_KMH = 40
+SIM_BOARDING_SECONDS = 300
+SIM_MAX_RIDE_SECONDS = 3600
+SIM_RETRY_SECONDS = 60
+SIM_POSITION_JITTER_DEGREES = 0.01
+# Relative demand by hour of day, averaging 1.0: quiet nights, commuter peaks.
+DEFAULT_HOURLY_PROFILE = (
+    0.3, 0.2, 0.15, 0.15, 0.2, 0.4, 0.9, 1.6, 1.9, 1.3, 1.0, 1.0,
+    1.1, 1.0, 1.0, 1.1, 1.4, 1.8, 1.7, 1.3, 1.1, 1.0, 0.8, 0.5,
+)
+
+SimulationConfig = namedtuple(
+    "SimulationConfig",
+    [
+        "hours",
+        "drivers",
+        "customers",
+        "requests_per_hour",
+        "decline_rate",
+        "min_lead_minutes",
+        "max_lead_minutes",
+        "max_response_seconds",
+        "seed",
+        "ride_buffer_seconds",
+        "dispatch_policy",
+    ],
+    defaults=(24, 20, 200, 12.0, 0.1, 10, 90, 120, 1, RIDE_DURATION_SECONDS, "nearest"),
+)
+
+SimulationResult = namedtuple(
+    "SimulationResult",
+    [
+        "requests",
+        "served",
+        "unserved",
+        "declines",
+        "assign_wait_p50",
+        "assign_wait_p95",
+        "pickup_delay_p50",
+        "pickup_delay_p95",
+        "utilization",
+        "db_ms_p50",
+        "db_ms_p95",
+        "db_ms_max",
+        "wall_seconds",
+        "speedup",
+    ],
+)
+
+
+def percentile(aValues, aFraction):
+    if not aValues:
+        return 0.0
+    aSorted = sorted(aValues)
+    return aSorted[min(len(aSorted) - 1, int(aFraction * len(aSorted)))]
+
+
+def use_ride_buffer(aSeconds):
+    # How long a booking blocks its driver; set on every run because pool workers are reused.
+    booking_state.RIDE_DURATION_SECONDS = aSeconds
+    reassignment.RIDE_DURATION_SECONDS = aSeconds
+
+
+def use_database(aPath):
+    # The singletons cache rows by id, so they must not carry over from another database.
+    db_setup.DB_PATH = aPath
+    USER_DIRECTORY.invalidate()
+    USER_DIRECTORY.change_log_id = None
+    LOCATION_CACHE.clear()
+    DRIVER_POSITIONS.clear()
+    init_db()
+
+
+def load_history(aPath):
+    aConn = sqlite3.connect(aPath)
+    try:
+        aCur = aConn.cursor()
+        aCur.execute(
+            """
+            SELECT b.start_ts, p.name, d.name FROM all_bookings b
+            JOIN locations p ON p.id = b.pickup_location_id
+            JOIN locations d ON d.id = b.dropoff_location_id
+            WHERE b.status != 'cancelled' AND b.start_ts IS NOT NULL
+            """
+        )
+        aRows = aCur.fetchall()
+    finally:
+        aConn.close()
+    if not aRows:
+        raise ValueError(f"No bookings to learn from in {aPath}")
+
+    aCounts = Counter(((aStartTs // HOUR_SECONDS) + 72) % HOURS_PER_WEEK for aStartTs, _, _ in aRows)
+    aSpanWeeks = max(1.0, (max(aRow[0] for aRow in aRows) - min(aRow[0] for aRow in aRows)) / (HOURS_PER_WEEK * HOUR_SECONDS))
+    aRatesByHour = [aCounts.get(anHour, 0) / aSpanWeeks for anHour in range(HOURS_PER_WEEK)]
+    return aRatesByHour, [(aPickup, aDropoff) for _, aPickup, aDropoff in aRows]
+
+
+class Simulation:
+    def __init__(self, aConfig, aRatesByHour=None, aRoutes=None):
+        self.config = aConfig
+        self.random = random.Random(aConfig.seed)
+        self.rates_by_hour = aRatesByHour
+        self.routes = aRoutes
+        self.places = [aPlace.title() for aPlace in BEDFORDSHIRE_GAZETTEER]
+        self.events = []
+        self.sequence = 0
+        self.dispatcher = ReassignmentWorker(aPolicy=aConfig.dispatch_policy)
+        self.db_ms = []
+        self.requested_at = {}
+        self.assign_waits = []
+        self.pickup_delays = []
+        self.busy_seconds = 0
+        self.driver_free_ts = {}
+        self.driver_points = {}
+        self.declines = 0
+        self.unserved = 0
+        self.served = 0
+        self.retry_scheduled = False
+        self.last_event_ts = 0
+
+    def schedule(self, aTimestamp, aKind, *aData):
+        self.sequence += 1
+        heapq.heappush(self.events, (aTimestamp, self.sequence, aKind, aData))
+
+    def timed(self, aFunction):
+        aStart = time.perf_counter()
+        aResult = aFunction()
+        self.db_ms.append((time.perf_counter() - aStart) * 1000)
+        return aResult
+
+    def execute(self, anOperation):
+        # Each operation gets its own connection and transaction, as a dashboard handler does.
+        def run():
+            aConn = get_write_connection()
+            try:
+                aResult = anOperation(aConn.cursor())
+                aConn.commit()
+                return aResult
+            finally:
+                aConn.close()
+
+        return self.timed(run)
+
+    def get_rate(self, aTimestamp):
+        if self.rates_by_hour:
+            return self.rates_by_hour[((aTimestamp // HOUR_SECONDS) + 72) % HOURS_PER_WEEK]
+        return self.config.requests_per_hour * DEFAULT_HOURLY_PROFILE[(aTimestamp // HOUR_SECONDS) % 24]
+
+    def pick_route(self):
+        if self.routes:
+            return self.random.choice(self.routes)
+        aPickup, aDropoff = self.random.sample(self.places, 2)
+        return aPickup, aDropoff
+
+    def place_point(self, aName):
+        aPoint = geocode_location(aName)
+        if aPoint is None:
+            aPoint = BEDFORDSHIRE_GAZETTEER[self.random.choice(list(BEDFORDSHIRE_GAZETTEER))]
+        return (
+            aPoint[0] + self.random.uniform(-SIM_POSITION_JITTER_DEGREES, SIM_POSITION_JITTER_DEGREES),
+            aPoint[1] + self.random.uniform(-SIM_POSITION_JITTER_DEGREES, SIM_POSITION_JITTER_DEGREES),
+        )
+
+    def move_driver(self, aDriverId, aPoint):
+        self.driver_points[aDriverId] = aPoint
+        DRIVER_POSITIONS.update(aDriverId, aPoint[0], aPoint[1])
+
+    def create_users(self, aCur):
+        # Tagged per run, so a database can be simulated in more than once.
+        aTag = uuid.uuid4().hex[:8]
+        for aRole, aCount in (("customer", self.config.customers), ("driver", self.config.drivers)):
+            aCur.executemany(
+                "INSERT INTO users (email, password, role, name, address, phone) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (f"sim-{aTag}-{aRole}-{anIndex}@example.com", "simulated", aRole, f"Sim {aRole.title()} {anIndex}", "Bedford", f"0700{anIndex:07d}")
+                    for anIndex in range(aCount)
+                ],
+            )
+        aCur.execute("SELECT id FROM users WHERE role = 'customer' AND email LIKE ?", (f"sim-{aTag}-%",))
+        aCustomerIds = [aRow[0] for aRow in aCur.fetchall()]
+        # Drivers already in a seed database are dispatched too, so they are part of the simulated fleet.
+        aCur.execute("SELECT id FROM users WHERE role = 'driver'")
+        return aCustomerIds, [aRow[0] for aRow in aCur.fetchall()]
+
+    def run(self):
+        aWallStart = time.perf_counter()
+        # Simulated time starts at the next hour, so every ride is in the future for the dispatch code.
+        aStartTs = (now_epoch() // HOUR_SECONDS + 1) * HOUR_SECONDS
+        anEndTs = aStartTs + self.config.hours * HOUR_SECONDS
+
+        self.customer_ids, self.driver_ids = self.execute(self.create_users)
+        for aDriverId in self.driver_ids:
+            self.move_driver(aDriverId, self.place_point(self.random.choice(self.places)))
+            self.driver_free_ts[aDriverId] = aStartTs
+
+        for anHourTs in range(aStartTs, anEndTs, HOUR_SECONDS):
+            self.schedule(anHourTs, "hour")
+        aRequests = 0
+        for anHourTs in range(aStartTs, anEndTs, HOUR_SECONDS):
+            aRate = self.get_rate(anHourTs)
+            aTimestamp = anHourTs
+            while aRate > 0:
+                aTimestamp += self.random.expovariate(aRate / HOUR_SECONDS)
+                if aTimestamp >= anHourTs + HOUR_SECONDS:
+                    break
+                self.schedule(int(aTimestamp), "request")
+                aRequests += 1
+
+        while self.events:
+            aNowTs, _, aKind, aData = heapq.heappop(self.events)
+            self.last_event_ts = aNowTs
+            getattr(self, f"on_{aKind}")(aNowTs, *aData)
+
+        aWallSeconds = time.perf_counter() - aWallStart
+        return SimulationResult(
+            requests=aRequests,
+            served=self.served,
+            unserved=self.unserved,
+            declines=self.declines,
+            assign_wait_p50=percentile(self.assign_waits, 0.5),
+            assign_wait_p95=percentile(self.assign_waits, 0.95),
+            pickup_delay_p50=percentile(self.pickup_delays, 0.5),
+            pickup_delay_p95=percentile(self.pickup_delays, 0.95),
+            # Rides booked near the end finish after it, so utilization is over the time until the last drop-off.
+            utilization=self.busy_seconds / (max(1, len(self.driver_ids)) * (max(anEndTs, self.last_event_ts) - aStartTs)),
+            db_ms_p50=percentile(self.db_ms, 0.5),
+            db_ms_p95=percentile(self.db_ms, 0.95),
+            db_ms_max=max(self.db_ms, default=0.0),
+            wall_seconds=aWallSeconds,
+            speedup=(anEndTs - aStartTs) / aWallSeconds if aWallSeconds else math.inf,
+        )
+
+    def on_hour(self, aNowTs):
+        # Positions are aged on the real clock, so re-stamp them before they look stale to dispatch.
+        for aDriverId, aPoint in self.driver_points.items():
+            DRIVER_POSITIONS.update(aDriverId, aPoint[0], aPoint[1])
+
+    def on_request(self, aNowTs):
+        aPickup, aDropoff = self.pick_route()
+        aLeadSeconds = 60 * self.random.randint(self.config.min_lead_minutes, self.config.max_lead_minutes)
+        aStartTs = aNowTs + aLeadSeconds
+        aBookingId = self.execute(
+            lambda aCur: create_booking(aCur, self.random.choice(self.customer_ids), aPickup, aDropoff, aStartTs)
+        )
+        self.requested_at[aBookingId] = aNowTs
+        self.schedule(aStartTs, "expire", aBookingId)
+        self.dispatcher.enqueue(aBookingId, aStartTs)
+        self.dispatch(aNowTs)
+
+    def dispatch(self, aNowTs):
+        # Same ranking and versioned assignment the background reassigner uses.
+        aWaitingIds = list(self.dispatcher.queued_ids)
+        self.timed(self.dispatcher.run_once)
+        if not aWaitingIds:
+            return
+        aPlaceholders = ", ".join("?" for _ in aWaitingIds)
+        aRows = self.execute(
+            lambda aCur: aCur.execute(
+                f"""
+                SELECT b.id, b.driver_id, b.version, b.start_ts, p.name, d.name FROM bookings b
+                JOIN locations p ON p.id = b.pickup_location_id
+                JOIN locations d ON d.id = b.dropoff_location_id
+                WHERE b.id IN ({aPlaceholders}) AND b.status = 'assigned'
+                """,
+                aWaitingIds,
+            ).fetchall()
+        )
+        for aBookingId, aDriverId, aVersion, aStartTs, aPickup, aDropoff in aRows:
+            self.assign_waits.append(aNowTs - self.requested_at[aBookingId])
+            aResponseTs = aNowTs + self.random.randint(1, self.config.max_response_seconds)
+            self.schedule(aResponseTs, "respond", aBookingId, aDriverId, aVersion, aStartTs, aPickup, aDropoff)
+        if self.dispatcher.queue and not self.retry_scheduled:
+            self.retry_scheduled = True
+            self.schedule(aNowTs + SIM_RETRY_SECONDS, "retry")
+
+    def on_retry(self, aNowTs):
+        self.retry_scheduled = False
+        if self.dispatcher.queue:
+            self.dispatch(aNowTs)
+
+    def on_respond(self, aNowTs, aBookingId, aDriverId, aVersion, aStartTs, aPickup, aDropoff):
+        if self.random.random() < self.config.decline_rate:
+            def decline(aCur):
+                if transition_booking(aCur, aBookingId, aVersion, "decline", aDriverId):
+                    record_decline(aCur, aBookingId, aDriverId, "Simulated decline")
+                    return True
+                return False
+
+            if self.execute(decline):
+                self.declines += 1
+                self.requested_at[aBookingId] = aNowTs
+                self.dispatcher.enqueue(aBookingId, aStartTs)
+                self.dispatch(aNowTs)
+            return
+
+        aPickupPoint = self.place_point(aPickup)
+        aDropoffPoint = self.place_point(aDropoff)
+        aTravelSeconds = distance_km(self.driver_points[aDriverId], aPickupPoint) / SIM_SPEED_KMH * HOUR_SECONDS
+        anArrivalTs = max(aStartTs, self.driver_free_ts[aDriverId] + aTravelSeconds, aNowTs + aTravelSeconds)
+        aRideSeconds = min(
+            SIM_MAX_RIDE_SECONDS, SIM_BOARDING_SECONDS + distance_km(aPickupPoint, aDropoffPoint) / SIM_SPEED_KMH * HOUR_SECONDS
+        )
+        self.pickup_delays.append(anArrivalTs - aStartTs)
+        self.busy_seconds += aTravelSeconds + aRideSeconds
+        self.driver_free_ts[aDriverId] = anArrivalTs + aRideSeconds
+        self.schedule(int(anArrivalTs + aRideSeconds), "complete", aBookingId, aDriverId, aVersion, aDropoffPoint)
+
+    def on_complete(self, aNowTs, aBookingId, aDriverId, aVersion, aDropoffPoint):
+        if self.execute(lambda aCur: transition_booking(aCur, aBookingId, aVersion, "complete", aDriverId)):
+            self.served += 1
+        self.move_driver(aDriverId, aDropoffPoint)
+
+    def on_expire(self, aNowTs, aBookingId):
+        # Nobody took the ride by pickup time: the customer gives up.
+        def cancel(aCur):
+            aCur.execute("SELECT version FROM bookings WHERE id = ? AND status = 'pending'", (aBookingId,))
+            aRow = aCur.fetchone()
+            return aRow is not None and transition_booking(aCur, aBookingId, aRow[0], "cancel")
+
+        if self.execute(cancel):
+            self.unserved += 1
+
+
+def run_simulation(aConfig, aDbPath=None, aHistoryPath=None):
+    aRatesByHour, aRoutes = load_history(aHistoryPath) if aHistoryPath else (None, None)
+    aTempDir = None
+    if aDbPath is None:
+        aTempDir = tempfile.mkdtemp(prefix="tbs-sim-")
+        aDbPath = os.path.join(aTempDir, "taxi.db")
+    try:
+        use_ride_buffer(aConfig.ride_buffer_seconds)
+        use_database(aDbPath)
+        return Simulation(aConfig, aRatesByHour, aRoutes).run()
+    finally:
+        if aTempDir:
+            shutil.rmtree(aTempDir, ignore_errors=True)
+
+
+def format_result(aResult):
+    return "\n".join(
+        [
+            f"Requests: {aResult.requests}  served: {aResult.served}  unserved: {aResult.unserved}  declines: {aResult.declines}",
+            f"Wait for a driver (s): p50 {aResult.assign_wait_p50:.0f}  p95 {aResult.assign_wait_p95:.0f}",
+            f"Pickup delay (s): p50 {aResult.pickup_delay_p50:.0f}  p95 {aResult.pickup_delay_p95:.0f}",
+            f"Driver utilization: {aResult.utilization:.1%}",
+            f"DB operation (ms): p50 {aResult.db_ms_p50:.2f}  p95 {aResult.db_ms_p95:.2f}  max {aResult.db_ms_max:.2f}",
+            f"Wall time: {aResult.wall_seconds:.1f} s ({aResult.speedup:.0f}x real time)",
+        ]
+    )
+
+
+if __name__ == "__main__":
+    aDefaults = SimulationConfig()
+    aParser = argparse.ArgumentParser(description="Run a headless dispatch simulation against a scratch taxi database.")
+    aParser.add_argument("--hours", type=int, default=aDefaults.hours)
+    aParser.add_argument("--drivers", type=int, default=aDefaults.drivers, help="Drivers added to any already in the database.")
+    aParser.add_argument("--customers", type=int, default=aDefaults.customers)
+    aParser.add_argument("--requests-per-hour", type=float, default=aDefaults.requests_per_hour)
+    aParser.add_argument("--decline-rate", type=float, default=aDefaults.decline_rate)
+    aParser.add_argument("--min-lead-minutes", type=int, default=aDefaults.min_lead_minutes)
+    aParser.add_argument("--max-lead-minutes", type=int, default=aDefaults.max_lead_minutes)
+    aParser.add_argument("--max-response-seconds", type=int, default=aDefaults.max_response_seconds)
+    aParser.add_argument("--seed", type=int, default=aDefaults.seed)
+    aParser.add_argument("--ride-buffer-seconds", type=int, default=aDefaults.ride_buffer_seconds)
+    aParser.add_argument("--dispatch-policy", choices=DISPATCH_POLICIES, default=aDefaults.dispatch_policy)
+    aParser.add_argument("--history", help="Learn arrival rates and routes from the bookings in this database.")
+    aParser.add_argument("--db", help="Simulate in this database file instead of a temporary one.")
+    aParser.add_argument("--sql-report", action="store_true", help="Print per-statement SQL timings afterwards.")
+    anArgs = aParser.parse_args()
+
+    aConfig = SimulationConfig(
+        anArgs.hours,
+        anArgs.drivers,
+        anArgs.customers,
+        anArgs.requests_per_hour,
+        anArgs.decline_rate,
+        anArgs.min_lead_minutes,
+        anArgs.max_lead_minutes,
+        anArgs.max_response_seconds,
+        anArgs.seed,
+        anArgs.ride_buffer_seconds,
+        anArgs.dispatch_policy,
+    )
+    print(format_result(run_simulation(aConfig, anArgs.db, anArgs.history)))
+    if anArgs.sql_report:
+        print(MONITOR.report())
@@ -0,0 +1,182 @@
+import sqlite3
+import time
+from collections import Counter
+
+from PIL import Image, ImageDraw
+
+from db_setup import get_connection, get_write_connection
+from geocoding import BEDFORDSHIRE_GAZETTEER
+
+
+# South, west, north and east edges of the grid, wide enough for the whole county.
+GRID_BOUNDS = (51.80, -0.72, 52.33, -0.10)
+GRID_ROWS = 40
+GRID_COLS = 40
+GRID_STATE_NAME = "demand_grid"
+GRID_RELOAD_CHUNK = 500
+GRID_REFRESH_SECONDS = 60
+GRID_KINDS = ("pickup", "dropoff")
+HOUR_OF_WEEK_SQL = "((b.start_ts + 259200) % 604800) / 3600"
+
+HEATMAP_SCALE = 10
+HEATMAP_BACKGROUND = (15, 20, 25)
+HEATMAP_RAMP = ((26, 31, 46), (79, 195, 247), (255, 215, 0), (229, 115, 115))
+HEATMAP_LABELS = ("bedford", "luton", "dunstable", "leighton buzzard", "biggleswade", "flitwick", "sandy")
+
+
+def get_grid_cell(aLatitude, aLongitude):
+    aSouth, aWest, aNorth, anEast = GRID_BOUNDS
+    if aLatitude is None or aLongitude is None:
+        return None
+    if not (aSouth <= aLatitude < aNorth and aWest <= aLongitude < anEast):
+        return None
+    aRow = int((aLatitude - aSouth) / (aNorth - aSouth) * GRID_ROWS)
+    aCol = int((aLongitude - aWest) / (anEast - aWest) * GRID_COLS)
+    return aRow * GRID_COLS + aCol
+
+
+def get_grid_position(aLatitude, aLongitude, aScale=HEATMAP_SCALE):
+    aSouth, aWest, aNorth, anEast = GRID_BOUNDS
+    aX = (aLongitude - aWest) / (anEast - aWest) * GRID_COLS * aScale
+    aY = (aNorth - aLatitude) / (aNorth - aSouth) * GRID_ROWS * aScale
+    return aX, aY
+
+
+def load_booking_cells(aCur, aBookingIds):
+    aPlaceholders = ", ".join("?" for _ in aBookingIds)
+    aCur.execute(
+        f"SELECT hour_of_week, pickup_cell, dropoff_cell FROM demand_grid_bookings WHERE booking_id IN ({aPlaceholders})",
+        aBookingIds,
+    )
+    return aCur.fetchall()
+
+
+def add_cell_deltas(aDeltas, aRows, aSign):
+    for anHour, aPickupCell, aDropoffCell in aRows:
+        for aKind, aCell in zip(GRID_KINDS, (aPickupCell, aDropoffCell)):
+            if aCell is not None:
+                aDeltas[(aKind, aCell, anHour)] += aSign
+
+
+def get_booking_cells_query(aWhere=""):
+    return f"""
+        INSERT INTO demand_grid_bookings (booking_id, hour_of_week, pickup_cell, dropoff_cell)
+        SELECT b.id, {HOUR_OF_WEEK_SQL}, p.grid_cell, d.grid_cell
+        FROM all_bookings b
+        LEFT JOIN locations p ON p.id = b.pickup_location_id
+        LEFT JOIN locations d ON d.id = b.dropoff_location_id
+        WHERE b.start_ts IS NOT NULL {aWhere}
+    """
+
+
+def rebuild_demand_grid(aCur):
+    aCur.execute("DELETE FROM demand_grid")
+    aCur.execute("DELETE FROM demand_grid_bookings")
+    aCur.execute(get_booking_cells_query())
+    aCur.execute("""
+        INSERT INTO demand_grid (kind, cell, hour_of_week, ride_count)
+        SELECT 'pickup', pickup_cell, hour_of_week, COUNT(*) FROM demand_grid_bookings
+        WHERE pickup_cell IS NOT NULL GROUP BY pickup_cell, hour_of_week
+        UNION ALL
+        SELECT 'dropoff', dropoff_cell, hour_of_week, COUNT(*) FROM demand_grid_bookings
+        WHERE dropoff_cell IS NOT NULL GROUP BY dropoff_cell, hour_of_week
+    """)
+
+
+def apply_booking_changes(aCur, aBookingIds):
+    aDeltas = Counter()
+    for aStart in range(0, len(aBookingIds), GRID_RELOAD_CHUNK):
+        aChunk = aBookingIds[aStart:aStart + GRID_RELOAD_CHUNK]
+        aPlaceholders = ", ".join("?" for _ in aChunk)
+        add_cell_deltas(aDeltas, load_booking_cells(aCur, aChunk), -1)
+        aCur.execute(f"DELETE FROM demand_grid_bookings WHERE booking_id IN ({aPlaceholders})", aChunk)
+        aCur.execute(get_booking_cells_query(f"AND b.id IN ({aPlaceholders})"), aChunk)
+        add_cell_deltas(aDeltas, load_booking_cells(aCur, aChunk), 1)
+
+    aCur.executemany(
+        "INSERT INTO demand_grid (kind, cell, hour_of_week, ride_count) VALUES (?, ?, ?, ?) ON CONFLICT (kind, cell, hour_of_week) DO UPDATE SET ride_count = ride_count + excluded.ride_count",
+        [(aKind, aCell, anHour, aDelta) for (aKind, aCell, anHour), aDelta in aDeltas.items() if aDelta],
+    )
+    aCur.execute("DELETE FROM demand_grid WHERE ride_count <= 0")
+
+
+def refresh_demand_grid():
+    aConn = get_write_connection()
+    try:
+        aCur = aConn.cursor()
+        aCur.execute("SELECT change_log_id FROM aggregation_state WHERE name = ?", (GRID_STATE_NAME,))
+        aRow = aCur.fetchone()
+        aCur.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM change_log")
+        aMinId, aMaxId = aCur.fetchone()
+
+        if aRow is None or aMinId > aRow[0] + 1:
+            rebuild_demand_grid(aCur)
+        elif aMaxId > aRow[0]:
+            aCur.execute(
+                "SELECT DISTINCT row_id FROM change_log WHERE id > ? AND id <= ? AND table_name IN ('bookings', 'bookings_archive')",
+                (aRow[0], aMaxId),
+            )
+            apply_booking_changes(aCur, [aChange[0] for aChange in aCur.fetchall()])
+        else:
+            return
+
+        aCur.execute(
+            "INSERT OR REPLACE INTO aggregation_state (name, change_log_id) VALUES (?, ?)", (GRID_STATE_NAME, aMaxId)
+        )
+        aConn.commit()
+    except sqlite3.Error as anError:
+        aConn.rollback()
+        print(f"Demand grid refresh stopped: {anError}")
+    finally:
+        aConn.close()
+
+
+def run_demand_grid_refresh(aRefreshSeconds=GRID_REFRESH_SECONDS):
+    # Off the Tk thread: the refresh is a write transaction and can wait out another client's lock.
+    while True:
+        refresh_demand_grid()
+        time.sleep(aRefreshSeconds)
+
+
+def load_cell_counts(aKind="pickup", aHours=None):
+    aQuery = "SELECT cell, SUM(ride_count) FROM demand_grid WHERE kind = ?"
+    aParams = [aKind]
+    if aHours is not None:
+        aQuery += f" AND hour_of_week IN ({', '.join('?' for _ in aHours)})"
+        aParams.extend(aHours)
+
+    aConn = get_connection()
+    try:
+        aCur = aConn.cursor()
+        aCur.execute(aQuery + " GROUP BY cell", aParams)
+        return dict(aCur.fetchall())
+    finally:
+        aConn.close()
+
+
+def get_ramp_color(aLevel):
+    aPosition = aLevel * (len(HEATMAP_RAMP) - 1)
+    anIndex = min(int(aPosition), len(HEATMAP_RAMP) - 2)
+    aFraction = aPosition - anIndex
+    aLow, aHigh = HEATMAP_RAMP[anIndex], HEATMAP_RAMP[anIndex + 1]
+    return tuple(round(aLowPart + (aHighPart - aLowPart) * aFraction) for aLowPart, aHighPart in zip(aLow, aHigh))
+
+
+def render_heatmap(aCellCounts, aScale=HEATMAP_SCALE):
+    aMaxCount = max(aCellCounts.values(), default=0)
+    aPixels = [HEATMAP_BACKGROUND] * (GRID_ROWS * GRID_COLS)
+    for aCell, aCount in aCellCounts.items():
+        aRow, aCol = divmod(aCell, GRID_COLS)
+        # Square-root scaling keeps quieter villages visible next to Luton and Bedford.
+        aPixels[(GRID_ROWS - 1 - aRow) * GRID_COLS + aCol] = get_ramp_color((aCount / aMaxCount) ** 0.5)
+
+    anImage = Image.new("RGB", (GRID_COLS, GRID_ROWS))
+    anImage.putdata(aPixels)
+    anImage = anImage.resize((GRID_COLS * aScale, GRID_ROWS * aScale), Image.NEAREST)
+
+    aDraw = ImageDraw.Draw(anImage)
+    for aPlace in HEATMAP_LABELS:
+        aX, aY = get_grid_position(*BEDFORDSHIRE_GAZETTEER[aPlace], aScale)
+        aDraw.ellipse((aX - 2, aY - 2, aX + 2, aY + 2), fill=(226, 232, 240))
+        aDraw.text((aX + 5, aY - 6), aPlace.title(), fill=(226, 232, 240))
+    return anImage
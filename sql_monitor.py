@@ -0,0 +1,257 @@
+import sqlite3
+import time
+import re
+import os
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+
+from metrics import METRICS, format_histogram
+
+
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("TBS_SLOW_QUERY_MS", "100"))
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+REPORT_TOP_N = 15
+
+SLOW_QUERY_LOGGER = logging.getLogger("tbs.sql.slow")
+
+
+class StatementStats:
+    def __init__(self, aSql):
+        self.sql = aSql
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.fetch_ms = 0.0
+        self.rows = 0
+        self.slow_calls = 0
+        self.last_plan = None
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, anElapsedMs, aRows):
+        self.calls += 1
+        self.total_ms += anElapsedMs
+        self.rows += aRows
+        if anElapsedMs > self.max_ms:
+            self.max_ms = anElapsedMs
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, anElapsedMs)] += 1
+
+    def percentile(self, aFraction):
+        aTarget = self.calls * aFraction
+        aSeen = 0
+        for anIndex, aCount in enumerate(self.buckets):
+            aSeen += aCount
+            if aSeen >= aTarget and aCount:
+                return LATENCY_BUCKETS_MS[anIndex] if anIndex < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return 0.0
+
+
+class SqlMonitor:
+    def __init__(self, aSlowThresholdMs=SLOW_QUERY_THRESHOLD_MS):
+        self.slow_threshold_ms = aSlowThresholdMs
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get_stats(self, aSql):
+        aKey = normalize_sql(aSql)
+        aStats = self.stats.get(aKey)
+        if aStats is None:
+            with self.lock:
+                aStats = self.stats.setdefault(aKey, StatementStats(aKey))
+        return aStats
+
+    def record(self, aSql, anElapsedMs, aRows):
+        aStats = self.get_stats(aSql)
+        with self.lock:
+            aStats.record(anElapsedMs, aRows)
+        return aStats
+
+    def record_fetch(self, aStats, anElapsedMs, aRows):
+        with self.lock:
+            aStats.fetch_ms += anElapsedMs
+            aStats.rows += aRows
+
+    def record_slow(self, aStats, aSql, anElapsedMs, aPlan):
+        with self.lock:
+            aStats.slow_calls += 1
+            aStats.last_plan = aPlan
+        SLOW_QUERY_LOGGER.warning(
+            "Slow query (%.1f ms): %s\n%s", anElapsedMs, normalize_sql(aSql), "\n".join(aPlan or ["(no plan)"])
+        )
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def collect_metrics(self):
+        # Statements are already bucketed here, so the scrape folds them by verb instead of timing twice.
+        aTotals = {}
+        with self.lock:
+            for aStats in self.stats.values():
+                aVerb = aStats.sql.split(" ", 1)[0].upper()
+                aTotal = aTotals.setdefault(aVerb, [[0] * len(aStats.buckets), 0.0])
+                for anIndex, aCount in enumerate(aStats.buckets):
+                    aTotal[0][anIndex] += aCount
+                aTotal[1] += aStats.total_ms
+        aLines = [
+            "# HELP tbs_db_statement_duration_seconds Time spent executing SQL statements.",
+            "# TYPE tbs_db_statement_duration_seconds histogram",
+        ]
+        aBuckets = [aBucketMs / 1000 for aBucketMs in LATENCY_BUCKETS_MS]
+        for aVerb, (aCounts, aTotalMs) in sorted(aTotals.items()):
+            aLines.extend(
+                format_histogram("tbs_db_statement_duration_seconds", ("verb",), (aVerb,), aBuckets, aCounts, aTotalMs / 1000)
+            )
+        return aLines
+
+    def report(self, aTopN=REPORT_TOP_N):
+        with self.lock:
+            aRanked = sorted(self.stats.values(), key=lambda aStats: aStats.total_ms + aStats.fetch_ms, reverse=True)
+
+        aLines = [
+            f"{'calls':>7} {'total ms':>10} {'mean ms':>9} {'p95 ms':>8} {'max ms':>9} {'fetch ms':>9} {'rows':>8}  statement"
+        ]
+        for aStats in aRanked[:aTopN]:
+            aLines.append(
+                f"{aStats.calls:>7} {aStats.total_ms:>10.2f} {aStats.total_ms / aStats.calls:>9.3f} "
+                f"{aStats.percentile(0.95):>8.2f} {aStats.max_ms:>9.2f} {aStats.fetch_ms:>9.2f} {aStats.rows:>8}  "
+                f"{aStats.sql[:120]}"
+            )
+            if aStats.last_plan:
+                aLines.extend(f"{'':>66}plan: {aStep}" for aStep in aStats.last_plan)
+        return "\n".join(aLines)
+
+
+MONITOR = SqlMonitor()
+METRICS.add_collector(MONITOR.collect_metrics)
+
+
+def normalize_sql(aSql):
+    aSql = re.sub(r"\s+", " ", aSql).strip()
+    return re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", aSql)
+
+
+def explain_query(aConn, aSql, aParams):
+    aVerb = aSql.split(None, 1)[0].upper() if aSql.strip() else ""
+    if aVerb not in ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH"):
+        return None
+    try:
+        aCur = sqlite3.Cursor(aConn)
+        aCur.execute(f"EXPLAIN QUERY PLAN {aSql}", aParams)
+        return [aRow[3] for aRow in aCur.fetchall()]
+    except sqlite3.Error as anError:
+        return [f"EXPLAIN failed: {anError}"]
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    last_stats = None
+    last_sql = None
+    last_params = None
+    statement_ms = 0.0
+    slow_logged = False
+
+    def execute(self, aSql, aParams=()):
+        aStart = time.perf_counter()
+        try:
+            return super().execute(aSql, aParams)
+        finally:
+            self.finish_statement(aSql, aParams, aStart)
+
+    def executemany(self, aSql, aParamSeq):
+        aStart = time.perf_counter()
+        try:
+            return super().executemany(aSql, aParamSeq)
+        finally:
+            self.finish_statement(aSql, None, aStart)
+
+    def finish_statement(self, aSql, aParams, aStart):
+        anElapsedMs = (time.perf_counter() - aStart) * 1000
+        self.last_stats = MONITOR.record(aSql, anElapsedMs, max(self.rowcount, 0))
+        self.last_sql = aSql
+        self.last_params = aParams
+        self.statement_ms = anElapsedMs
+        self.slow_logged = False
+        self.check_slow()
+
+    def check_slow(self):
+        if self.slow_logged or self.statement_ms < MONITOR.slow_threshold_ms:
+            return
+        self.slow_logged = True
+        aPlan = explain_query(self.connection, self.last_sql, self.last_params) if self.last_params is not None else None
+        MONITOR.record_slow(self.last_stats, self.last_sql, self.statement_ms, aPlan)
+
+    def fetchone(self):
+        aStart = time.perf_counter()
+        aRow = super().fetchone()
+        self.finish_fetch(aStart, 1 if aRow is not None else 0)
+        return aRow
+
+    def fetchmany(self, aSize=None):
+        aStart = time.perf_counter()
+        aRows = super().fetchmany(self.arraysize if aSize is None else aSize)
+        self.finish_fetch(aStart, len(aRows))
+        return aRows
+
+    def fetchall(self):
+        aStart = time.perf_counter()
+        aRows = super().fetchall()
+        self.finish_fetch(aStart, len(aRows))
+        return aRows
+
+    def finish_fetch(self, aStart, aRowCount):
+        if self.last_stats is not None:
+            anElapsedMs = (time.perf_counter() - aStart) * 1000
+            MONITOR.record_fetch(self.last_stats, anElapsedMs, aRowCount)
+            self.statement_ms += anElapsedMs
+            self.check_slow()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    commit_callbacks = ()
+
+    def cursor(self, aFactory=InstrumentedCursor):
+        return super().cursor(aFactory)
+
+    def after_commit(self, aCallback):
+        if not self.commit_callbacks:
+            self.commit_callbacks = []
+        self.commit_callbacks.append(aCallback)
+
+    def commit(self):
+        super().commit()
+        aCallbacks, self.commit_callbacks = self.commit_callbacks, ()
+        for aCallback in aCallbacks:
+            aCallback()
+
+    def rollback(self):
+        self.commit_callbacks = ()
+        super().rollback()
+
+    def close(self):
+        self.commit_callbacks = ()
+        super().close()
+
+    def execute(self, aSql, aParams=()):
+        return self.cursor().execute(aSql, aParams)
+
+    def executemany(self, aSql, aParamSeq):
+        return self.cursor().executemany(aSql, aParamSeq)
+
+
+def write_report(aPath=None, aTopN=REPORT_TOP_N):
+    aReport = MONITOR.report(aTopN)
+    if not aPath or aPath == "-":
+        print(aReport)
+        return
+    with open(aPath, "w", encoding="utf-8") as aFile:
+        aFile.write(aReport + "\n")
+
+
+if os.environ.get("TBS_SLOW_QUERY_LOG"):
+    aHandler = logging.FileHandler(os.environ["TBS_SLOW_QUERY_LOG"], encoding="utf-8")
+    aHandler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    SLOW_QUERY_LOGGER.addHandler(aHandler)
+
+if os.environ.get("TBS_SQL_REPORT"):
+    atexit.register(write_report, os.environ["TBS_SQL_REPORT"])
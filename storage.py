@@ -0,0 +1,299 @@
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+import db_setup
+import booking_state
+from booking_state import BOOKING_TRANSITIONS, create_booking, delete_booking_version, transition_booking
+from locations import LocationCache
+from user_directory import normalize_role
+
+
+DEFAULT_STORAGE = "sqlite"
+ACTIVE_STATUSES = ("pending", "assigned")
+BOOKING_COLUMNS = "b.id, b.user_id, b.driver_id, p.name, d.name, b.status, b.start_ts, b.end_ts, b.version, b.pooled_trip_id"
+BOOKING_SOURCE = "bookings b LEFT JOIN locations p ON p.id = b.pickup_location_id LEFT JOIN locations d ON d.id = b.dropoff_location_id"
+
+BookingRecord = namedtuple(
+    "BookingRecord",
+    ["id", "user_id", "driver_id", "pickup_location", "dropoff_location", "status", "start_ts", "end_ts", "version", "pooled_trip_id"],
+)
+
+
+class BookingStore:
+    # Users are (id, name, email, phone, role) like UserDirectory; bookings are BookingRecords.
+    def add_user(self, anEmail, aPassword, aRole, aName, anAddress, aPhone):
+        raise NotImplementedError
+
+    def get_user(self, aUserId):
+        raise NotImplementedError
+
+    def find_user(self, anEmail, aPassword):
+        raise NotImplementedError
+
+    def get_users_by_role(self, aRole):
+        raise NotImplementedError
+
+    def add_booking(self, aUserId, aPickup, aDropoff, aStartTs):
+        raise NotImplementedError
+
+    def get_booking(self, aBookingId):
+        raise NotImplementedError
+
+    def get_user_bookings(self, aUserId):
+        raise NotImplementedError
+
+    def get_driver_bookings(self, aDriverId, aFromTs=None):
+        raise NotImplementedError
+
+    def is_driver_free(self, aDriverId, aStartTs, anExcludeBookingId=None):
+        raise NotImplementedError
+
+    def transition(self, aBookingId, aVersion, anAction, aDriverId=None, aUserId=None):
+        raise NotImplementedError
+
+    def delete_booking(self, aBookingId, aVersion):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SqliteStore(BookingStore):
+    def __init__(self, aPath=None):
+        self.path = aPath or db_setup.DB_PATH
+        self.locations = LocationCache(self.path)
+        self.local = threading.local()
+        db_setup.init_db(self.path)
+
+    def get_connection(self):
+        # One connection per thread, reused across calls; each method is still its own transaction.
+        aConn = getattr(self.local, "connection", None)
+        if aConn is None:
+            aConn = self.local.connection = db_setup.get_write_connection(aPath=self.path)
+        return aConn
+
+    def write(self, anOperation):
+        aConn = self.get_connection()
+        try:
+            aResult = anOperation(aConn.cursor())
+            aConn.commit()
+            return aResult
+        except sqlite3.Error:
+            aConn.rollback()
+            raise
+
+    def read(self, aQuery, aParams=()):
+        return self.get_connection().execute(aQuery, aParams).fetchall()
+
+    def add_user(self, anEmail, aPassword, aRole, aName, anAddress, aPhone):
+        return self.write(
+            lambda aCur: aCur.execute(
+                "INSERT INTO users (email, password, role, name, address, phone) VALUES (?, ?, ?, ?, ?, ?)",
+                (anEmail, aPassword, normalize_role(aRole), aName, anAddress, aPhone),
+            ).lastrowid
+        )
+
+    def get_user(self, aUserId):
+        aRows = self.read("SELECT id, name, email, phone, role FROM users WHERE id = ?", (aUserId,))
+        return aRows[0] if aRows else None
+
+    def find_user(self, anEmail, aPassword):
+        aRows = self.read(
+            "SELECT id, name, email, phone, role FROM users WHERE email = ? AND password = ?", (anEmail, aPassword)
+        )
+        return aRows[0] if aRows else None
+
+    def get_users_by_role(self, aRole):
+        return self.read(
+            "SELECT id, name, email, phone, role FROM users WHERE role = ? ORDER BY name", (normalize_role(aRole),)
+        )
+
+    def add_booking(self, aUserId, aPickup, aDropoff, aStartTs):
+        return self.write(lambda aCur: create_booking(aCur, aUserId, aPickup, aDropoff, aStartTs, self.locations))
+
+    def get_booking(self, aBookingId):
+        aRows = self.read(f"SELECT {BOOKING_COLUMNS} FROM {BOOKING_SOURCE} WHERE b.id = ?", (aBookingId,))
+        return BookingRecord(*aRows[0]) if aRows else None
+
+    def get_user_bookings(self, aUserId):
+        aRows = self.read(f"SELECT {BOOKING_COLUMNS} FROM {BOOKING_SOURCE} WHERE b.user_id = ? ORDER BY b.start_ts, b.id", (aUserId,))
+        return [BookingRecord(*aRow) for aRow in aRows]
+
+    def get_driver_bookings(self, aDriverId, aFromTs=None):
+        aRows = self.read(
+            f"SELECT {BOOKING_COLUMNS} FROM {BOOKING_SOURCE} WHERE b.driver_id = ? AND b.start_ts >= ? ORDER BY b.start_ts, b.id",
+            (aDriverId, aFromTs if aFromTs is not None else -2 ** 63),
+        )
+        return [BookingRecord(*aRow) for aRow in aRows]
+
+    def is_driver_free(self, aDriverId, aStartTs, anExcludeBookingId=None):
+        anExcludeBookingId = anExcludeBookingId if anExcludeBookingId is not None else -1
+        aCondition = booking_state.get_driver_free_condition(
+            "?", aStartTs, "?", "(SELECT pooled_trip_id FROM bookings WHERE id = ?)"
+        )
+        aRows = self.read(f"SELECT {aCondition}", (aDriverId, anExcludeBookingId, anExcludeBookingId))
+        return bool(aRows[0][0])
+
+    def transition(self, aBookingId, aVersion, anAction, aDriverId=None, aUserId=None):
+        return self.write(lambda aCur: transition_booking(aCur, aBookingId, aVersion, anAction, aDriverId, aUserId))
+
+    def delete_booking(self, aBookingId, aVersion):
+        return self.write(lambda aCur: delete_booking_version(aCur, aBookingId, aVersion))
+
+    def close(self):
+        aConn = getattr(self.local, "connection", None)
+        if aConn is not None:
+            aConn.close()
+            self.local.connection = None
+
+
+class MemoryStore(BookingStore):
+    def __init__(self):
+        self.users_by_id = {}
+        self.passwords_by_id = {}
+        self.user_ids_by_email = {}
+        self.user_ids_by_role = {}
+        self.bookings_by_id = {}
+        self.booking_ids_by_user = {}
+        # (start_ts, id) per driver, kept sorted so overlap checks only look at the rides near a start time.
+        self.starts_by_driver = {}
+        self.next_user_id = 1
+        self.next_booking_id = 1
+        self.lock = threading.RLock()
+
+    def add_user(self, anEmail, aPassword, aRole, aName, anAddress, aPhone):
+        with self.lock:
+            if anEmail in self.user_ids_by_email:
+                raise sqlite3.IntegrityError("UNIQUE constraint failed: users.email")
+            aUserId = self.next_user_id
+            self.next_user_id += 1
+            aRole = normalize_role(aRole)
+            self.users_by_id[aUserId] = (aUserId, aName, anEmail, aPhone, aRole)
+            self.passwords_by_id[aUserId] = aPassword
+            self.user_ids_by_email[anEmail] = aUserId
+            self.user_ids_by_role.setdefault(aRole, set()).add(aUserId)
+            return aUserId
+
+    def get_user(self, aUserId):
+        return self.users_by_id.get(aUserId)
+
+    def find_user(self, anEmail, aPassword):
+        aUserId = self.user_ids_by_email.get(anEmail)
+        if aUserId is None or self.passwords_by_id[aUserId] != aPassword:
+            return None
+        return self.users_by_id[aUserId]
+
+    def get_users_by_role(self, aRole):
+        with self.lock:
+            aUsers = [self.users_by_id[aUserId] for aUserId in self.user_ids_by_role.get(normalize_role(aRole), ())]
+        return sorted(aUsers, key=lambda aUser: aUser[1])
+
+    def add_booking(self, aUserId, aPickup, aDropoff, aStartTs):
+        with self.lock:
+            aBookingId = self.next_booking_id
+            self.next_booking_id += 1
+            self.bookings_by_id[aBookingId] = BookingRecord(
+                aBookingId, aUserId, None, aPickup, aDropoff, "pending", aStartTs, aStartTs + booking_state.RIDE_DURATION_SECONDS, 0, None
+            )
+            self.booking_ids_by_user.setdefault(aUserId, set()).add(aBookingId)
+            return aBookingId
+
+    def get_booking(self, aBookingId):
+        return self.bookings_by_id.get(aBookingId)
+
+    def get_user_bookings(self, aUserId):
+        with self.lock:
+            aBookings = [self.bookings_by_id[aBookingId] for aBookingId in self.booking_ids_by_user.get(aUserId, ())]
+        return sorted(aBookings, key=lambda aBooking: (aBooking.start_ts, aBooking.id))
+
+    def get_driver_bookings(self, aDriverId, aFromTs=None):
+        with self.lock:
+            aStarts = self.starts_by_driver.get(aDriverId, [])
+            aFirst = bisect_left(aStarts, (aFromTs, 0)) if aFromTs is not None else 0
+            return [self.bookings_by_id[aBookingId] for _, aBookingId in aStarts[aFirst:]]
+
+    def is_driver_free(self, aDriverId, aStartTs, anExcludeBookingId=None):
+        with self.lock:
+            aBooking = self.bookings_by_id.get(anExcludeBookingId)
+            return self.find_conflict(aDriverId, aStartTs, anExcludeBookingId, aBooking.pooled_trip_id if aBooking else None) is None
+
+    def find_conflict(self, aDriverId, aStartTs, anExcludeBookingId, aPooledTripId):
+        # Same rule as booking_state.get_driver_free_condition.
+        aStarts = self.starts_by_driver.get(aDriverId, [])
+        aRideSeconds = booking_state.RIDE_DURATION_SECONDS
+        aFirst = bisect_right(aStarts, (aStartTs - aRideSeconds, float("inf")))
+        aLast = bisect_left(aStarts, (aStartTs + aRideSeconds, float("-inf")))
+        for _, anOtherId in aStarts[aFirst:aLast]:
+            anOther = self.bookings_by_id[anOtherId]
+            if (
+                anOther.end_ts > aStartTs
+                and anOther.status in ACTIVE_STATUSES
+                and anOther.id != anExcludeBookingId
+                and (aPooledTripId is None or anOther.pooled_trip_id != aPooledTripId)
+            ):
+                return anOther
+        return None
+
+    def transition(self, aBookingId, aVersion, anAction, aDriverId=None, aUserId=None):
+        aFromStatuses, aToStatus = BOOKING_TRANSITIONS[anAction]
+        with self.lock:
+            aBooking = self.bookings_by_id.get(aBookingId)
+            if aBooking is None or aBooking.version != aVersion or aBooking.status not in aFromStatuses:
+                return False
+            if aUserId is not None and aBooking.user_id != aUserId:
+                return False
+
+            aNewDriverId = aBooking.driver_id
+            if anAction == "assign":
+                if self.find_conflict(aDriverId, aBooking.start_ts, aBookingId, aBooking.pooled_trip_id):
+                    return False
+                aNewDriverId = aDriverId
+            elif anAction in ("decline", "complete"):
+                if aBooking.driver_id != aDriverId:
+                    return False
+                if anAction == "decline":
+                    aNewDriverId = None
+
+            self.set_driver(aBooking, aNewDriverId)
+            self.bookings_by_id[aBookingId] = aBooking._replace(
+                status=aToStatus, driver_id=aNewDriverId, version=aBooking.version + 1
+            )
+            return True
+
+    def set_driver(self, aBooking, aDriverId):
+        if aBooking.driver_id == aDriverId:
+            return
+        anEntry = (aBooking.start_ts, aBooking.id)
+        if aBooking.driver_id is not None:
+            aStarts = self.starts_by_driver[aBooking.driver_id]
+            del aStarts[bisect_left(aStarts, anEntry)]
+        if aDriverId is not None:
+            insort(self.starts_by_driver.setdefault(aDriverId, []), anEntry)
+
+    def delete_booking(self, aBookingId, aVersion):
+        with self.lock:
+            aBooking = self.bookings_by_id.get(aBookingId)
+            if aBooking is None or aBooking.version != aVersion:
+                return False
+            self.set_driver(aBooking, None)
+            del self.bookings_by_id[aBookingId]
+            self.booking_ids_by_user[aBooking.user_id].discard(aBookingId)
+            return True
+
+
+STORAGE_BACKENDS = {
+    "sqlite": SqliteStore,
+    "memory": MemoryStore,
+}
+
+
+def open_storage(aKind=None, aPath=None):
+    aKind = aKind or os.environ.get("TBS_STORAGE", DEFAULT_STORAGE)
+    if aKind not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend {aKind!r}; expected one of {', '.join(STORAGE_BACKENDS)}")
+    if aKind == "memory":
+        return MemoryStore()
+    return SqliteStore(aPath)
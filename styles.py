@@ -0,0 +1,35 @@
+import customtkinter as CTk
+
+
+FONT_FAMILY = "Segoe UI"
+
+STATUS_COLORS = {
+    "pending": "#FFD700",
+    "assigned": "#81C784",
+    "completed": "#4CAF50",
+    "cancelled": "#E57373",
+}
+
+ROLE_COLORS = {"customer": "#4FC3F7", "driver": "#FFD700", "admin": "#FF6B6B"}
+
+CARD_STYLE = {
+    "fg_color": "#1A1F2E",
+    "corner_radius": 10,
+    "border_width": 1,
+    "border_color": "#2D3748",
+}
+
+FONT_CACHE = {}
+
+
+def get_font(aSize, aWeight="normal", aFamily=FONT_FAMILY):
+    aKey = (aFamily, aSize, aWeight)
+    aFont = FONT_CACHE.get(aKey)
+    if aFont is None:
+        aFont = CTk.CTkFont(family=aFamily, size=aSize, weight=aWeight)
+        FONT_CACHE[aKey] = aFont
+    return aFont
+
+
+def get_theme_font(aSize, aWeight="normal"):
+    return get_font(aSize, aWeight, None)
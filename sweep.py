@@ -0,0 +1,169 @@
+import argparse
+import csv
+import itertools
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from reassignment import DISPATCH_POLICIES
+from simulator import SimulationConfig, SimulationResult, run_simulation
+
+
+# RAM-backed when the platform has it, so scratch databases never wait on the disk.
+SCRATCH_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+SCENARIO_FIELDS = ("drivers", "ride_buffer_seconds", "dispatch_policy", "requests_per_hour", "decline_rate")
+TABLE_COLUMNS = (
+    ("drivers", "drivers", 7, ""),
+    ("buffer s", "ride_buffer_seconds", 8, ""),
+    ("policy", "dispatch_policy", 10, ""),
+    ("req/h", "requests_per_hour", 6, ".1f"),
+    ("decline", "decline_rate", 7, ".2f"),
+    ("served %", "served_pct", 8, ".1f"),
+    ("unserved", "unserved", 8, ".1f"),
+    ("wait p95", "assign_wait_p95", 8, ".0f"),
+    ("delay p95", "pickup_delay_p95", 9, ".0f"),
+    ("util %", "utilization_pct", 6, ".1f"),
+    ("db p95 ms", "db_ms_p95", 9, ".2f"),
+)
+
+
+def parse_list(aText, aType):
+    return [aType(aValue) for aValue in aText.split(",") if aValue.strip()]
+
+
+def copy_database(aSourcePath, aTargetPath):
+    # The backup API gives a consistent copy even while the app is writing to the seed.
+    aSource = sqlite3.connect(aSourcePath)
+    aTarget = sqlite3.connect(aTargetPath)
+    try:
+        aSource.backup(aTarget)
+    finally:
+        aTarget.close()
+        aSource.close()
+
+
+def run_scenario(aConfig, aSeedPath=None, aHistoryPath=None):
+    aTempDir = tempfile.mkdtemp(prefix="tbs-sweep-", dir=SCRATCH_ROOT)
+    try:
+        aDbPath = os.path.join(aTempDir, "taxi.db")
+        if aSeedPath:
+            copy_database(aSeedPath, aDbPath)
+        return aConfig, run_simulation(aConfig, aDbPath, aHistoryPath)
+    finally:
+        shutil.rmtree(aTempDir, ignore_errors=True)
+
+
+def build_scenarios(aBaseConfig, aDriverCounts, aBuffers, aPolicies, aRates, aDeclineRates, aRepeats):
+    aScenarios = []
+    for aDrivers, aBuffer, aPolicy, aRate, aDeclineRate in itertools.product(
+        aDriverCounts, aBuffers, aPolicies, aRates, aDeclineRates
+    ):
+        for aRepeat in range(aRepeats):
+            aScenarios.append(
+                aBaseConfig._replace(
+                    drivers=aDrivers,
+                    ride_buffer_seconds=aBuffer,
+                    dispatch_policy=aPolicy,
+                    requests_per_hour=aRate,
+                    decline_rate=aDeclineRate,
+                    seed=aBaseConfig.seed + aRepeat,
+                )
+            )
+    return aScenarios
+
+
+def run_sweep(aScenarios, aSeedPath=None, aHistoryPath=None, aWorkers=None, aProgress=None):
+    aResults = []
+    with ProcessPoolExecutor(max_workers=aWorkers) as anExecutor:
+        aFutures = [anExecutor.submit(run_scenario, aConfig, aSeedPath, aHistoryPath) for aConfig in aScenarios]
+        for aFuture in as_completed(aFutures):
+            aResults.append(aFuture.result())
+            if aProgress:
+                aProgress(len(aResults), len(aScenarios))
+    return aResults
+
+
+def summarize(aResults):
+    # Repeats of a scenario differ only in their random seed, so they are averaged into one row.
+    aGroups = defaultdict(list)
+    for aConfig, aResult in aResults:
+        aGroups[tuple(getattr(aConfig, aField) for aField in SCENARIO_FIELDS)].append(aResult)
+
+    aRows = []
+    for aKey, aGroup in aGroups.items():
+        aRow = dict(zip(SCENARIO_FIELDS, aKey))
+        for aField in SimulationResult._fields:
+            aRow[aField] = sum(getattr(aResult, aField) for aResult in aGroup) / len(aGroup)
+        aRow["served_pct"] = 100 * aRow["served"] / aRow["requests"] if aRow["requests"] else 0.0
+        aRow["utilization_pct"] = 100 * aRow["utilization"]
+        aRow["runs"] = len(aGroup)
+        aRows.append(aRow)
+    aRows.sort(key=lambda aRow: (-aRow["served_pct"], aRow["pickup_delay_p95"], aRow["drivers"]))
+    return aRows
+
+
+def format_table(aRows):
+    aLines = [" ".join(f"{aHeader:>{aWidth}}" for aHeader, _, aWidth, _ in TABLE_COLUMNS)]
+    for aRow in aRows:
+        aLines.append(" ".join(f"{aRow[aKey]:>{aWidth}{aSpec}}" for _, aKey, aWidth, aSpec in TABLE_COLUMNS))
+    return "\n".join(aLines)
+
+
+def write_csv(aPath, aRows):
+    with open(aPath, "w", newline="", encoding="utf-8") as aFile:
+        aWriter = csv.DictWriter(aFile, fieldnames=list(aRows[0]))
+        aWriter.writeheader()
+        aWriter.writerows(aRows)
+
+
+if __name__ == "__main__":
+    aDefaults = SimulationConfig()
+    aParser = argparse.ArgumentParser(description="Run many simulator scenarios in parallel and compare them.")
+    aParser.add_argument("--drivers", default=str(aDefaults.drivers), help="Comma-separated fleet sizes.")
+    aParser.add_argument("--ride-buffers", default=str(aDefaults.ride_buffer_seconds), help="Comma-separated seconds.")
+    aParser.add_argument("--policies", default=",".join(DISPATCH_POLICIES))
+    aParser.add_argument("--requests-per-hour", default=str(aDefaults.requests_per_hour))
+    aParser.add_argument("--decline-rates", default=str(aDefaults.decline_rate))
+    aParser.add_argument("--repeats", type=int, default=1, help="Seeds per scenario, averaged in the table.")
+    aParser.add_argument("--hours", type=int, default=aDefaults.hours)
+    aParser.add_argument("--customers", type=int, default=aDefaults.customers)
+    aParser.add_argument("--seed", type=int, default=aDefaults.seed)
+    aParser.add_argument("--seed-db", help="Copy this database into every scenario instead of starting empty.")
+    aParser.add_argument("--history", action="store_true", help="Learn arrivals and routes from the seed database.")
+    aParser.add_argument("--workers", type=int, default=None, help="Defaults to one per CPU.")
+    aParser.add_argument("--csv", help="Also write the comparison table to this file.")
+    anArgs = aParser.parse_args()
+
+    if anArgs.history and not anArgs.seed_db:
+        aParser.error("--history needs --seed-db")
+    aPolicies = anArgs.policies.split(",")
+    for aPolicy in aPolicies:
+        if aPolicy not in DISPATCH_POLICIES:
+            aParser.error(f"unknown policy {aPolicy!r}; choose from {', '.join(DISPATCH_POLICIES)}")
+
+    aScenarios = build_scenarios(
+        aDefaults._replace(hours=anArgs.hours, customers=anArgs.customers, seed=anArgs.seed),
+        parse_list(anArgs.drivers, int),
+        parse_list(anArgs.ride_buffers, int),
+        aPolicies,
+        parse_list(anArgs.requests_per_hour, float),
+        parse_list(anArgs.decline_rates, float),
+        anArgs.repeats,
+    )
+
+    def report_progress(aDone, aTotal):
+        print(f"\r{aDone}/{aTotal} scenarios", end="", file=sys.stderr, flush=True)
+
+    aStart = time.perf_counter()
+    aResults = run_sweep(aScenarios, anArgs.seed_db, anArgs.seed_db if anArgs.history else None, anArgs.workers, report_progress)
+    print(f"\n{len(aScenarios)} scenarios in {time.perf_counter() - aStart:.1f} s", file=sys.stderr)
+
+    aRows = summarize(aResults)
+    print(format_table(aRows))
+    if anArgs.csv:
+        write_csv(anArgs.csv, aRows)
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_setup
+from locations import LOCATION_CACHE
+from user_directory import USER_DIRECTORY
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    # Module-level helpers open DB_PATH, so point it at a scratch file and drop anything cached from another one.
+    monkeypatch.setattr(db_setup, "DB_PATH", str(tmp_path / "taxi.db"))
+    LOCATION_CACHE.clear()
+    USER_DIRECTORY.invalidate()
+    USER_DIRECTORY.change_log_id = None
+    db_setup.init_db()
+    aConn = db_setup.get_write_connection()
+    yield aConn
+    aConn.close()
+    LOCATION_CACHE.clear()
+    USER_DIRECTORY.invalidate()
+    USER_DIRECTORY.change_log_id = None
+
+
+def add_user(aCur, aRole, aName):
+    aCur.execute(
+        "INSERT INTO users (email, password, role, name, address, phone) VALUES (?, ?, ?, ?, ?, ?)",
+        (f"{aName.lower().replace(' ', '.')}@example.com", "secret", aRole, aName, "Bedford", "07000000000"),
+    )
+    return aCur.lastrowid
+
+
+def get_booking_state(aCur, aBookingId):
+    aCur.execute("SELECT status, driver_id, version FROM bookings WHERE id = ?", (aBookingId,))
+    return aCur.fetchone()
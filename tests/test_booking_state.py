@@ -0,0 +1,64 @@
+from booking_state import assign_pooled_trip, create_booking, transition_booking
+from booking_time import RIDE_DURATION_SECONDS
+
+from conftest import add_user, get_booking_state
+
+
+START_TS = 1_900_000_000
+
+
+def add_pooled_trip(aCur, aBookingIds):
+    aCur.execute("INSERT INTO pooled_trips (start_ts, pooled_km, separate_km) VALUES (?, 10, 15)", (START_TS,))
+    aPooledTripId = aCur.lastrowid
+    aCur.execute(
+        f"UPDATE bookings SET pooled_trip_id = ? WHERE id IN ({', '.join('?' for _ in aBookingIds)})", (aPooledTripId, *aBookingIds)
+    )
+    return aPooledTripId
+
+
+def test_stale_version_is_rejected(database):
+    aCur = database.cursor()
+    aDriverId = add_user(aCur, "driver", "Driver One")
+    aBookingId = create_booking(aCur, add_user(aCur, "customer", "Customer One"), "Bedford", "Luton", START_TS)
+
+    assert transition_booking(aCur, aBookingId, 0, "assign", aDriverId)
+    assert not transition_booking(aCur, aBookingId, 0, "cancel")
+    assert get_booking_state(aCur, aBookingId) == ("assigned", aDriverId, 1)
+    assert transition_booking(aCur, aBookingId, 1, "cancel")
+
+
+def test_assign_overlapping_another_ride_is_refused(database):
+    aCur = database.cursor()
+    aDriverId = add_user(aCur, "driver", "Driver One")
+    aCustomerId = add_user(aCur, "customer", "Customer One")
+    aFirstId = create_booking(aCur, aCustomerId, "Bedford", "Luton", START_TS)
+    anOverlappingId = create_booking(aCur, aCustomerId, "Kempston", "Sandy", START_TS + RIDE_DURATION_SECONDS // 2)
+    aLaterId = create_booking(aCur, aCustomerId, "Kempston", "Sandy", START_TS + RIDE_DURATION_SECONDS)
+
+    assert transition_booking(aCur, aFirstId, 0, "assign", aDriverId)
+    assert not transition_booking(aCur, anOverlappingId, 0, "assign", aDriverId)
+    assert get_booking_state(aCur, anOverlappingId) == ("pending", None, 0)
+    assert transition_booking(aCur, aLaterId, 0, "assign", aDriverId)
+
+
+def test_pooled_assignment_rolls_back_when_a_rider_conflicts(database):
+    aCur = database.cursor()
+    aDriverId = add_user(aCur, "driver", "Driver One")
+    aCustomerId = add_user(aCur, "customer", "Customer One")
+    aBookingIds = [
+        create_booking(aCur, aCustomerId, "Bedford", "Luton", START_TS),
+        create_booking(aCur, aCustomerId, "Bedford", "Kempston", START_TS + 600),
+    ]
+    aPooledTripId = add_pooled_trip(aCur, aBookingIds)
+    # Overlaps only the second rider's pickup.
+    aBlockingId = create_booking(aCur, aCustomerId, "Sandy", "Luton", START_TS + RIDE_DURATION_SECONDS + 300)
+    assert transition_booking(aCur, aBlockingId, 0, "assign", aDriverId)
+    database.commit()
+
+    assert not assign_pooled_trip(aCur, aPooledTripId, aBookingIds[0], 0, aDriverId)
+    database.rollback()
+    assert [get_booking_state(aCur, aBookingId) for aBookingId in aBookingIds] == [("pending", None, 0)] * 2
+
+    assert transition_booking(aCur, aBlockingId, 1, "cancel")
+    assert assign_pooled_trip(aCur, aPooledTripId, aBookingIds[0], 0, aDriverId)
+    assert [get_booking_state(aCur, aBookingId) for aBookingId in aBookingIds] == [("assigned", aDriverId, 1)] * 2
@@ -0,0 +1,24 @@
+import threading
+
+from metrics import MetricsRegistry
+
+
+def test_shards_of_finished_threads_are_folded_into_the_totals():
+    aRegistry = MetricsRegistry()
+    aCounter = aRegistry.counter("test_events_total", "Events.", ("kind",))
+    aHistogram = aRegistry.histogram("test_duration_seconds", "Durations.")
+
+    def work():
+        aCounter.inc(aLabels=("a",))
+        aHistogram.observe(0.003)
+
+    for _ in range(50):
+        aThread = threading.Thread(target=work)
+        aThread.start()
+        aThread.join()
+    work()
+
+    assert len(aCounter.shards) == 1
+    assert len(aHistogram.shards) == 1
+    assert aCounter.get(("a",)) == 51
+    assert "test_duration_seconds_count 51" in aRegistry.render()
@@ -0,0 +1,60 @@
+import queue
+
+from booking_state import assign_pooled_trip, create_booking, decline_booking, transition_booking
+from booking_time import now_epoch
+from reassignment import REASSIGNER, ReassignmentWorker, record_decline
+from user_deletion import DRIVER_DELETED_REASON, UserDeletionJob
+
+from conftest import add_user, get_booking_state
+
+
+def test_declined_pooled_rider_is_reassigned_with_the_whole_trip(database):
+    aCur = database.cursor()
+    aFirstDriverId = add_user(aCur, "driver", "Driver One")
+    add_user(aCur, "driver", "Driver Two")
+    aCustomerId = add_user(aCur, "customer", "Customer One")
+    aStartTs = now_epoch() + 86400
+    aBookingIds = [
+        create_booking(aCur, aCustomerId, "Bedford", "Luton", aStartTs),
+        create_booking(aCur, aCustomerId, "Bedford", "Kempston", aStartTs + 300),
+    ]
+    aCur.execute("INSERT INTO pooled_trips (start_ts, pooled_km, separate_km) VALUES (?, 10, 15)", (aStartTs,))
+    aPooledTripId = aCur.lastrowid
+    aCur.execute("UPDATE bookings SET pooled_trip_id = ?", (aPooledTripId,))
+    assert assign_pooled_trip(aCur, aPooledTripId, aBookingIds[0], 0, aFirstDriverId)
+    database.commit()
+
+    assert decline_booking(aCur, aBookingIds[1], 1, aFirstDriverId)
+    record_decline(aCur, aBookingIds[1], aFirstDriverId, "Too far")
+    database.commit()
+    assert [get_booking_state(aCur, aBookingId)[:2] for aBookingId in aBookingIds] == [("pending", None)] * 2
+
+    ReassignmentWorker(aPolicy="least_busy").run_once()
+
+    aStates = [get_booking_state(aCur, aBookingId) for aBookingId in aBookingIds]
+    assert {aState[0] for aState in aStates} == {"assigned"}
+    assert len({aState[1] for aState in aStates}) == 1
+    assert aStates[0][1] != aFirstDriverId
+
+
+def test_rides_of_a_deleted_driver_go_back_to_the_reassigner(database):
+    aCur = database.cursor()
+    aDeletedDriverId = add_user(aCur, "driver", "Driver One")
+    anOtherDriverId = add_user(aCur, "driver", "Driver Two")
+    aBookingId = create_booking(aCur, add_user(aCur, "customer", "Customer One"), "Bedford", "Luton", now_epoch() + 86400)
+    assert transition_booking(aCur, aBookingId, 0, "assign", aDeletedDriverId)
+    database.commit()
+
+    aProgress = queue.Queue()
+    REASSIGNER.wake_event.clear()
+    UserDeletionJob(aDeletedDriverId, aProgress, aBatchPause=0).run()
+    assert REASSIGNER.wake_event.is_set()
+    REASSIGNER.wake_event.clear()
+    assert aProgress.get_nowait()[0] == "progress"
+    aCur.execute("SELECT driver_id, reason, resolved_at_ts FROM booking_declines WHERE booking_id = ?", (aBookingId,))
+    assert aCur.fetchall() == [(aDeletedDriverId, DRIVER_DELETED_REASON, None)]
+    assert get_booking_state(aCur, aBookingId)[:2] == ("pending", None)
+
+    ReassignmentWorker(aPolicy="least_busy").run_once()
+
+    assert get_booking_state(aCur, aBookingId)[:2] == ("assigned", anOtherDriverId)
@@ -0,0 +1,77 @@
+from booking_state import create_booking
+from ride_pooling import (
+    POOL_MAX_SIZE,
+    POOL_WINDOW_SECONDS,
+    PoolRider,
+    evaluate_pool,
+    find_candidate_pairs,
+    get_neighbour_cells,
+    suggest_pools,
+)
+from spatial_grid import GRID_COLS, get_grid_cell
+
+from conftest import add_user
+
+
+START_TS = 1_900_000_000
+BEDFORD = (52.1357, -0.4667)
+LUTON = (51.8787, -0.4200)
+# One grid column at Bedford's latitude.
+COLUMN_DEGREES = 0.0155
+
+
+def make_rider(aBookingId, aStartTs, aLongitudeShift=0.0):
+    aPickup = (BEDFORD[0], BEDFORD[1] + aLongitudeShift)
+    return PoolRider(aBookingId, aStartTs, aPickup, LUTON, get_grid_cell(*aPickup))
+
+
+def test_group_spanning_more_than_the_window_is_rejected():
+    aRiders = [make_rider(anIndex + 1, START_TS + anIndex * POOL_WINDOW_SECONDS * 2 // 3) for anIndex in range(3)]
+
+    assert evaluate_pool(aRiders[:2]) is not None
+    assert evaluate_pool(aRiders[1:]) is not None
+    assert evaluate_pool(aRiders) is None
+
+
+def test_neighbour_cells_are_clipped_at_the_grid_edge():
+    assert sorted(get_neighbour_cells(0)) == [0, 1, GRID_COLS, GRID_COLS + 1]
+    assert len(get_neighbour_cells(5 * GRID_COLS + 5)) == 9
+
+
+def test_pairs_only_come_from_neighbouring_cells():
+    aRider = make_rider(1, START_TS)
+    aNeighbour = make_rider(2, START_TS + 60, COLUMN_DEGREES)
+    aFarRider = make_rider(3, START_TS + 120, 2 * COLUMN_DEGREES)
+    assert aNeighbour.pickup_cell == aRider.pickup_cell + 1
+    assert aFarRider.pickup_cell == aRider.pickup_cell + 2
+    # Worth pooling on distance alone; only the cell filter keeps this pair out.
+    assert evaluate_pool((aRider, aFarRider)) is not None
+
+    aPairs = {aPair.booking_ids for aPair in find_candidate_pairs([aRider, aNeighbour, aFarRider])}
+
+    assert (1, 2) in aPairs
+    assert (2, 3) in aPairs
+    assert (1, 3) not in aPairs
+
+
+def test_suggested_groups_respect_the_size_and_window_limits(database):
+    aCur = database.cursor()
+    aCustomerId = add_user(aCur, "customer", "Customer One")
+    aPickup, aDropoff = ", ".join(map(str, BEDFORD)), ", ".join(map(str, LUTON))
+    aStartTimes = [START_TS + anOffset for anOffset in (0, 60, 120, 180, 600, 1200, 1800)]
+    for aStartTs in aStartTimes:
+        create_booking(aCur, aCustomerId, aPickup, aDropoff, aStartTs)
+    database.commit()
+
+    aSuggestions = suggest_pools(aCur, START_TS)
+
+    assert aSuggestions
+    for aSuggestion in aSuggestions:
+        assert 2 <= len(aSuggestion.booking_ids) <= POOL_MAX_SIZE
+        aCur.execute(
+            f"SELECT MAX(start_ts) - MIN(start_ts) FROM bookings WHERE id IN ({', '.join('?' for _ in aSuggestion.booking_ids)})",
+            aSuggestion.booking_ids,
+        )
+        assert aCur.fetchone()[0] <= POOL_WINDOW_SECONDS
+    aPooledIds = [anId for aSuggestion in aSuggestions for anId in aSuggestion.booking_ids]
+    assert len(aPooledIds) == len(set(aPooledIds))
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from storage import MemoryStore, SqliteStore
+
+
+START_TS = 1_900_000_000
+PLACES = ("Bedford", "Luton", "Kempston", "Dunstable", "Biggleswade")
+ACTIONS = ("assign", "decline", "complete", "cancel")
+
+
+def replay(aStore, aSeed, anOperationCount=600):
+    # The same seed gives both stores the same calls, so every result can be compared step by step.
+    aRandom = random.Random(aSeed)
+    aResults = []
+    aDriverIds = [aStore.add_user(f"driver{anIndex}@example.com", "secret", "Driver", f"Driver {anIndex}", "Bedford", "07000000000") for anIndex in range(4)]
+    aCustomerIds = [aStore.add_user(f"customer{anIndex}@example.com", "secret", "customer", f"Customer {anIndex}", "Luton", "07000000001") for anIndex in range(6)]
+    aBookingIds = []
+
+    for _ in range(anOperationCount):
+        anOperation = aRandom.choices(("book", "transition", "delete", "free", "read"), (30, 40, 5, 15, 10))[0]
+        if anOperation == "book" or not aBookingIds:
+            aPickup, aDropoff = aRandom.sample(PLACES, 2)
+            aBookingId = aStore.add_booking(aRandom.choice(aCustomerIds), aPickup, aDropoff, START_TS + aRandom.randrange(48) * 900)
+            aBookingIds.append(aBookingId)
+            aResults.append(("book", aBookingId))
+        elif anOperation == "transition":
+            aBooking = aStore.get_booking(aRandom.choice(aBookingIds))
+            if aBooking is None:
+                continue
+            anAction = aRandom.choice(ACTIONS)
+            aDriverId = aBooking.driver_id if anAction in ("decline", "complete") and aRandom.random() < 0.8 else aRandom.choice(aDriverIds)
+            aVersion = aBooking.version if aRandom.random() < 0.9 else aBooking.version - 1
+            aUserId = aBooking.user_id if anAction == "cancel" else None
+            aResults.append(("transition", aStore.transition(aBooking.id, aVersion, anAction, aDriverId, aUserId)))
+        elif anOperation == "delete":
+            aBooking = aStore.get_booking(aRandom.choice(aBookingIds))
+            aResults.append(("delete", aBooking is not None and aStore.delete_booking(aBooking.id, aBooking.version)))
+        elif anOperation == "free":
+            anExcludeId = aRandom.choice(aBookingIds + [None])
+            aResults.append(
+                ("free", aStore.is_driver_free(aRandom.choice(aDriverIds), START_TS + aRandom.randrange(48) * 900, anExcludeId))
+            )
+        else:
+            aResults.append(("user", aStore.get_user_bookings(aRandom.choice(aCustomerIds))))
+            aResults.append(("driver", aStore.get_driver_bookings(aRandom.choice(aDriverIds), START_TS + aRandom.randrange(48) * 900)))
+
+    aResults.append(("drivers", aStore.get_users_by_role("DRIVER")))
+    aResults.append(("login", aStore.find_user("customer0@example.com", "secret"), aStore.find_user("customer0@example.com", "wrong")))
+    aResults.append(("bookings", [aStore.get_booking(aBookingId) for aBookingId in aBookingIds]))
+    return aResults
+
+
+@pytest.mark.parametrize("aSeed", [1, 2, 3])
+def test_memory_store_matches_sqlite_store(tmp_path, aSeed):
+    aSqliteStore = SqliteStore(str(tmp_path / "taxi.db"))
+    try:
+        aSqliteResults = replay(aSqliteStore, aSeed)
+    finally:
+        aSqliteStore.close()
+    aMemoryResults = replay(MemoryStore(), aSeed)
+
+    assert len(aMemoryResults) == len(aSqliteResults)
+    for aStep, (aMemoryResult, aSqliteResult) in enumerate(zip(aMemoryResults, aSqliteResults)):
+        assert aMemoryResult == aSqliteResult, f"step {aStep}"
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import tkinter
+import functools
+from collections import deque
+import customtkinter as CTk
+
+
+UI_TRACE_PATH = "ui_trace.json"
+HEARTBEAT_INTERVAL_MS = 50
+LAG_REPORT_THRESHOLD_MS = 100
+MIN_CALLBACK_MS = 1.0
+# The heartbeat adds 40 events a second, so a long session keeps roughly its last 80 minutes.
+UI_TRACE_MAX_EVENTS = 200_000
+PROFILED_PREFIXES = (
+    "show_",
+    "load_",
+    "submit_",
+    "assign_",
+    "confirm_",
+    "edit_",
+    "cancel_",
+    "complete_",
+    "decline_",
+    "delete_",
+    "login",
+    "register",
+    "logout",
+)
+
+
+class UiProfiler:
+    def __init__(self, aTracePath=UI_TRACE_PATH, anIntervalMs=HEARTBEAT_INTERVAL_MS, aMaxEvents=UI_TRACE_MAX_EVENTS):
+        self.trace_path = aTracePath
+        self.interval_ms = anIntervalMs
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=aMaxEvents)
+        self.widgets_created = 0
+        self.widgets_destroyed = 0
+        self.root = None
+        self.expected_beat = None
+
+    def now_us(self):
+        return (time.perf_counter() - self.origin) * 1_000_000
+
+    def add_span(self, aName, aCategory, aStartUs, anArgs=None):
+        self.events.append(
+            {
+                "name": aName,
+                "cat": aCategory,
+                "ph": "X",
+                "ts": aStartUs,
+                "dur": self.now_us() - aStartUs,
+                "pid": os.getpid(),
+                "tid": 1,
+                "args": anArgs or {},
+            }
+        )
+
+    def add_counter(self, aName, aValues):
+        self.events.append(
+            {"name": aName, "ph": "C", "ts": self.now_us(), "pid": os.getpid(), "tid": 1, "args": aValues}
+        )
+
+    def install(self):
+        aProfiler = self
+        anOriginalSetup = tkinter.BaseWidget._setup
+        anOriginalDestroy = tkinter.BaseWidget.destroy
+        anOriginalRegister = tkinter.Misc._register
+        anOriginalButtonInit = CTk.CTkButton.__init__
+
+        def counting_setup(aWidget, aMaster, aConfig):
+            aProfiler.widgets_created += 1
+            return anOriginalSetup(aWidget, aMaster, aConfig)
+
+        def counting_destroy(aWidget):
+            aProfiler.widgets_destroyed += 1
+            return anOriginalDestroy(aWidget)
+
+        def timing_register(aWidget, aFunc, aSubst=None, aNeedCleanup=1):
+            if getattr(aFunc, "__name__", "") == "ui_profiler_heartbeat":
+                return anOriginalRegister(aWidget, aFunc, aSubst, aNeedCleanup)
+            return anOriginalRegister(aWidget, aProfiler.wrap_callback(aFunc, "tk-callback"), aSubst, aNeedCleanup)
+
+        def timing_button_init(aButton, *anArgs, **aKwargs):
+            if aKwargs.get("command"):
+                aKwargs["command"] = aProfiler.wrap_callback(aKwargs["command"], "command", 0)
+            return anOriginalButtonInit(aButton, *anArgs, **aKwargs)
+
+        tkinter.BaseWidget._setup = counting_setup
+        tkinter.BaseWidget.destroy = counting_destroy
+        tkinter.Misc._register = timing_register
+        CTk.CTkButton.__init__ = timing_button_init
+
+    def wrap_callback(self, aFunc, aCategory, aMinMs=MIN_CALLBACK_MS):
+        aName = getattr(aFunc, "__qualname__", None) or getattr(aFunc, "__name__", repr(aFunc))
+
+        @functools.wraps(aFunc)
+        def timed_callback(*anArgs, **aKwargs):
+            aStartUs = self.now_us()
+            aCreatedBefore = self.widgets_created
+            aDestroyedBefore = self.widgets_destroyed
+            try:
+                return aFunc(*anArgs, **aKwargs)
+            finally:
+                if self.now_us() - aStartUs >= aMinMs * 1000:
+                    self.add_span(
+                        aName,
+                        aCategory,
+                        aStartUs,
+                        {
+                            "widgets_created": self.widgets_created - aCreatedBefore,
+                            "widgets_destroyed": self.widgets_destroyed - aDestroyedBefore,
+                        },
+                    )
+
+        return timed_callback
+
+    def profile_class(self, aClass, aPrefixes=PROFILED_PREFIXES):
+        for aKlass in aClass.__mro__:
+            if aKlass.__module__.startswith(("customtkinter", "tkinter", "builtins")):
+                continue
+            for aName, aValue in list(vars(aKlass).items()):
+                if callable(aValue) and aName.startswith(aPrefixes) and not hasattr(aValue, "__wrapped__"):
+                    setattr(aClass, aName, self.wrap_callback(aValue, "render", 0))
+
+    def start_heartbeat(self, aRoot):
+        self.root = aRoot
+        self.expected_beat = time.perf_counter() + self.interval_ms / 1000
+        aRoot.after(self.interval_ms, self.ui_profiler_heartbeat)
+
+    def ui_profiler_heartbeat(self):
+        aNow = time.perf_counter()
+        aLagMs = max(0.0, (aNow - self.expected_beat) * 1000)
+        self.add_counter("mainloop lag ms", {"lag": round(aLagMs, 2)})
+        self.add_counter("widgets", {"alive": self.widgets_created - self.widgets_destroyed})
+        if aLagMs >= LAG_REPORT_THRESHOLD_MS:
+            self.events.append(
+                {
+                    "name": "mainloop stall",
+                    "cat": "lag",
+                    "ph": "X",
+                    "ts": self.now_us() - aLagMs * 1000,
+                    "dur": aLagMs * 1000,
+                    "pid": os.getpid(),
+                    "tid": 2,
+                    "args": {"lag_ms": round(aLagMs, 2)},
+                }
+            )
+        self.expected_beat = aNow + self.interval_ms / 1000
+        try:
+            self.root.after(self.interval_ms, self.ui_profiler_heartbeat)
+        except tkinter.TclError:
+            pass
+
+    def write_trace(self):
+        with open(self.trace_path, "w", encoding="utf-8") as aFile:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms"}, aFile)
+        print(f"UI trace written to {self.trace_path} ({len(self.events)} events)")
@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+
+from db_setup import get_write_connection
+from booking_state import AUDIT_BOOKING_COLUMNS
+from audit import audit_change, is_auditing
+from reassignment import REASSIGNER, record_decline
+
+
+DELETION_BATCH_SIZE = 200
+DELETION_BATCH_PAUSE = 0.02
+DRIVER_DELETED_REASON = "Driver account deleted"
+
+
+class UserDeletionJob(threading.Thread):
+    def __init__(self, aUserId, aProgressQueue, anActor=None, aBatchSize=DELETION_BATCH_SIZE, aBatchPause=DELETION_BATCH_PAUSE):
+        super().__init__(daemon=True)
+        self.user_id = aUserId
+        self.actor = anActor
+        self.progress_queue = aProgressQueue
+        self.batch_size = aBatchSize
+        self.batch_pause = aBatchPause
+        self.processed = 0
+        self.total = 0
+
+    def run(self):
+        aConn = get_write_connection(30)
+        try:
+            aCur = aConn.cursor()
+            self.total = self.count_dependent_rows(aCur) + 1
+            self.report("progress")
+
+            aCur.execute("DELETE FROM recurring_bookings WHERE user_id = ?", (self.user_id,))
+            aConn.commit()
+
+            # RETURNING hands back each row as it goes, so the audit trail keeps what was erased.
+            for aTable in ("bookings", "bookings_archive"):
+                self.run_batches(
+                    aConn,
+                    f"UPDATE {aTable} SET driver_id = NULL, version = version + 1, status = CASE WHEN status = 'assigned' THEN 'pending' ELSE status END WHERE id IN (SELECT id FROM {aTable} WHERE driver_id = ? LIMIT ?) RETURNING id, status",
+                    self.release_ride,
+                )
+            for aTable in ("bookings", "bookings_archive"):
+                self.run_batches(
+                    aConn,
+                    f"DELETE FROM {aTable} WHERE id IN (SELECT id FROM {aTable} WHERE user_id = ? LIMIT ?) RETURNING {', '.join(AUDIT_BOOKING_COLUMNS)}, id",
+                    lambda aCur, aRow: audit_change(
+                        aCur, self.actor, "booking.delete", "booking", aRow[-1], dict(zip(AUDIT_BOOKING_COLUMNS, aRow)), None
+                    ),
+                )
+
+            if is_auditing():
+                aCur.execute("SELECT email, role, name, address, phone FROM users WHERE id = ?", (self.user_id,))
+                aUser = aCur.fetchone()
+                if aUser:
+                    audit_change(
+                        aCur, self.actor, "user.delete", "user", self.user_id, dict(zip(("email", "role", "name", "address", "phone"), aUser)), None
+                    )
+            aCur.execute("DELETE FROM users WHERE id = ?", (self.user_id,))
+            aConn.commit()
+            self.processed += 1
+            self.report("done")
+        except sqlite3.Error as anError:
+            aConn.rollback()
+            self.progress_queue.put(("error", self.processed, self.total, str(anError)))
+        finally:
+            aConn.close()
+
+    def release_ride(self, aCur, aRow):
+        aBookingId, aStatus = aRow
+        audit_change(aCur, self.actor, "booking.unassign", "booking", aBookingId, {"driver_id": self.user_id}, {"driver_id": None, "status": aStatus})
+        if aStatus == "pending":
+            # Logged like a decline, so the reassigner offers the ride to another driver once the batch commits.
+            record_decline(aCur, aBookingId, self.user_id, DRIVER_DELETED_REASON)
+            aCur.connection.after_commit(REASSIGNER.wake)
+
+    def count_dependent_rows(self, aCur):
+        aCount = 0
+        for aTable in ("bookings", "bookings_archive"):
+            aCur.execute(
+                f"SELECT COUNT(*) FROM {aTable} WHERE driver_id = ? OR user_id = ?",
+                (self.user_id, self.user_id),
+            )
+            aCount += aCur.fetchone()[0]
+        return aCount
+
+    def run_batches(self, aConn, aStatement, anAudit):
+        while True:
+            aCur = aConn.execute(aStatement, (self.user_id, self.batch_size))
+            aRows = aCur.fetchall()
+            for aRow in aRows:
+                anAudit(aCur, aRow)
+            aConn.commit()
+            if not aRows:
+                return
+            self.processed += len(aRows)
+            self.report("progress")
+            time.sleep(self.batch_pause)
+
+    def report(self, aKind):
+        self.progress_queue.put((aKind, min(self.processed, self.total), self.total, None))
@@ -0,0 +1,118 @@
+import threading
+
+from db_setup import get_connection
+
+
+PRELOAD_CHUNK_SIZE = 500
+
+
+class UserDirectory:
+    def __init__(self):
+        self.users_by_id = {}
+        self.ids_by_role = {}
+        # Ids known not to exist, e.g. deleted users still referenced by old bookings.
+        self.missing_ids = set()
+        self.change_log_id = None
+        self.lock = threading.RLock()
+
+    def invalidate(self, aUserId=None):
+        with self.lock:
+            if aUserId is None:
+                self.users_by_id.clear()
+                self.ids_by_role.clear()
+                self.missing_ids.clear()
+                return
+            self.users_by_id.pop(aUserId, None)
+            self.missing_ids.discard(aUserId)
+            self.ids_by_role.clear()
+
+    def sync(self):
+        aConn = get_connection()
+        try:
+            aCur = aConn.cursor()
+            with self.lock:
+                if self.change_log_id is None:
+                    aCur.execute("SELECT COALESCE(MAX(id), 0) FROM change_log")
+                    self.change_log_id = aCur.fetchone()[0]
+                    return self
+
+                aCur.execute("SELECT COALESCE(MIN(id), 0) FROM change_log")
+                if aCur.fetchone()[0] > self.change_log_id + 1:
+                    self.invalidate()
+
+                aCur.execute(
+                    "SELECT id, row_id FROM change_log WHERE id > ? AND table_name = 'users' ORDER BY id",
+                    (self.change_log_id,),
+                )
+                for aChangeId, aUserId in aCur.fetchall():
+                    self.invalidate(aUserId)
+                    self.change_log_id = aChangeId
+
+                aCur.execute("SELECT COALESCE(MAX(id), 0) FROM change_log")
+                self.change_log_id = max(self.change_log_id, aCur.fetchone()[0])
+        finally:
+            aConn.close()
+        return self
+
+    def preload(self, aUserIds):
+        # One query per chunk for every id not cached yet, instead of one per lookup while rendering a list.
+        anUnknownIds = list(
+            {anId for anId in aUserIds if anId is not None and anId not in self.users_by_id and anId not in self.missing_ids}
+        )
+        for anIndex in range(0, len(anUnknownIds), PRELOAD_CHUNK_SIZE):
+            aChunk = anUnknownIds[anIndex:anIndex + PRELOAD_CHUNK_SIZE]
+            aFoundIds = set(
+                self.load_users(
+                    f"SELECT id, name, email, phone, role FROM users WHERE id IN ({', '.join('?' for _ in aChunk)})", aChunk
+                )
+            )
+            with self.lock:
+                self.missing_ids.update(anId for anId in aChunk if anId not in aFoundIds)
+        return self
+
+    def get_user(self, aUserId):
+        if aUserId is None or aUserId in self.missing_ids:
+            return None
+        aUser = self.users_by_id.get(aUserId)
+        if aUser is None:
+            self.preload((aUserId,))
+            aUser = self.users_by_id.get(aUserId)
+        return aUser
+
+    def get_users_by_role(self, aRole):
+        aRole = normalize_role(aRole)
+        anIds = self.ids_by_role.get(aRole)
+        if anIds is None:
+            anIds = self.load_users("SELECT id, name, email, phone, role FROM users WHERE role = ? ORDER BY name", (aRole,))
+            with self.lock:
+                self.ids_by_role[aRole] = anIds
+        return [self.users_by_id[anId] for anId in anIds if anId in self.users_by_id]
+
+    def get_name(self, aUserId, aDefault=None):
+        aUser = self.get_user(aUserId)
+        return aUser[1] if aUser else aDefault
+
+    def get_phone(self, aUserId, aDefault=None):
+        aUser = self.get_user(aUserId)
+        return aUser[3] if aUser else aDefault
+
+    def load_users(self, aQuery, aParams):
+        aConn = get_connection()
+        try:
+            aCur = aConn.cursor()
+            aCur.execute(aQuery, aParams)
+            aRows = aCur.fetchall()
+        finally:
+            aConn.close()
+
+        with self.lock:
+            for aRow in aRows:
+                self.users_by_id[aRow[0]] = (aRow[0], aRow[1], aRow[2], aRow[3], normalize_role(aRow[4]))
+        return [aRow[0] for aRow in aRows]
+
+
+def normalize_role(aRole):
+    return (aRole or "").strip().lower()
+
+
+USER_DIRECTORY = UserDirectory()